@@ -0,0 +1,182 @@
+import json
+import asyncio
+import logging
+from utils.gemini_client import generate_response_with_file, generate_response_with_file_async, generate_response_with_files
+from utils.gst_validation import validate_records
+from agents.parser_agent import EXTRACTION_INSTRUCTIONS, build_extraction_prompt, attach_hsn_codes
+
+logger = logging.getLogger(__name__)
+
+# Response schema matching the JSON layout requested by the parser prompt
+_STRING = {"type": "string", "nullable": True}
+GST_RESPONSE_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "Shop Name": _STRING,
+            "GSTIN": _STRING,
+            "Invoice Number": _STRING,
+            "Invoice Date": _STRING,
+            "Total Amount": _STRING,
+            "Tax Amount": _STRING,
+            "CGST": _STRING,
+            "SGST": _STRING,
+            "IGST": _STRING,
+            "Items": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {"HSN Code": _STRING},
+                },
+            },
+        },
+        "required": ["Shop Name", "GSTIN", "Invoice Number", "Invoice Date", "Total Amount", "Items"],
+    },
+}
+
+# Packed requests (several documents in one call) answer with one keyed entry per document
+PACKED_RESPONSE_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "Document": {"type": "integer"},
+            "Invoices": GST_RESPONSE_SCHEMA,
+        },
+        "required": ["Document", "Invoices"],
+    },
+}
+
+def build_packed_prompt(count):
+    return (
+        f"The {count} documents above are labelled Document 1 to Document {count}. "
+        "Each one holds one or more GST invoices; never mix fields from different documents.\n"
+        + EXTRACTION_INSTRUCTIONS
+        + "Answer with one entry per document, in this JSON format, using the invoice format above:\n"
+        "[\n  { \"Document\": 1, \"Invoices\": [ ... ] }\n]\n"
+    )
+
+def extraction_result(state, response):
+    """Parse and validate the schema-constrained answer; shared by the sync and async agents"""
+    file_path = state.get("file_path", "")
+    try:
+        parsed = json.loads(response)
+        if isinstance(parsed, dict):
+            parsed = [parsed]
+    except json.JSONDecodeError as e:
+        logger.warning("JSON decoding error file=%s: %s", file_path, e)
+        return {**state, "gst_data": [], "validated": False}
+    if not isinstance(parsed, list):
+        parsed = []
+    invoices = [item for item in parsed if isinstance(item, dict)]
+    if len(invoices) != len(parsed):
+        logger.warning("dropped non-object items file=%s count=%d", file_path, len(parsed) - len(invoices))
+    return _validated_result(state, invoices)
+
+def _validated_result(state, parsed):
+    file_path = state.get("file_path", "")
+    attach_hsn_codes(parsed)
+    is_valid, errors = validate_records(parsed)
+    logger.debug("extracted file=%s invoices=%d valid=%s", file_path, len(parsed), is_valid)
+    return {**state, "gst_data": parsed, "validated": is_valid, "validation_errors": errors}
+
+def extraction_agent(state: dict):
+    """Single-call fast path: OCR, parsing and validation from one schema-constrained request"""
+    file_path = state.get("file_path", "")
+    if not file_path:
+        return {**state, "gst_data": [], "validated": False}
+
+    logger.debug("single-call extraction file=%s", file_path)
+    try:
+        response = generate_response_with_file(
+            build_extraction_prompt(), state.get("file_handle") or file_path,
+            response_schema=GST_RESPONSE_SCHEMA,
+        )
+    except Exception as e:
+        logger.error("extraction failed file=%s: %s", file_path, e)
+        return {**state, "gst_data": [], "validated": False, "error": f"Extraction failed: {e}"}
+    return extraction_result(state, response)
+
+async def extraction_agent_async(state: dict):
+    """extraction_agent for graph.ainvoke: the model call is awaited instead of blocking a thread"""
+    file_path = state.get("file_path", "")
+    if not file_path:
+        return {**state, "gst_data": [], "validated": False}
+
+    logger.debug("single-call extraction file=%s", file_path)
+    try:
+        response = await generate_response_with_file_async(
+            build_extraction_prompt(), state.get("file_handle") or file_path,
+            response_schema=GST_RESPONSE_SCHEMA,
+        )
+    except Exception as e:
+        logger.error("extraction failed file=%s: %s", file_path, e)
+        return {**state, "gst_data": [], "validated": False, "error": f"Extraction failed: {e}"}
+    # Parsing and the rule checks are CPU work; keep them off the event loop
+    return await asyncio.to_thread(extraction_result, state, response)
+
+def _packed_entries(response, count):
+    """{document number: invoice list} from a packed answer, keeping only well-formed, unambiguous entries"""
+    try:
+        parsed = json.loads(response)
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(parsed, list):
+        return {}
+    entries, repeated = {}, set()
+    for entry in parsed:
+        if not isinstance(entry, dict):
+            continue
+        number, invoices = entry.get("Document"), entry.get("Invoices")
+        if isinstance(invoices, dict):
+            invoices = [invoices]
+        if isinstance(number, bool) or not isinstance(number, int) or not 1 <= number <= count:
+            continue
+        if not isinstance(invoices, list):
+            continue
+        if not all(isinstance(invoice, dict) for invoice in invoices):
+            continue
+        if number in entries:
+            repeated.add(number)
+        entries[number] = invoices
+    for number in repeated:
+        del entries[number]
+    return entries
+
+def extract_packed(file_paths):
+    """
+    Extract several small documents with one schema-constrained request.
+
+    Returns one state per file, in order, or None for a file whose entry is missing
+    or malformed in the answer (all of them if the request fails or the answer is
+    not the keyed JSON array); the caller extracts those files one by one. Records
+    failing the local rules get the validator's correction request, as in the
+    pipeline mode.
+    """
+    from agents.validator_agent import ESCALATE_FAILURES, validator_agent
+
+    logger.debug("packed extraction files=%d", len(file_paths))
+    try:
+        response = generate_response_with_files(
+            build_packed_prompt(len(file_paths)), file_paths, response_schema=PACKED_RESPONSE_SCHEMA,
+        )
+    except Exception as e:
+        logger.warning("packed extraction failed files=%d, extracting them one by one: %s", len(file_paths), e)
+        return [None] * len(file_paths)
+
+    entries = _packed_entries(response, len(file_paths))
+    if len(entries) < len(file_paths):
+        logger.warning("packed answer covered %d of %d files, extracting the rest one by one",
+                       len(entries), len(file_paths))
+    states = [
+        _validated_result({"file_path": file_path, "text_source": "gemini"}, entries[number])
+        if number in entries else None
+        for number, file_path in enumerate(file_paths, start=1)
+    ]
+    if ESCALATE_FAILURES:
+        states = [
+            validator_agent(state) if state is not None and state["gst_data"] and not state["validated"] else state
+            for state in states
+        ]
+    return states
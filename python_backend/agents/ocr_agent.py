@@ -1,12 +1,27 @@
-from utils.gemini_client import generate_response_with_file
+import logging
+from utils.gemini_client import generate_response_with_file, generate_response_with_file_async
+
+logger = logging.getLogger(__name__)
+
+OCR_PROMPT = "Extract raw readable text from this GST invoice for further parsing."
 
 def ocr_agent(state):
     file_path = state.get("file_path")
-    print("[OCR Agent] 🔍 Extracting text using Gemini...")
+    logger.debug("OCR via Gemini file=%s", file_path)
+    try:
+        raw_text = generate_response_with_file(OCR_PROMPT, state.get("file_handle") or file_path)
+        return {**state, "raw_text": raw_text}
+    except Exception as e:
+        logger.error("OCR failed file=%s: %s", file_path, e)
+        return {**state, "raw_text": "", "error": f"OCR failed: {e}"}
+
+async def ocr_agent_async(state):
+    """ocr_agent for graph.ainvoke: the model call is awaited instead of blocking a thread"""
+    file_path = state.get("file_path")
+    logger.debug("OCR via Gemini file=%s", file_path)
     try:
-        prompt = "Extract raw readable text from this GST invoice for further parsing."
-        raw_text = generate_response_with_file(prompt, file_path)
+        raw_text = await generate_response_with_file_async(OCR_PROMPT, state.get("file_handle") or file_path)
         return {**state, "raw_text": raw_text}
     except Exception as e:
-        print(f"[OCR Agent] ❌ Error: {e}")
-        return {**state, "raw_text": ""}
\ No newline at end of file
+        logger.error("OCR failed file=%s: %s", file_path, e)
+        return {**state, "raw_text": "", "error": f"OCR failed: {e}"}
@@ -1,42 +1,59 @@
 import json
-from utils.gemini_client import generate_response_with_file
+import logging
+from utils.gemini_client import generate_response_with_file, generate_response_with_file_async
 
-def parser_agent(state: dict):
-    raw_text = state.get("raw_text", "")
-    file_path = state.get("file_path", "")
+logger = logging.getLogger(__name__)
 
-    if not raw_text or not file_path:
-        return {**state, "gst_data": []}
+EXTRACTION_INSTRUCTIONS = (
+    "You are an expert GST data extractor.\n"
+    "Extract all relevant invoice fields, including line items, in this JSON format:\n\n"
+    "if the Shop name is too long , adjust it in by writing in two lines in each cell with the proper alignment when uploading to the excel"
+    "For each line item, extract ONLY the numeric HSN code (6-8 digits, digits only) from the text. If no HSN code is present, assign the value as 0, do not guess, do not copy"
+    "if there is no IGST value , assign the value as N/A"
+    "[\n"
+    "  {\n"
+    "    \"Shop Name\": \"...\",\n"
+    "    \"GSTIN\": \"...\",\n"
+    "    \"Invoice Number\": \"...\",\n"
+    "    \"Invoice Date\": \"...\",\n"
+    "    \"Total Amount\": \"...\",\n"
+    "    \"Tax Amount\": \"...\",\n"
+    "    \"CGST\": \"...\",\n"
+    "    \"SGST\": \"...\",\n"
+    "    \"IGST\": \"...\",\n"
+    "    \"Items\": [\n"
+    "      { \"HSN Code\": \"...\" }\n"
+    "    ]\n"
+    "  }\n"
+    "]\n\n"
+)
+
+def build_extraction_prompt(raw_text=None):
+    if raw_text is None:
+        return EXTRACTION_INSTRUCTIONS
+    return EXTRACTION_INSTRUCTIONS + f"Text:\n{raw_text}"
 
-    print("[Parser Agent] 📄 Parsing raw GST data using Gemini...")
-    prompt = (
-        "You are an expert GST data extractor.\n"
-        "Extract all relevant invoice fields, including line items, in this JSON format:\n\n"
-        "if the Shop name is too long , adjust it in by writing in two lines in each cell with the proper alignment when uploading to the excel"
-        "For each line item, extract ONLY the numeric HSN code (6-8 digits, digits only) from the text. If no HSN code is present, assign the value as 0, do not guess, do not copy"
-        "if there is no IGST value , assign the value as N/A"
-        "[\n"
-        "  {\n"
-        "    \"Shop Name\": \"...\",\n"
-        "    \"GSTIN\": \"...\",\n"
-        "    \"Invoice Number\": \"...\",\n"
-        "    \"Invoice Date\": \"...\",\n"
-        "    \"Total Amount\": \"...\",\n"
-        "    \"Tax Amount\": \"...\",\n"
-        "    \"CGST\": \"...\",\n"
-        "    \"SGST\": \"...\",\n"
-        "    \"IGST\": \"...\",\n"
-        "    \"Items\": [\n"
-        "      { \"HSN Code\": \"...\" }\n"
-        "    ]\n"
-        "  }\n"
-        "]\n\n"
-        f"Text:\n{raw_text}"
-    )
+def attach_hsn_codes(parsed):
+    # Collect all HSN codes (including duplicates) in order for this bill
+    for record in parsed:
+        hsn_code_list = []
+        items = record.get("Items", [])
+        for item in items:
+            code = item.get("HSN Code")
+            if code:
+                if isinstance(code, list):
+                    hsn_code_list.extend(str(c) for c in code)
+                else:
+                    hsn_code_list.append(str(code))
+        record["HSN Code"] = hsn_code_list if hsn_code_list else ""
+    return parsed
 
+def parse_response(state, response):
+    """Turn the model's answer into gst_data; shared by parser_agent and parser_agent_async"""
+    file_path = state.get("file_path", "")
     try:
-        response = generate_response_with_file(prompt, file_path)
-        print("🔎 Gemini raw response:\n", response)
+        # Lazy %-formatting: nothing is rendered unless DEBUG is enabled
+        logger.debug("raw response file=%s chars=%d: %.2000s", file_path, len(response), response)
 
         start = response.find('[')
         end = response.rfind(']')
@@ -45,30 +62,51 @@ def parser_agent(state: dict):
         else:
             json_text = response.strip()
 
-        print("CLEANED RESPONSE FOR JSON PARSING:\n", repr(json_text))
         parsed = json.loads(json_text)
 
-        # Collect all HSN codes (including duplicates) in order for this bill
-        for record in parsed:
-            hsn_code_list = []
-            items = record.get("Items", [])
-            for item in items:
-                code = item.get("HSN Code")
-                if code:
-                    if isinstance(code, list):
-                        hsn_code_list.extend(str(c) for c in code)
-                    else:
-                        hsn_code_list.append(str(code))
-            record["HSN Code"] = hsn_code_list if hsn_code_list else ""
-
-        print("[Parser Agent] ✅ Parsed successfully.")
+        attach_hsn_codes(parsed)
+
+        logger.debug("parsed file=%s invoices=%d", file_path, len(parsed))
         return {**state, "gst_data": parsed}
 
     except json.JSONDecodeError as e:
-        print(f"[Parser Agent] ❌ JSON decoding error: {e}")
+        logger.warning("JSON decoding error file=%s: %s", file_path, e)
         return {**state, "gst_data": []}
     except Exception as e:
-        print(f"[Parser Agent] ❌ Parsing failed: {e}")
+        logger.error("parsing failed file=%s: %s", file_path, e)
+        return {**state, "gst_data": [], "error": f"Parsing failed: {e}"}
+
+def parser_agent(state: dict):
+    raw_text = state.get("raw_text", "")
+    file_path = state.get("file_path", "")
+
+    if not raw_text or not file_path:
         return {**state, "gst_data": []}
 
-print("✅ Loaded parser_agent (confirmed file)")
\ No newline at end of file
+    logger.debug("parsing file=%s raw_text_chars=%d", file_path, len(raw_text))
+    prompt = build_extraction_prompt(raw_text)
+
+    try:
+        response = generate_response_with_file(prompt, state.get("file_handle") or file_path)
+    except Exception as e:
+        logger.error("parsing failed file=%s: %s", file_path, e)
+        return {**state, "gst_data": [], "error": f"Parsing failed: {e}"}
+    return parse_response(state, response)
+
+async def parser_agent_async(state: dict):
+    """parser_agent for graph.ainvoke: the model call is awaited instead of blocking a thread"""
+    raw_text = state.get("raw_text", "")
+    file_path = state.get("file_path", "")
+
+    if not raw_text or not file_path:
+        return {**state, "gst_data": []}
+
+    logger.debug("parsing file=%s raw_text_chars=%d", file_path, len(raw_text))
+    prompt = build_extraction_prompt(raw_text)
+
+    try:
+        response = await generate_response_with_file_async(prompt, state.get("file_handle") or file_path)
+    except Exception as e:
+        logger.error("parsing failed file=%s: %s", file_path, e)
+        return {**state, "gst_data": [], "error": f"Parsing failed: {e}"}
+    return parse_response(state, response)
@@ -0,0 +1,24 @@
+import os
+import logging
+from utils.pdf_utils import extract_text_layer, score_text_layer
+
+logger = logging.getLogger(__name__)
+
+# Minimum text-layer score for skipping the Gemini OCR call
+TEXT_LAYER_THRESHOLD = float(os.getenv("GST_TEXT_LAYER_THRESHOLD", "0.6"))
+
+def text_layer_agent(state: dict):
+    """Use the PDF's embedded text when it is good enough; otherwise leave OCR to Gemini"""
+    file_path = state.get("file_path", "")
+    try:
+        layer = extract_text_layer(file_path)
+        score = score_text_layer(layer["text"], layer["pages"])
+    except Exception as e:
+        logger.warning("could not read text layer file=%s: %s", file_path, e)
+        return {**state, "text_source": "gemini", "text_layer_score": 0.0}
+
+    if score >= TEXT_LAYER_THRESHOLD:
+        logger.debug("using embedded text file=%s score=%.2f", file_path, score)
+        return {**state, "raw_text": layer["text"], "text_source": "local", "text_layer_score": score}
+
+    return {**state, "text_source": "gemini", "text_layer_score": score}
@@ -1,28 +1,113 @@
-from utils.gemini_client import generate_response_with_file
+import os
+import json
+import asyncio
+import logging
+from utils.gemini_client import generate_response_with_file, generate_response_with_file_async
+from utils.gst_validation import validate_records, validate_record, issue_messages
+from utils.metrics import VALIDATION_ESCALATIONS, VALIDATION_ISSUES
+
+logger = logging.getLogger(__name__)
+
+# Send records that fail the local rules back to Gemini for one correction attempt ("0" disables)
+ESCALATE_FAILURES = os.getenv("GST_VALIDATION_ESCALATE", "1") != "0"
+
+def build_correction_prompt(records, issues):
+    problems = [
+        {"record": record, "problems": issue_messages(record_issues)}
+        for record, record_issues in zip(records, issues)
+    ]
+    return (
+        "These GST invoice records were extracted from the attached invoice but failed validation.\n"
+        "Re-read the invoice and return the corrected records as a JSON array, in the same order and "
+        "with the same keys. Keep values that are already correct; use N/A for fields that are "
+        "genuinely absent. Return only the JSON array.\n\n"
+        f"{json.dumps(problems, ensure_ascii=False)}"
+    )
+
+def _failing_records(gst_data, issues):
+    failing = [i for i, record_issues in enumerate(issues) if record_issues]
+    VALIDATION_ESCALATIONS.inc(len(failing))
+    return failing, build_correction_prompt([gst_data[i] for i in failing], [issues[i] for i in failing])
+
+def apply_corrections(state, gst_data, issues, failing, response):
+    """Keep each corrected record that has fewer issues than the original"""
+    try:
+        start, end = response.find('['), response.rfind(']')
+        corrected = json.loads(response[start:end + 1] if start != -1 and end > start else response)
+    except Exception as e:
+        logger.warning("validation escalation failed file=%s: %s", state.get("file_path"), e)
+        return gst_data, issues
+
+    if not isinstance(corrected, list) or len(corrected) != len(failing):
+        logger.warning("validation escalation returned %s records for %d, ignoring file=%s",
+                       len(corrected) if isinstance(corrected, list) else "no", len(failing), state.get("file_path"))
+        return gst_data, issues
+
+    gst_data, issues = list(gst_data), list(issues)
+    for i, record in zip(failing, corrected):
+        if not isinstance(record, dict):
+            continue
+        record_issues = validate_record(record)
+        if len(record_issues) < len(issues[i]):
+            # Line items are not part of the correction request
+            record.setdefault("Items", gst_data[i].get("Items", []))
+            record.setdefault("HSN Code", gst_data[i].get("HSN Code", ""))
+            gst_data[i], issues[i] = record, record_issues
+    return gst_data, issues
+
+def escalate_failures(state, gst_data, issues):
+    """Ask the model to correct only the failing records; keep a correction when it has fewer issues"""
+    failing, prompt = _failing_records(gst_data, issues)
+    try:
+        response = generate_response_with_file(prompt, state.get("file_handle") or state.get("file_path"))
+    except Exception as e:
+        logger.warning("validation escalation failed file=%s: %s", state.get("file_path"), e)
+        return gst_data, issues
+    return apply_corrections(state, gst_data, issues, failing, response)
+
+async def escalate_failures_async(state, gst_data, issues):
+    failing, prompt = _failing_records(gst_data, issues)
+    try:
+        response = await generate_response_with_file_async(prompt, state.get("file_handle") or state.get("file_path"))
+    except Exception as e:
+        logger.warning("validation escalation failed file=%s: %s", state.get("file_path"), e)
+        return gst_data, issues
+    return await asyncio.to_thread(apply_corrections, state, gst_data, issues, failing, response)
+
+def _validated_state(state, gst_data, is_valid, issues):
+    for record_issues in issues:
+        for issue in record_issues:
+            VALIDATION_ISSUES.inc(code=issue["code"])
+    logger.debug("validated file=%s valid=%s issues=%d", state.get("file_path", ""), is_valid, sum(map(len, issues)))
+    return {**state, "gst_data": gst_data, "validated": is_valid, "validation_errors": issues}
 
 def validator_agent(state: dict):
+    """Validate parsed records with local rules; only failing records cost a model call"""
     gst_data = state.get("gst_data", [])
     file_path = state.get("file_path", "")
 
     if not gst_data:
-        print("[Validator Agent] ⚠️ No gst_data found for validation.")
-        return {**state, "validated": False}
-
-    print("[Validator Agent] 🧪 Validating parsed GST data using Gemini...")
-    prompt = (
-        "Check if this GST data is valid JSON and contains all the necessary fields. "
-        "Reply with only one word: 'Valid' or 'Invalid'.\n\n"
-        f"{gst_data}"
-    )
-    try:
-        response = generate_response_with_file(prompt, file_path)  # Pass file_path here
-        print("🔍 Gemini response:", response)
-        is_valid = "valid" in response.lower()
-        print(f"[Validator Agent] ✅ Validation: {is_valid}")
-        return {**state, "validated": is_valid}
-    except Exception as e:
-        print(f"[Validator Agent] ❌ Error during validation: {e}")
-        return {**state, "validated": False}
+        logger.info("no gst_data to validate file=%s", file_path)
+        return {**state, "validated": False, "validation_errors": []}
+
+    is_valid, issues = validate_records(gst_data)
+    if not is_valid and ESCALATE_FAILURES:
+        gst_data, issues = escalate_failures(state, gst_data, issues)
+        is_valid = not any(issues)
+    return _validated_state(state, gst_data, is_valid, issues)
+
+async def validator_agent_async(state: dict):
+    """validator_agent for graph.ainvoke: the escalation call is awaited instead of blocking a thread"""
+    gst_data = state.get("gst_data", [])
+    file_path = state.get("file_path", "")
 
+    if not gst_data:
+        logger.info("no gst_data to validate file=%s", file_path)
+        return {**state, "validated": False, "validation_errors": []}
 
-print("✅ Validator Agent loaded (confirmed fresh file)")
\ No newline at end of file
+    # The rule checks are CPU work; keep them off the event loop
+    is_valid, issues = await asyncio.to_thread(validate_records, gst_data)
+    if not is_valid and ESCALATE_FAILURES:
+        gst_data, issues = await escalate_failures_async(state, gst_data, issues)
+        is_valid = not any(issues)
+    return _validated_state(state, gst_data, is_valid, issues)
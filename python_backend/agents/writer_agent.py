@@ -1,163 +1,289 @@
-from openpyxl import Workbook
-from openpyxl.styles import Alignment
+import os
+import logging
+import threading
 
-def writer_agent(data: list, file_path: str):
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "GST Report"
-
-    # Reordered headers as requested
-    headers = [
-        "S.No.", "Vendor/Shop Name", "Date", "GSTIN", "Invoice No.", 
-        "HSN Codes", "CGST", "SGST", "IGST", "Total Tax", "Taxable Amount"
+from utils.invoice_model import normalize_records
+
+logger = logging.getLogger(__name__)
+
+# Reordered headers as requested
+HEADERS = [
+    "S.No.", "Vendor/Shop Name", "Date", "GSTIN", "Invoice No.",
+    "HSN Codes", "CGST", "SGST", "IGST", "Total Tax", "Taxable Amount", "Remarks"
+]
+
+# Invoice attribute behind each column after S.No.; utils.exporters uses the same mapping
+HEADER_FIELDS = {
+    "Vendor/Shop Name": "shop_name",
+    "Date": "invoice_date",
+    "GSTIN": "gstin",
+    "Invoice No.": "invoice_number",
+    "HSN Codes": "hsn_codes",
+    "CGST": "cgst",
+    "SGST": "sgst",
+    "IGST": "igst",
+    "Total Tax": "tax_amount",
+    "Taxable Amount": "total_amount",
+    "Remarks": "remarks",
+}
+
+# Set optimal column widths for proper cell fitting
+COLUMN_WIDTHS = {
+    'A': 8,   # S.No.
+    'B': 35,  # Vendor/Shop Name (wider for multi-line)
+    'C': 15,  # Date
+    'D': 18,  # GSTIN
+    'E': 20,  # Invoice No.
+    'F': 45,  # HSN Codes (wider for multiple codes)
+    'G': 12,  # CGST
+    'H': 12,  # SGST
+    'I': 12,  # IGST
+    'J': 12,  # Total Tax
+    'K': 15,  # Taxable Amount
+    'L': 40   # Remarks (duplicate flags)
+}
+
+# Columns (1-based) whose text wraps: Vendor/Shop Name, HSN Codes and Remarks
+WRAPPED_COLUMNS = (2, 6, 12)
+HEADER_ROW_HEIGHT = 25
+
+# "memory" builds a regular openpyxl workbook; "streaming" uses write-only mode
+DEFAULT_REPORT_WRITER = os.getenv("GST_REPORT_WRITER", "streaming")
+
+# Dates are written the way the GST portal shows them
+DATE_FORMAT = "%d-%m-%Y"
+# Records are normalized (utils.invoice_model) in chunks of this many rows
+NORMALIZE_CHUNK = 500
+
+def _amount_or_na(value):
+    # Zero amounts have always been reported as N/A
+    return "N/A" if value is None or value == 0 else value
+
+def format_invoice(invoice):
+    """Return (cell values after S.No., row height) for one normalized Invoice"""
+    shop_name = invoice.shop_name or "N/A"
+    line_count = shop_name.count('\n') + 1
+
+    # HSN codes, 3 codes per line (duplicates kept)
+    hsn_codes = invoice.hsn_codes
+    if hsn_codes:
+        hsn_value = "\n".join(", ".join(hsn_codes[i:i+3]) for i in range(0, len(hsn_codes), 3))
+        hsn_line_count = (len(hsn_codes) + 2) // 3
+    else:
+        hsn_value = "N/A"
+        hsn_line_count = 1
+
+    if invoice.invoice_date is not None:
+        date_value = invoice.invoice_date.strftime(DATE_FORMAT)
+    else:
+        date_value = invoice.invoice_date_text or "N/A"
+
+    values = [
+        shop_name,
+        date_value,
+        invoice.gstin or "N/A",
+        invoice.invoice_number or "N/A",
+        hsn_value,
+        _amount_or_na(invoice.cgst),
+        _amount_or_na(invoice.sgst),
+        _amount_or_na(invoice.igst),
+        _amount_or_na(invoice.tax_amount),
+        _amount_or_na(invoice.total_amount),
+        invoice.remarks or "",
     ]
 
-    # Set optimal column widths for proper cell fitting
-    column_widths = {
-        'A': 8,   # S.No.
-        'B': 35,  # Vendor/Shop Name (wider for multi-line)
-        'C': 15,  # Date
-        'D': 18,  # GSTIN
-        'E': 20,  # Invoice No.
-        'F': 45,  # HSN Codes (wider for multiple codes)
-        'G': 12,  # CGST
-        'H': 12,  # SGST
-        'I': 12,  # IGST
-        'J': 12,  # Total Tax
-        'K': 15   # Taxable Amount
-    }
-
-    # Apply column widths
-    for col_letter, width in column_widths.items():
-        ws.column_dimensions[col_letter].width = width
-
-    # Create simple headers with center alignment
-    for col, header in enumerate(headers, start=1):
-        cell = ws.cell(row=1, column=col)
-        cell.value = header
-        cell.alignment = Alignment(vertical='center', horizontal='center')
-
-    # Process data rows
-    for row_idx, record in enumerate(data, start=2):
-        # Serial number
-        cell = ws.cell(row=row_idx, column=1)
-        cell.value = row_idx - 1
-        cell.alignment = Alignment(horizontal='center', vertical='center')
-        
-        # Handle multi-line shop name properly
-        shop_name = record.get("Shop Name", "N/A")
-        hsn_line_count = 1  # Default for HSN codes
-        if isinstance(shop_name, str):
-            # Keep line breaks but clean them up
-            shop_name = shop_name.replace('\\n', '\n').strip()
-            # Count lines to determine row height
-            line_count = shop_name.count('\n') + 1
-        else:
-            line_count = 1
-            
-        # Pre-calculate HSN codes for row height calculation
-        items = record.get("Items", [])
-        if items and isinstance(items, list):
-            hsn_codes = []
-            for item in items:
-                if isinstance(item, dict) and "HSN Code" in item:
-                    hsn_code = str(item["HSN Code"]).strip()
-                    if hsn_code and hsn_code != "0" and hsn_code != "null":
-                        hsn_codes.append(hsn_code)
-            
-            if hsn_codes:
-                # Calculate line count based on all codes (3 codes per line)
-                hsn_line_count = (len(hsn_codes) + 2) // 3
-        
-        # Vendor/Shop Name with text wrapping (Column B)
-        cell = ws.cell(row=row_idx, column=2)
-        cell.value = shop_name
-        cell.alignment = Alignment(wrap_text=True, vertical='center', horizontal='center')
-        
-        # Date (Column C)
-        cell = ws.cell(row=row_idx, column=3)
-        date_value = record.get("Invoice Date", "N/A")
-        if date_value in (None, "", "null", 0, 0.0):
-            date_value = "N/A"
-        cell.value = date_value
-        cell.alignment = Alignment(vertical='center', horizontal='center')
-        
-        # GSTIN (Column D)
-        cell = ws.cell(row=row_idx, column=4)
-        gstin_value = record.get("GSTIN", "N/A")
-        if gstin_value in (None, "", "null", 0, 0.0):
-            gstin_value = "N/A"
-        cell.value = gstin_value
-        cell.alignment = Alignment(vertical='center', horizontal='center')
-        
-        # Invoice No. (Column E)
-        cell = ws.cell(row=row_idx, column=5)
-        invoice_value = record.get("Invoice Number", "N/A")
-        if invoice_value in (None, "", "null", 0, 0.0):
-            invoice_value = "N/A"
-        cell.value = invoice_value
-        cell.alignment = Alignment(vertical='center', horizontal='center')
-        
-        # HSN Codes (Column F) - get from Items array
-        items = record.get("Items", [])
-        cell = ws.cell(row=row_idx, column=6)
-        
-        if items and isinstance(items, list):
-            # Extract HSN codes from Items array
-            hsn_codes = []
-            for item in items:
-                if isinstance(item, dict) and "HSN Code" in item:
-                    hsn_code = str(item["HSN Code"]).strip()
-                    if hsn_code and hsn_code != "0" and hsn_code != "null":
-                        hsn_codes.append(hsn_code)
-            
-            if hsn_codes:
-                # Keep all HSN codes including duplicates, format for readability
-                # Group codes by 3 per line for optimal cell presentation
-                formatted_codes = []
-                for i in range(0, len(hsn_codes), 3):
-                    chunk = hsn_codes[i:i+3]
-                    formatted_codes.append(", ".join(chunk))
-                cell.value = "\n".join(formatted_codes)
-            else:
-                cell.value = "N/A"
-        else:
-            # Fallback to direct HSN Code field
-            hsn_codes = record.get("HSN Code", "N/A")
-            cell.value = hsn_codes if hsn_codes else "N/A"
-            
-        cell.alignment = Alignment(wrap_text=True, vertical='center', horizontal='center')
-        
-        # Tax columns: CGST, SGST, IGST, Total Tax (Columns G, H, I, J)
-        tax_data = [
-            record.get("CGST", "N/A"),
-            record.get("SGST", "N/A"),
-            record.get("IGST", "N/A"),
-            record.get("Tax Amount", "N/A")
-        ]
-        
-        for col_idx, value in enumerate(tax_data, start=7):
-            cell = ws.cell(row=row_idx, column=col_idx)
-            if value in (None, "", "null", 0, 0.0):
-                value = "N/A"
-            cell.value = value
+    # Set row height based on content (consider both shop name and HSN codes)
+    max_lines = max(line_count, hsn_line_count)
+    height = max(25, 15 + (max_lines * 15))
+    return values, height
+
+class _OrderedReport:
+    """
+    Shared row ordering and batch normalization for report builders; subclasses
+    implement _append (a list of Invoice objects) and _save.
+    """
+
+    def __init__(self):
+        self.next_row = 2
+        self.lock = threading.Lock()
+        # Out-of-order file results wait here so rows keep the batch's input order
+        self._pending = {}
+        self._next_index = 0
+        # Ordered raw records waiting to be normalized as one batch
+        self._buffer = []
+
+    @property
+    def row_count(self):
+        return self.next_row - 2 + len(self._buffer)
+
+    def _queue(self, records):
+        self._buffer.extend(records or [])
+        if len(self._buffer) >= NORMALIZE_CHUNK:
+            self._flush()
+
+    def _flush(self):
+        if self._buffer:
+            invoices = normalize_records(self._buffer)
+            self._buffer = []
+            self._append(invoices)
+
+    def add_records(self, records):
+        with self.lock:
+            self._queue(records)
+
+    def add_invoices(self, invoices):
+        """Append already normalized Invoice objects, e.g. read back from the invoice store"""
+        with self.lock:
+            self._flush()
+            self._append(invoices)
+
+    def add_file_result(self, index, records):
+        """Add one file's records; rows are emitted in file order even if files finish out of order"""
+        with self.lock:
+            self._pending[index] = records or []
+            while self._next_index in self._pending:
+                self._queue(self._pending.pop(self._next_index))
+                self._next_index += 1
+
+    def finalize(self, file_path):
+        with self.lock:
+            # Flush anything still waiting on a missing earlier index
+            for index in sorted(self._pending):
+                self._queue(self._pending.pop(index))
+            self._flush()
+            self._save(file_path)
+        logger.info("report saved path=%s", file_path)
+        return file_path
+
+class ReportBuilder(_OrderedReport):
+    """
+    Builds the GST report incrementally: rows are appended as each file finishes
+    and the workbook is saved exactly once in finalize().
+    """
+
+    def __init__(self):
+        from openpyxl import Workbook
+        from openpyxl.styles import Alignment
+
+        super().__init__()
+        self.wb = Workbook()
+        ws = self.wb.active
+        ws.title = "GST Report"
+        self.ws = ws
+
+        # Apply column widths
+        for col_letter, width in COLUMN_WIDTHS.items():
+            ws.column_dimensions[col_letter].width = width
+
+        # Create simple headers with center alignment
+        for col, header in enumerate(HEADERS, start=1):
+            cell = ws.cell(row=1, column=col)
+            cell.value = header
             cell.alignment = Alignment(vertical='center', horizontal='center')
-        
-        # Taxable Amount (Column K)
-        cell = ws.cell(row=row_idx, column=11)
-        taxable_value = record.get("Total Amount", "N/A")
-        if taxable_value in (None, "", "null", 0, 0.0):
-            taxable_value = "N/A"
-        cell.value = taxable_value
-        cell.alignment = Alignment(vertical='center', horizontal='center')
-        
-        # Set row height based on content (consider both shop name and HSN codes)
-        max_lines = max(line_count, hsn_line_count)
-        dynamic_height = max(25, 15 + (max_lines * 15))
-        ws.row_dimensions[row_idx].height = dynamic_height
-
-    # Set header row height
-    ws.row_dimensions[1].height = 25
-
-    wb.save(file_path)
-    print(f"📝 Excel report saved to: {file_path}")
\ No newline at end of file
+
+        # Set header row height
+        ws.row_dimensions[1].height = HEADER_ROW_HEIGHT
+
+    def _append(self, invoices):
+        from openpyxl.styles import Alignment
+
+        ws = self.ws
+        for invoice in invoices:
+            row_idx = self.next_row
+            values, height = format_invoice(invoice)
+            cell = ws.cell(row=row_idx, column=1)
+            cell.value = row_idx - 1
+            cell.alignment = Alignment(horizontal='center', vertical='center')
+            for col, value in enumerate(values, start=2):
+                cell = ws.cell(row=row_idx, column=col)
+                cell.value = value
+                cell.alignment = Alignment(wrap_text=col in WRAPPED_COLUMNS, vertical='center', horizontal='center')
+            ws.row_dimensions[row_idx].height = height
+            self.next_row += 1
+
+    def _save(self, file_path):
+        self.wb.save(file_path)
+
+class StreamingReportBuilder(_OrderedReport):
+    """
+    Write-only variant for very large reports: rows are streamed to a temporary
+    file as they are added, and every cell references one of two shared named
+    styles instead of carrying its own Alignment. Produces the same-looking sheet.
+    """
+
+    CENTER_STYLE = "gst_center"
+    WRAP_STYLE = "gst_wrap"
+
+    def __init__(self):
+        from openpyxl import Workbook
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Alignment, NamedStyle
+
+        super().__init__()
+        self._cell_type = WriteOnlyCell
+        self.wb = Workbook(write_only=True)
+        self.wb.add_named_style(NamedStyle(
+            self.CENTER_STYLE, alignment=Alignment(vertical='center', horizontal='center')
+        ))
+        self.wb.add_named_style(NamedStyle(
+            self.WRAP_STYLE, alignment=Alignment(wrap_text=True, vertical='center', horizontal='center')
+        ))
+        ws = self.wb.create_sheet("GST Report")
+        self.ws = ws
+
+        # Column and row dimensions must be set before the rows they apply to are written
+        for col_letter, width in COLUMN_WIDTHS.items():
+            ws.column_dimensions[col_letter].width = width
+        ws.row_dimensions[1].height = HEADER_ROW_HEIGHT
+        ws.append([self._cell(header, self.CENTER_STYLE) for header in HEADERS])
+        self._column_styles = [
+            self.WRAP_STYLE if col in WRAPPED_COLUMNS else self.CENTER_STYLE
+            for col in range(2, len(HEADERS) + 1)
+        ]
+
+    def _cell(self, value, style):
+        cell = self._cell_type(self.ws, value=value)
+        cell.style = style
+        return cell
+
+    def _append(self, invoices):
+        ws = self.ws
+        for invoice in invoices:
+            row_idx = self.next_row
+            values, height = format_invoice(invoice)
+            ws.row_dimensions[row_idx].height = height
+            row = [self._cell(row_idx - 1, self.CENTER_STYLE)]
+            row.extend(self._cell(value, style) for value, style in zip(values, self._column_styles))
+            ws.append(row)
+            self.next_row += 1
+
+    def _save(self, file_path):
+        self.wb.save(file_path)
+
+REPORT_BUILDERS = {
+    "memory": ReportBuilder,
+    "streaming": StreamingReportBuilder,
+}
+
+def new_report_builder(kind=None):
+    kind = kind or DEFAULT_REPORT_WRITER
+    if kind not in REPORT_BUILDERS:
+        raise ValueError(f"Unknown report writer: {kind} (expected one of {list(REPORT_BUILDERS)})")
+    return REPORT_BUILDERS[kind]()
+
+def write_report(records, file_path, kind=None):
+    """Write an iterable of records (consumed lazily) to an Excel report"""
+    builder = new_report_builder(kind)
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= NORMALIZE_CHUNK:
+            builder.add_records(chunk)
+            chunk = []
+    builder.add_records(chunk)
+    return builder.finalize(file_path)
+
+def writer_agent(data: list, file_path: str):
+    builder = ReportBuilder()
+    builder.add_records(data)
+    builder.finalize(file_path)
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Cold-start profile of the backend: what importing it costs and how long a fresh
+process takes to answer its first requests.
+
+Runs ``python -X importtime -c "import <module>"`` in a clean subprocess and sums
+the self time of every imported module by top-level package, so the heaviest
+dependencies stand out. Then starts the FastAPI app under uvicorn (fake Gemini
+backend) and measures, from process launch, when /health first answers and when
+a one-file /api/extract-gst upload first completes. Each figure is the median of
+--repeat fresh processes.
+
+    python benchmarks/bench_cold_start.py
+    python benchmarks/bench_cold_start.py --module simple_server --top 25 --no-server
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+from collections import defaultdict
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_pipeline import build_corpus, percentile
+from bench_health_latency import free_port
+
+
+def child_env(tmp):
+    env = dict(os.environ)
+    env.update({
+        "GEMINI_BACKEND": "fake",
+        "GEMINI_FAKE_LATENCY": "0",
+        "GST_FILE_STORE": "local",
+        "GST_CACHE_ENABLED": "0",
+        "GST_DUPLICATE_INDEX_ENABLED": "0",
+        "GST_INVOICE_DB": os.path.join(tmp, "invoices.db"),
+        "GST_JOB_DB": os.path.join(tmp, "jobs.db"),
+        "GST_REPORTS_DIR": os.path.join(tmp, "reports"),
+        "GST_UPLOAD_DIR": os.path.join(tmp, "uploads"),
+        "GST_LOG_LEVEL": "WARNING",
+        "PYTHONPATH": BACKEND_DIR + os.pathsep + env.get("PYTHONPATH", ""),
+    })
+    return env
+
+
+def import_profile(module, env):
+    """(total seconds, {module: (self, cumulative)}) parsed from -X importtime"""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    ).stderr
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = (int(self_us) / 1e6, int(cumulative_us) / 1e6)
+    return modules[module][1], modules
+
+
+def by_package(modules):
+    totals = defaultdict(float)
+    for name, (self_seconds, _) in modules.items():
+        totals[name.split(".")[0]] += self_seconds
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+def first_requests(env, pdf_path):
+    """Seconds from launching uvicorn until /health answers and until one extraction completes"""
+    import httpx
+
+    port = free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=None) as client:
+            while True:
+                try:
+                    client.get("/health").raise_for_status()
+                    break
+                except httpx.TransportError:
+                    if server.poll() is not None:
+                        raise RuntimeError("uvicorn exited before it answered /health")
+                    time.sleep(0.005)
+            health = time.perf_counter() - start
+            with open(pdf_path, "rb") as f:
+                client.post("/api/extract-gst", files=[("files", ("invoice.pdf", f, "application/pdf"))]).raise_for_status()
+            extraction = time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait()
+    return health, extraction
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main", help="module to import for the profile")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="packages to list in the profile")
+    parser.add_argument("--no-server", action="store_true", help="only profile the import")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = child_env(tmp)
+        runs = [import_profile(args.module, env) for _ in range(args.repeat)]
+        totals = [total for total, _ in runs]
+        print(f"import {args.module}: median {percentile(totals, 50) * 1000:.0f}ms "
+              f"(min {min(totals) * 1000:.0f}ms, {len(runs[0][1])} modules)")
+        print(f"{'package':<28} {'self ms':>8}")
+        for package, seconds in by_package(runs[-1][1])[:args.top]:
+            print(f"{package:<28} {seconds * 1000:>8.1f}")
+
+        if args.no_server:
+            return
+        corpus_dir = os.path.join(tmp, "corpus")
+        os.makedirs(corpus_dir)
+        pdf_path = build_corpus(corpus_dir, 1, 0)[0]
+        timings = [first_requests(env, pdf_path) for _ in range(args.repeat)]
+        print(f"first /health:      median {percentile([t[0] for t in timings], 50) * 1000:.0f}ms after launch")
+        print(f"first extract-gst:  median {percentile([t[1] for t in timings], 50) * 1000:.0f}ms after launch")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Checks that /health stays responsive while /api/extract-gst runs a large batch.
+
+Starts the FastAPI app under uvicorn (one worker process, fake Gemini backend)
+and runs --rounds rounds against it. Each round probes /health while idle, then
+keeps probing while a batch of synthetic invoices (see bench_pipeline.build_corpus)
+is uploaded and extracted. A probe's latency is counted from when it was due, so
+an event loop that stalls shows up even if the request itself is quick once it
+gets through.
+
+Enforced: every batch returns HTTP 200, and the median over rounds of the p99
+under load is at most the larger of --max-ratio times the median idle p99 and
+--floor-ms. A single round's p99 rests on a handful of probes and swings with
+scheduler noise; the median over rounds does not. Per-round figures and the
+worst probe are printed but not enforced. Needs at least two CPU cores: on a
+single core the probes also wait for the batch's worker threads, whatever the
+event loop does.
+
+    python benchmarks/bench_health_latency.py
+    python benchmarks/bench_health_latency.py --files 2000 --latency 0.2
+"""
+import os
+import sys
+import time
+import socket
+import argparse
+import statistics
+import tempfile
+import threading
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_pipeline import build_corpus, percentile
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def server_env(args, tmp):
+    env = dict(os.environ)
+    env.update({
+        "GEMINI_BACKEND": "fake",
+        "GEMINI_FAKE_LATENCY": str(args.latency),
+        # Measure the event loop, not the free-tier quota
+        "GEMINI_RPM": "1000000000",
+        "GEMINI_TPM": "1000000000000",
+        "GEMINI_MAX_IN_FLIGHT": str(args.workers),
+        "GST_MAX_WORKERS": str(args.workers),
+        "GST_FILE_STORE": "local",
+        "GST_CACHE_ENABLED": "0",
+        "GST_DUPLICATE_INDEX_ENABLED": "0",
+        "GST_INVOICE_DB": os.path.join(tmp, "invoices.db"),
+        "GST_JOB_DB": os.path.join(tmp, "jobs.db"),
+        "GST_REPORTS_DIR": os.path.join(tmp, "reports"),
+        "GST_UPLOAD_DIR": os.path.join(tmp, "uploads"),
+        "GST_LOG_LEVEL": "WARNING",
+        "PYTHONPATH": BACKEND_DIR + os.pathsep + env.get("PYTHONPATH", ""),
+    })
+    return env
+
+
+def probe(client, interval, stop=None, seconds=None):
+    """/health latencies, each measured from when the probe was due"""
+    latencies = []
+    deadline = time.perf_counter() + seconds if seconds else None
+    while not (stop is not None and stop.is_set()) and not (deadline and time.perf_counter() > deadline):
+        due = time.perf_counter() + interval
+        time.sleep(interval)
+        client.get("/health").raise_for_status()
+        latencies.append(time.perf_counter() - due)
+    return latencies
+
+
+def main():
+    import httpx
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=200, help="files per round")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.05, help="fake model latency per call, seconds")
+    parser.add_argument("--workers", type=int, default=8, help="GST_MAX_WORKERS for the batch")
+    parser.add_argument("--interval", type=float, default=0.02, help="pause between /health probes, seconds")
+    parser.add_argument("--idle-seconds", type=float, default=1.0, help="idle probing per round, seconds")
+    parser.add_argument("--max-ratio", type=float, default=3.0)
+    parser.add_argument("--floor-ms", type=float, default=25.0)
+    args = parser.parse_args()
+    if (os.cpu_count() or 1) < 2:
+        print("note: fewer than two CPU cores; the thresholds assume at least two and will likely fail here")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus_dir = os.path.join(tmp, "corpus")
+        os.makedirs(corpus_dir)
+        files = build_corpus(corpus_dir, args.files, 0.5)
+
+        port = free_port()
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+            cwd=BACKEND_DIR, env=server_env(args, tmp), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+
+        def upload(outcome, stop):
+            uploads = [("files", (os.path.basename(path), open(path, "rb"), "application/pdf")) for path in files]
+            start = time.perf_counter()
+            try:
+                with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=None) as uploader:
+                    outcome["status"] = uploader.post("/api/extract-gst", files=uploads).status_code
+            finally:
+                for _, (_, handle, _) in uploads:
+                    handle.close()
+                outcome["seconds"] = time.perf_counter() - start
+                stop.set()
+
+        idle_p99s, busy_p99s, statuses = [], [], []
+        try:
+            with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=None) as client:
+                for _ in range(300):
+                    try:
+                        client.get("/health").raise_for_status()
+                        break
+                    except httpx.TransportError:
+                        time.sleep(0.1)
+                for round_number in range(1, args.rounds + 1):
+                    idle = probe(client, args.interval, seconds=args.idle_seconds)
+
+                    outcome = {}
+                    stop = threading.Event()
+                    thread = threading.Thread(target=upload, args=(outcome, stop))
+                    thread.start()
+                    busy = probe(client, args.interval, stop=stop)
+                    thread.join()
+
+                    idle_p99s.append(percentile(idle, 99) * 1000)
+                    busy_p99s.append(percentile(busy, 99) * 1000)
+                    statuses.append(outcome.get("status"))
+                    print(f"round {round_number}: {args.files} files in {outcome['seconds']:.2f}s -> HTTP {outcome.get('status')}; "
+                          f"/health idle p99={idle_p99s[-1]:.1f}ms (n={len(idle)}), "
+                          f"batch p50={percentile(busy, 50) * 1000:.1f}ms p99={busy_p99s[-1]:.1f}ms "
+                          f"max={max(busy) * 1000:.1f}ms (n={len(busy)})")
+        finally:
+            server.terminate()
+            server.wait()
+
+    idle_p99 = statistics.median(idle_p99s)
+    busy_p99 = statistics.median(busy_p99s)
+    print(f"median over {args.rounds} rounds: idle p99={idle_p99:.1f}ms batch p99={busy_p99:.1f}ms")
+
+    limit = max(idle_p99 * args.max_ratio, args.floor_ms)
+    if any(status != 200 for status in statuses) or busy_p99 > limit:
+        print(f"FAIL: median p99 under load {busy_p99:.1f}ms exceeds {limit:.1f}ms (or a batch failed)")
+        sys.exit(1)
+    print(f"OK: median p99 under load stays within {limit:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
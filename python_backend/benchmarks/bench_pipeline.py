@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Offline end-to-end benchmark of the extraction pipeline using the fake Gemini backend.
+
+Builds a synthetic corpus of small invoice PDFs (a mix of digital PDFs with a text
+layer and text-less "scans"), runs it through one of the entry points and reports
+throughput, per-file p50/p95/p99 latency and peak RSS. Every configuration runs in
+its own subprocess; no network or API key is needed.
+
+    python benchmarks/bench_pipeline.py --files 10 100 1000
+    python benchmarks/bench_pipeline.py --files 10000 --entry batch --latency 0.2 --error-rate 0.02
+
+Entry points: "graph" invokes build_gst_graph() once per file, "batch" uses
+utils.batch_runner.run_batch, "server" uses simple_server.process_invoice_files
+(including the Excel report).
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import tempfile
+import contextlib
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+ENTRY_POINTS = ["graph", "batch", "server"]
+
+
+def build_corpus(directory, count, scanned_ratio):
+    import fitz
+
+    paths = []
+    scanned_every = round(1 / scanned_ratio) if scanned_ratio > 0 else 0
+    for i in range(count):
+        doc = fitz.open()
+        page = doc.new_page()
+        if not (scanned_every and i % scanned_every == 0):
+            page.insert_textbox(fitz.Rect(50, 50, 550, 800), (
+                f"TAX INVOICE  GSTIN: 27AAPFU0939F1ZV  Invoice No: BENCH-{i:06d}  Date: 2024-01-02\n"
+                + "Item HSN 62052000 Amount 100.00 CGST 9.00 SGST 9.00 Total Tax 18.00\n" * 6
+            ))
+        else:
+            # No text layer: forces the OCR path; the drawing keeps every file's bytes distinct
+            page.draw_rect(fitz.Rect(50, 50, 60 + i % 400, 60 + i // 400 % 700))
+        path = os.path.join(directory, f"invoice_{i:06d}.pdf")
+        doc.save(path)
+        doc.close()
+        paths.append(path)
+    return paths
+
+
+class TimedGraph:
+    """Records how long each graph.invoke() takes"""
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.latencies = []
+
+    def invoke(self, state, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self.graph.invoke(state, *args, **kwargs)
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run_single(args):
+    """Child process: run one configuration and print a JSON result line"""
+    from graphs.gst_extraction_graph import build_gst_graph
+    from utils import gemini_client
+
+    with tempfile.TemporaryDirectory() as tmp:
+        files = build_corpus(tmp, args.files[0], args.scanned_ratio)
+        graph = TimedGraph(build_gst_graph(mode=args.mode))
+        failed = 0
+
+        # The agents log every step; keep the benchmark output readable
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            if args.entry == "graph":
+                for path in files:
+                    failed += bool(graph.invoke({"file_path": path}).get("error"))
+            elif args.entry == "batch":
+                from utils.batch_runner import run_batch
+                results = run_batch(graph, files, max_workers=args.workers, pack=args.pack)
+                failed = sum(1 for r in results if r["error"])
+            else:
+                import simple_server
+                simple_server.get_graph = lambda mode=None: graph
+                result = simple_server.process_invoice_files(files, max_workers=args.workers, mode=args.mode, pack=args.pack)
+                failed = len(result.get("failed_files") or [])
+            elapsed = time.perf_counter() - start
+
+    latencies = graph.latencies
+    print(json.dumps({
+        "entry": args.entry,
+        "mode": args.mode,
+        "files": len(files),
+        "seconds": round(elapsed, 3),
+        "files_per_sec": round(len(files) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "failed": failed,
+        "model_calls": getattr(gemini_client.gemini_model, "calls", None),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }))
+
+
+def child_env(args, reports_dir):
+    env = dict(os.environ)
+    env.update({
+        "GEMINI_BACKEND": "fake",
+        "GEMINI_FAKE_LATENCY": str(args.latency),
+        "GEMINI_FAKE_JITTER": str(args.jitter),
+        "GEMINI_FAKE_ERROR_RATE": str(args.error_rate),
+        # Measure the pipeline, not the free-tier quota
+        "GEMINI_RPM": "1000000000",
+        "GEMINI_TPM": "1000000000000",
+        "GEMINI_MAX_IN_FLIGHT": str(args.in_flight),
+        "GEMINI_BACKOFF_BASE": "0.01",
+        "GST_FILE_STORE": "local",
+        "GST_CACHE_ENABLED": "0",
+        # Every run reuses the same synthetic corpus; a persistent index would short-circuit it
+        "GST_DUPLICATE_INDEX_ENABLED": "0",
+        "GST_REPORTS_DIR": reports_dir,
+        "GST_INVOICE_DB": os.path.join(reports_dir, "invoices.db"),
+        "PYTHONPATH": BACKEND_DIR + os.pathsep + env.get("PYTHONPATH", ""),
+    })
+    return env
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--entry", nargs="+", choices=ENTRY_POINTS, default=["graph", "batch"])
+    parser.add_argument("--mode", choices=["pipeline", "single"], default="pipeline")
+    parser.add_argument("--workers", type=int, default=8, help="batch worker threads")
+    parser.add_argument("--in-flight", type=int, default=16, help="GEMINI_MAX_IN_FLIGHT for the run")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake model latency per call, seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random latency per call, seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of fake calls failing with a retryable error")
+    parser.add_argument("--scanned-ratio", type=float, default=0.5, help="share of files without a text layer")
+    parser.add_argument("--pack", action="store_true", help="pack small files several to a model request (batch/server)")
+    parser.add_argument("--single", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        args.entry = args.entry[0]
+        run_single(args)
+        return
+
+    passthrough = [
+        "--mode", args.mode, "--workers", str(args.workers), "--in-flight", str(args.in_flight),
+        "--latency", str(args.latency), "--jitter", str(args.jitter),
+        "--error-rate", str(args.error_rate), "--scanned-ratio", str(args.scanned_ratio),
+    ] + (["--pack"] if args.pack else [])
+    print(f"{'entry':<7} {'files':>6} {'seconds':>8} {'files/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'failed':>6} {'calls':>7} {'peak RSS MB':>12}")
+    with tempfile.TemporaryDirectory() as reports_dir:
+        for count in args.files:
+            for entry in args.entry:
+                output = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), "--single", "--entry", entry,
+                     "--files", str(count), *passthrough],
+                    capture_output=True, text=True, check=True, env=child_env(args, reports_dir),
+                ).stdout
+                r = json.loads(output.strip().splitlines()[-1])
+                print(f"{r['entry']:<7} {r['files']:>6} {r['seconds']:>8} {r['files_per_sec']:>8} {r['p50_ms']:>8} "
+                      f"{r['p95_ms']:>8} {r['p99_ms']:>8} {r['failed']:>6} {r['model_calls'] or '-':>7} {r['peak_rss_mb']:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Compare upload size and latency of invoice photos with and without preprocessing.
+
+Pass sample invoice images, or let the script synthesize phone-style photos
+(4000x3000, page on a dark background with noise). Upload time is modelled from
+--mbps; --live also times a real Gemini OCR call on the original and processed file.
+
+    python benchmarks/bench_preprocess.py --presets balanced compact
+    python benchmarks/bench_preprocess.py invoices/*.jpg --live
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw, ImageFilter
+
+from utils.image_preprocess import PRESETS, preprocess_image
+
+
+def synthetic_photo(path, seed, size=(4000, 3000)):
+    """A white invoice page, slightly rotated, on a noisy dark table"""
+    rng = random.Random(seed)
+    photo = Image.effect_noise(size, 40).convert("RGB").point(lambda v: v // 3)
+    page = Image.new("RGB", (2100, 2970), "white")
+    draw = ImageDraw.Draw(page)
+    for line in range(60):
+        y = 120 + line * 45
+        draw.text((120, y), f"Item {line:02d}  HSN {rng.randint(10000000, 99999999)}  "
+                            f"Qty {rng.randint(1, 50)}  Amount {rng.uniform(10, 9999):.2f}", fill="black")
+    page = page.rotate(rng.uniform(-4, 4), expand=True, fillcolor=(30, 30, 30))
+    page = page.resize((int(page.width * 1.2), int(page.height * 0.9)))
+    photo.paste(page, ((size[0] - page.width) // 2, (size[1] - page.height) // 2))
+    photo.filter(ImageFilter.GaussianBlur(0.6)).save(path, format="JPEG", quality=95)
+    return path
+
+
+def timed_ocr(file_path):
+    from utils.gemini_client import generate_response_with_file
+
+    start = time.perf_counter()
+    generate_response_with_file("Extract raw readable text from this GST invoice for further parsing.", file_path)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="*", help="sample invoice images (default: synthetic photos)")
+    parser.add_argument("--synthetic", type=int, default=5, help="synthetic photos to generate when no files are given")
+    parser.add_argument("--presets", nargs="+", choices=[p for p in PRESETS if p != "off"], default=["high", "balanced", "compact"])
+    parser.add_argument("--mbps", type=float, default=10.0, help="upload bandwidth used to model upload time")
+    parser.add_argument("--live", action="store_true", help="also time a real Gemini OCR call per file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        files = args.files or [synthetic_photo(os.path.join(tmp, f"photo_{i}.jpg"), i) for i in range(args.synthetic)]
+        bytes_per_sec = args.mbps * 1_000_000 / 8
+
+        print(f"{'preset':<10} {'files':>5} {'orig MB':>9} {'sent MB':>9} {'saved':>7} "
+              f"{'prep ms/file':>13} {'upload s (orig)':>16} {'prep+upload s':>16}")
+        for preset in args.presets:
+            original = sent = 0
+            prep_seconds = 0.0
+            live = []
+            for file_path in files:
+                start = time.perf_counter()
+                stats = preprocess_image(file_path, preset, output_dir=tmp)
+                prep_seconds += time.perf_counter() - start
+                original += stats["original_bytes"]
+                sent += stats["processed_bytes"]
+                if args.live:
+                    live.append((timed_ocr(file_path), timed_ocr(stats["path"])))
+                if stats["path"] != file_path:
+                    os.remove(stats["path"])
+
+            print(f"{preset:<10} {len(files):>5} {original / 1e6:>9.2f} {sent / 1e6:>9.2f} "
+                  f"{1 - sent / original:>7.1%} {prep_seconds / len(files) * 1000:>13.1f} "
+                  f"{original / bytes_per_sec:>16.2f} {sent / bytes_per_sec + prep_seconds:>16.2f}")
+            if live:
+                before = sum(t for t, _ in live) / len(live)
+                after = sum(t for _, t in live) / len(live)
+                print(f"{'':<10} live OCR latency per file: {before:.2f}s original, {after:.2f}s preprocessed")
+
+
+if __name__ == "__main__":
+    main()
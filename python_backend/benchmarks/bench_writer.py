@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Compare Excel report writers on synthetic invoices: rows/sec and peak RSS.
+
+Each writer runs in its own subprocess so peak memory is measured independently.
+
+    python benchmarks/bench_writer.py --rows 10000 50000
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import subprocess
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WRITERS = ["memory", "streaming"]
+
+
+def synthetic_records(count, seed=42):
+    rng = random.Random(seed)
+    for i in range(count):
+        tax = round(rng.uniform(10, 5000), 2)
+        yield {
+            "Shop Name": f"Vendor {i % 500}\\nUnit {rng.randint(1, 99)}, Industrial Area",
+            "GSTIN": f"{rng.randint(1, 37):02d}AAACL{rng.randint(1000, 9999)}J1Z{rng.randint(0, 9)}",
+            "Invoice Number": f"INV-{i:07d}",
+            "Invoice Date": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            "Total Amount": f"{tax * 10:.2f}",
+            "Tax Amount": f"{tax:.2f}",
+            "CGST": f"{tax / 2:.2f}",
+            "SGST": f"{tax / 2:.2f}",
+            "IGST": "N/A",
+            "Items": [{"HSN Code": str(rng.randint(10000000, 99999999))} for _ in range(rng.randint(1, 9))],
+        }
+
+
+def run_single(writer, rows):
+    """Child process: write one report and print a JSON result line"""
+    from agents.writer_agent import writer_agent, write_report
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "report.xlsx")
+        start = time.perf_counter()
+        if writer == "memory":
+            # The original path: materialise the batch, then build the whole workbook in memory
+            writer_agent(list(synthetic_records(rows)), path)
+        else:
+            write_report(synthetic_records(rows), path, kind=writer)
+        elapsed = time.perf_counter() - start
+        size = os.path.getsize(path)
+
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({
+        "writer": writer,
+        "rows": rows,
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(rows / elapsed, 1),
+        "peak_rss_mb": round(peak_kb / 1024, 1),
+        "file_kb": round(size / 1024, 1),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--writers", nargs="+", choices=WRITERS, default=WRITERS)
+    parser.add_argument("--single", choices=WRITERS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        run_single(args.single, args.rows[0])
+        return
+
+    print(f"{'writer':<10} {'rows':>8} {'seconds':>9} {'rows/sec':>10} {'peak RSS MB':>12} {'file KB':>9}")
+    for rows in args.rows:
+        for writer in args.writers:
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--single", writer, "--rows", str(rows)],
+                capture_output=True, text=True, check=True,
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{result['writer']:<10} {result['rows']:>8} {result['seconds']:>9} "
+                  f"{result['rows_per_sec']:>10} {result['peak_rss_mb']:>12} {result['file_kb']:>9}")
+
+
+if __name__ == "__main__":
+    main()
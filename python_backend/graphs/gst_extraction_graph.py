@@ -1,35 +1,222 @@
-from langgraph.graph import StateGraph
-from typing import TypedDict, Optional
+import os
+import logging
+import threading
+from functools import wraps
+from typing import TypedDict, Optional, Any
 
-from agents.ocr_agent import ocr_agent
-from agents.parser_agent import parser_agent
-from agents.validator_agent import validator_agent
-from agents.writer_agent import writer_agent
+from agents.ocr_agent import ocr_agent, ocr_agent_async
+from agents.parser_agent import parser_agent, parser_agent_async
+from agents.validator_agent import validator_agent, validator_agent_async
+from agents.extraction_agent import extraction_agent, extraction_agent_async
+from agents.text_layer_agent import text_layer_agent
+from utils import gemini_client
+from utils.gemini_client import MODEL_NAME
+from utils.extraction_cache import get_default_cache, hash_file, version_tag
+from utils.file_store import get_default_file_store
+from utils.image_preprocess import preprocess_image
+from utils.metrics import timed_node, timed_node_async, CACHE_LOOKUPS, UPLOAD_BYTES
+
+logger = logging.getLogger(__name__)
 
 # Step 1: Define the shared state structure using TypedDict
 class GSTState(TypedDict):
     file_path: Optional[str]
-    output_path: Optional[str]
     raw_text: Optional[str]
     gst_data: Optional[list]
     validated: Optional[bool]
+    error: Optional[str]
+    file_hash: Optional[str]
+    cache_hit: Optional[bool]
+    validation_errors: Optional[list]
+    file_handle: Optional[Any]
+    text_source: Optional[str]  # "local" (PDF text layer) or "gemini" (model OCR)
+    text_layer_score: Optional[float]
+    upload_path: Optional[str]  # preprocessed copy sent to the model, if any
+    preprocess: Optional[dict]  # original/processed byte counts for the upload
+
+# "pipeline" runs OCR -> Parser -> local Validator (two model calls per file, one with a text layer);
+# "single" extracts from one schema-constrained call and validates locally
+EXTRACTION_MODES = ("pipeline", "single")
+DEFAULT_EXTRACTION_MODE = os.getenv("GST_EXTRACTION_MODE", "pipeline")
+
+# Cache nodes: a hit skips every model call for the file
+def cache_lookup_node(state, cache, mode):
+    if cache is None:
+        return {**state, "cache_hit": False}
+    file_hash = state.get("file_hash") or hash_file(state["file_path"])
+    entry = cache.get(file_hash, version_tag(MODEL_NAME, mode))
+    if entry is None:
+        CACHE_LOOKUPS.inc(result="miss")
+        return {**state, "file_hash": file_hash, "cache_hit": False}
+    CACHE_LOOKUPS.inc(result="hit")
+    logger.debug("cache hit file=%s", state["file_path"])
+    return {
+        **state,
+        "file_hash": file_hash,
+        "cache_hit": True,
+        "gst_data": entry["gst_data"],
+        "validated": entry["validated"],
+    }
+
+def cache_store_node(state, cache, mode):
+    # Only cache clean extractions; failures should be retried on the next upload
+    if cache is not None and state.get("file_hash") and state.get("gst_data") and not state.get("error"):
+        cache.put(state["file_hash"], version_tag(MODEL_NAME, mode), state["gst_data"], state.get("validated", False))
+    return state
+
+# Preprocess node: photos are normalized and shrunk before they are uploaded
+def preprocess_node(state, preset):
+    try:
+        stats = preprocess_image(state["file_path"], preset)
+    except Exception as e:
+        logger.warning("preprocessing failed, sending original file=%s: %s", state["file_path"], e)
+        return {**state, "upload_path": None, "preprocess": None}
+    upload_path = stats.pop("path")
+    if stats["bytes_saved"]:
+        logger.debug("preprocessed file=%s original_bytes=%d processed_bytes=%d",
+                     state["file_path"], stats["original_bytes"], stats["processed_bytes"])
+    return {**state, "upload_path": upload_path if upload_path != state["file_path"] else None, "preprocess": stats}
+
+# Upload nodes: the file is uploaded once and every agent references the handle
+def upload_node(state, file_store):
+    try:
+        handle = file_store.upload(state.get("upload_path") or state["file_path"])
+    except Exception as e:
+        # Agents fall back to sending the file inline when there is no handle
+        logger.warning("upload failed, sending file inline instead file=%s: %s", state["file_path"], e)
+        return {**state, "file_handle": None}
+    UPLOAD_BYTES.inc(handle.size, path="file_store")
+    return {**state, "file_handle": handle}
+
+def cleanup_node(state):
+    # Uploaded Gemini files also expire on their own after 48h if this is never reached
+    handle = state.get("file_handle")
+    if handle is not None:
+        try:
+            handle.store.delete(handle)
+        except Exception as e:
+            logger.warning("could not delete uploaded file name=%s: %s", handle.name, e)
+    upload_path = state.get("upload_path")
+    if upload_path:
+        try:
+            os.remove(upload_path)
+        except OSError:
+            pass
+    return {**state, "file_handle": None, "upload_path": None}
+
+def cleanup_on_error(fn):
+    """Run cleanup_node on the node's input if it raises; a failed run skips the Cleanup edge"""
+
+    @wraps(fn)
+    def node(state):
+        try:
+            return fn(state)
+        except Exception:
+            cleanup_node(state)
+            raise
+
+    return node
+
+def cleanup_on_error_async(fn):
+    """cleanup_on_error for coroutine nodes run by graph.ainvoke"""
+
+    @wraps(fn)
+    async def node(state):
+        try:
+            return await fn(state)
+        except Exception:
+            cleanup_node(state)
+            raise
+
+    return node
+
+def model_node(name, fn, afn):
+    """
+    A node with a sync body for graph.invoke and a coroutine for graph.ainvoke, so
+    model calls are awaited on the event loop. Nodes without a coroutine body are
+    run in LangGraph's executor under ainvoke and never block the loop either.
+    Model nodes run after Upload, so both bodies release the upload if they raise.
+    """
+    from langchain_core.runnables import RunnableLambda
+
+    return RunnableLambda(
+        timed_node(name, cleanup_on_error(fn)),
+        afunc=timed_node_async(name, cleanup_on_error_async(afn)),
+        name=name,
+    )
 
 # Step 2: Build the LangGraph
-def build_gst_graph():
+def build_gst_graph(cache=None, mode=None, file_store=None, image_preset=None):
+    # LangGraph is imported here rather than at module level; it is the slowest import in the backend
+    from langgraph.graph import StateGraph, END
+
+    mode = mode or DEFAULT_EXTRACTION_MODE
+    if mode not in EXTRACTION_MODES:
+        raise ValueError(f"Unknown extraction mode: {mode} (expected one of {EXTRACTION_MODES})")
+    if cache is None:
+        cache = get_default_cache()
+    if file_store is None:
+        file_store = get_default_file_store()
+
     builder = StateGraph(GSTState)
     # Add agent nodes
-    builder.add_node("OCR", lambda state: ocr_agent(state))  # ocr_agent returns {**state, ...}
-    builder.add_node("Parser", lambda state: parser_agent(state))  # parser_agent returns {**state, ...}
-    builder.add_node("Validator", lambda state: validator_agent(state))  # validator_agent returns {**state, ...}
-    builder.add_node("Writer", lambda state: (
-        print("📝 Writer received keys:", list(state.keys())) or
-        writer_agent(state["gst_data"], state["output_path"]) or
-        state  # Return the state unchanged after writing file
-    ))
+    builder.add_node("CacheLookup", timed_node("CacheLookup", lambda state: cache_lookup_node(state, cache, mode)))
+    builder.add_node("Preprocess", timed_node("Preprocess", lambda state: preprocess_node(state, image_preset)))
+    builder.add_node("Upload", timed_node("Upload", cleanup_on_error(lambda state: upload_node(state, file_store))))
+    if mode == "single":
+        builder.add_node("Extract", model_node("Extract", extraction_agent, extraction_agent_async))  # extraction_agent returns {**state, ...}
+    else:
+        builder.add_node("TextLayer", timed_node("TextLayer", cleanup_on_error(lambda state: text_layer_agent(state))))  # text_layer_agent returns {**state, ...}
+        builder.add_node("OCR", model_node("OCR", ocr_agent, ocr_agent_async))  # ocr_agent returns {**state, ...}
+        builder.add_node("Parser", model_node("Parser", parser_agent, parser_agent_async))  # parser_agent returns {**state, ...}
+        builder.add_node("Validator", model_node("Validator", validator_agent, validator_agent_async))  # validator_agent returns {**state, ...}
+    builder.add_node("CacheStore", timed_node("CacheStore", cleanup_on_error(lambda state: cache_store_node(state, cache, mode))))
+    builder.add_node("Cleanup", timed_node("Cleanup", lambda state: cleanup_node(state)))
+    # The graph only produces data; reports are built once per batch by agents.writer_agent.ReportBuilder
     # Define the graph edges
-    builder.set_entry_point("OCR")
-    builder.add_edge("OCR", "Parser")
-    builder.add_edge("Parser", "Validator")
-    builder.add_edge("Validator", "Writer")
-    builder.set_finish_point("Writer")
-    return builder.compile()
\ No newline at end of file
+    first_node = "Extract" if mode == "single" else "TextLayer"
+    builder.set_entry_point("CacheLookup")
+    builder.add_conditional_edges(
+        "CacheLookup",
+        lambda state: END if state.get("cache_hit") else "Preprocess",
+        {END: END, "Preprocess": "Preprocess"},
+    )
+    builder.add_edge("Preprocess", "Upload")
+    builder.add_edge("Upload", first_node)
+    if mode == "single":
+        builder.add_edge("Extract", "CacheStore")
+    else:
+        # Digital PDFs with a usable text layer go straight to the parser
+        builder.add_conditional_edges(
+            "TextLayer",
+            lambda state: "Parser" if state.get("text_source") == "local" else "OCR",
+            {"Parser": "Parser", "OCR": "OCR"},
+        )
+        builder.add_edge("OCR", "Parser")
+        builder.add_edge("Parser", "Validator")
+        builder.add_edge("Validator", "CacheStore")
+    builder.add_edge("CacheStore", "Cleanup")
+    builder.set_finish_point("Cleanup")
+    graph = builder.compile()
+    # The batch runner tags files it records in the duplicate index with this
+    graph.version_tag = version_tag(MODEL_NAME, mode)
+    return graph
+
+# Compiled graphs shared by every request in the process, keyed by extraction mode
+_graphs = {}
+_graphs_lock = threading.Lock()
+
+def get_gst_graph(mode=None):
+    """The process-wide graph for ``mode`` with the default cache and file store, compiled once"""
+    mode = mode or DEFAULT_EXTRACTION_MODE
+    with _graphs_lock:
+        if mode not in _graphs:
+            _graphs[mode] = build_gst_graph(mode=mode)
+        return _graphs[mode]
+
+def warm_up(mode=None):
+    """Compile the graph and load the model SDK and pandas before the first file arrives"""
+    import pandas  # noqa: F401 -- imported for its side effect; utils.invoice_model uses it when results are normalized
+
+    gemini_client.warm_up()
+    return get_gst_graph(mode)
@@ -0,0 +1,124 @@
+import os
+import uuid
+import logging
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+from jobs.job_store import JobStore, RUNNING, COMPLETED, FAILED, PENDING
+from utils import report_store
+from utils.upload_spool import UPLOAD_SPOOL_DIR
+
+logger = logging.getLogger(__name__)
+
+JOB_SPOOL_DIR = os.path.join(UPLOAD_SPOOL_DIR, "jobs")
+
+# Jobs run side by side; each job additionally fans out over GST_MAX_WORKERS files
+MAX_CONCURRENT_JOBS = int(os.getenv("GST_JOB_WORKERS", "2"))
+
+TERMINAL_STATUSES = (COMPLETED, FAILED)
+
+
+class JobManager:
+    """Runs extraction jobs on a background pool and records progress in the JobStore"""
+
+    def __init__(self, store=None, max_concurrent_jobs=MAX_CONCURRENT_JOBS):
+        self.store = store or JobStore()
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrent_jobs, thread_name_prefix="gst-job")
+
+    def _graph_for(self, mode):
+        from graphs.gst_extraction_graph import get_gst_graph
+
+        return get_gst_graph(mode)
+
+    def new_job_id(self):
+        return uuid.uuid4().hex
+
+    def spool_dir(self, job_id):
+        """Uploads for a job live here until the job finishes, so a restart can resume them"""
+        path = os.path.join(JOB_SPOOL_DIR, job_id)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def output_path(self, job_id):
+        return report_store.report_path(job_id)
+
+    def submit(self, job_id, files, mode=None, file_hashes=None):
+        """
+        Register a job for already-spooled ``(file_path, file_name)`` pairs and queue it.
+        ``file_hashes`` are the files' SHA-256 digests from the upload spool; they are
+        stored with the job so a resumed job does not hash its files again either.
+        """
+        self.store.create_job(job_id, files, mode=mode, file_hashes=file_hashes)
+        self.executor.submit(self._run, job_id)
+        return job_id
+
+    def recover(self):
+        """Re-queue jobs that were queued or running when the process stopped"""
+        job_ids = self.store.unfinished_jobs()
+        for job_id in job_ids:
+            logger.info("resuming job=%s", job_id)
+            self.executor.submit(self._run, job_id)
+        return job_ids
+
+    def snapshot(self, job_id):
+        job = self.store.get_job(job_id)
+        if job is None:
+            return None
+        files = self.store.get_files(job_id)
+        job["completed_files"] = sum(1 for f in files if f["status"] != PENDING)
+        job["files"] = files
+        return job
+
+    def _run(self, job_id):
+        from agents.writer_agent import new_report_builder
+        from utils.batch_runner import run_batch, collect_invoices
+
+        try:
+            job = self.store.get_job(job_id)
+            if job is None or job["status"] in TERMINAL_STATUSES:
+                return
+            self.store.set_status(job_id, RUNNING)
+
+            report = new_report_builder()
+            # Results recorded before a restart go straight into the report
+            for idx, result in enumerate(self.store.get_results(job_id)):
+                if result is not None:
+                    report.add_file_result(idx, result.get("gst_data"))
+
+            # Only files without a recorded result are (re)processed after a restart
+            pending = [f for f in self.store.get_files(job_id) if f["status"] == PENDING]
+
+            def on_result(i, result):
+                self.store.record_file_result(job_id, pending[i]["idx"], result)
+                report.add_file_result(pending[i]["idx"], result.get("gst_data"))
+
+            if pending:
+                graph = self._graph_for(job["mode"])
+                run_batch(
+                    graph, [f["file_path"] for f in pending], on_result=on_result, batch_id=job_id,
+                    file_hashes=[f["file_hash"] for f in pending],
+                )
+
+            results = [r for r in self.store.get_results(job_id) if r]
+            invoices = collect_invoices(results)
+            if invoices:
+                output_path = report.finalize(self.output_path(job_id))
+                self.store.set_status(
+                    job_id, COMPLETED,
+                    message=f"Successfully processed {len(results)} files and extracted {len(invoices)} invoices",
+                    invoices_count=len(invoices),
+                    output_path=output_path,
+                )
+            else:
+                self.store.set_status(job_id, FAILED, message="No GST data could be extracted from the files", invoices_count=0)
+        except Exception as e:
+            logger.exception("job failed job=%s", job_id)
+            self.store.set_status(job_id, FAILED, message=f"Error processing files: {e}")
+        finally:
+            job = self.store.get_job(job_id)
+            if job is not None and job["status"] in TERMINAL_STATUSES:
+                shutil.rmtree(os.path.join(JOB_SPOOL_DIR, job_id), ignore_errors=True)
+
+    def shutdown(self):
+        # Running jobs keep their state in the store and resume on the next start
+        self.executor.shutdown(wait=False, cancel_futures=True)
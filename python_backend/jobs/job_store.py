@@ -0,0 +1,137 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+DEFAULT_DB_PATH = os.getenv(
+    "GST_JOB_DB",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "jobs.db"),
+)
+
+# Job lifecycle: queued -> running -> completed | failed
+QUEUED, RUNNING, COMPLETED, FAILED = "queued", "running", "completed", "failed"
+# Per-file lifecycle: pending -> done | error
+PENDING, DONE, ERROR = "pending", "done", "error"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    mode TEXT,
+    total_files INTEGER NOT NULL,
+    invoices_count INTEGER NOT NULL DEFAULT 0,
+    output_path TEXT,
+    message TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_files (
+    job_id TEXT NOT NULL REFERENCES jobs(id) ON DELETE CASCADE,
+    idx INTEGER NOT NULL,
+    file_path TEXT NOT NULL,
+    file_name TEXT,
+    file_hash TEXT,
+    status TEXT NOT NULL,
+    invoices_count INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    result_json TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (job_id, idx)
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status);
+"""
+
+# Columns added to job_files after the first release; older databases get them on open
+JOB_FILE_COLUMNS = {
+    "file_hash": "TEXT",
+}
+
+
+class JobStore:
+    """SQLite-backed job table so queued and running jobs survive a restart"""
+
+    def __init__(self, db_path=DEFAULT_DB_PATH):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            existing = {row["name"] for row in conn.execute("PRAGMA table_info(job_files)")}
+            for column, definition in JOB_FILE_COLUMNS.items():
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE job_files ADD COLUMN {column} {definition}")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    def _write(self, sql_statements):
+        with self.lock, self._connect() as conn:
+            for sql, params in sql_statements:
+                conn.execute(sql, params)
+
+    def create_job(self, job_id, files, mode=None, file_hashes=None):
+        """``files`` is a list of (file_path, original_file_name) tuples; ``file_hashes`` their SHA-256, if known"""
+        now = time.time()
+        statements = [(
+            "INSERT INTO jobs (id, status, mode, total_files, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, QUEUED, mode, len(files), now, now),
+        )]
+        file_hashes = file_hashes or [None] * len(files)
+        for idx, ((file_path, file_name), file_hash) in enumerate(zip(files, file_hashes)):
+            statements.append((
+                "INSERT INTO job_files (job_id, idx, file_path, file_name, file_hash, status, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, idx, file_path, file_name, file_hash, PENDING, now),
+            ))
+        self._write(statements)
+
+    def set_status(self, job_id, status, message=None, invoices_count=None, output_path=None):
+        self._write([(
+            "UPDATE jobs SET status = ?, message = COALESCE(?, message), "
+            "invoices_count = COALESCE(?, invoices_count), output_path = COALESCE(?, output_path), "
+            "updated_at = ? WHERE id = ?",
+            (status, message, invoices_count, output_path, time.time(), job_id),
+        )])
+
+    def record_file_result(self, job_id, idx, result):
+        status = ERROR if result.get("error") else DONE
+        gst_data = result.get("gst_data") or []
+        self._write([(
+            "UPDATE job_files SET status = ?, invoices_count = ?, error = ?, result_json = ?, updated_at = ? "
+            "WHERE job_id = ? AND idx = ?",
+            (status, len(gst_data), result.get("error"), json.dumps(result, default=str), time.time(), job_id, idx),
+        )])
+
+    def get_job(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def get_files(self, job_id):
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT job_id, idx, file_path, file_name, file_hash, status, invoices_count, error, updated_at "
+                "FROM job_files WHERE job_id = ? ORDER BY idx",
+                (job_id,),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_results(self, job_id):
+        """Per-file results in input order; pending files have no result yet"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT idx, result_json FROM job_files WHERE job_id = ? ORDER BY idx", (job_id,)
+            ).fetchall()
+        return [json.loads(row["result_json"]) if row["result_json"] else None for row in rows]
+
+    def unfinished_jobs(self):
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) ORDER BY created_at", (QUEUED, RUNNING)
+            ).fetchall()
+        return [row["id"] for row in rows]
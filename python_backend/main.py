@@ -1,16 +1,53 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, File, UploadFile, HTTPException, Form
+from fastapi.responses import FileResponse, StreamingResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 import uvicorn
 import os
-import tempfile
-from pathlib import Path
-from typing import List
-import shutil
-from graphs.gst_extraction_graph import build_gst_graph
-from agents.writer_agent import writer_agent
+import json
+import logging
+import asyncio
+import threading
+from typing import List, Optional
+from datetime import date
+from contextlib import asynccontextmanager
+from graphs.gst_extraction_graph import get_gst_graph, warm_up
+from agents.writer_agent import new_report_builder
+from utils.batch_runner import run_batch_async, collect_invoices, summarize_text_sources, summarize_preprocess, summarize_duplicates
+from jobs.job_manager import JobManager, TERMINAL_STATUSES
+from utils import report_store
+from utils.invoice_store import get_default_store
+from utils.invoice_model import invoice_record
+from utils.exporters import new_exporter, stream_invoices
+from utils.upload_spool import UploadLimitMiddleware, UploadSpool, UploadTooLarge
+from utils.metrics import REGISTRY
+from utils.logging_setup import configure_logging
 
-app = FastAPI(title="FinSync GST Backend", version="1.0.0")
+ALLOWED_CONTENT_TYPES = ['application/pdf', 'image/png', 'image/jpeg']
+JOB_EVENTS_POLL_SECONDS = 0.5
+# Compile the graph and import the model SDK in the background right after startup, so the
+# server answers at once and the first upload does not pay for them ("0" defers to first use)
+WARM_UP_ON_STARTUP = os.getenv("GST_WARM_UP", "1") != "0"
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
+job_manager = JobManager()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if WARM_UP_ON_STARTUP:
+        threading.Thread(target=warm_up, name="gst-warm-up", daemon=True).start()
+    # Pick up jobs that were queued or running before the last shutdown
+    job_manager.recover()
+    yield
+    job_manager.shutdown()
+
+app = FastAPI(title="FinSync GST Backend", version="1.0.0", lifespan=lifespan)
+
+# Oversized uploads are refused while they arrive, not after the form has been parsed
+# (added before CORS so its 413 still carries the CORS headers)
+app.add_middleware(UploadLimitMiddleware)
 
 # Configure CORS
 app.add_middleware(
@@ -30,75 +67,133 @@ async def extract_gst_data(files: List[UploadFile] = File(...)):
     """
     Extract GST data from uploaded invoice files and return Excel file
     """
+    spool = UploadSpool()
     try:
         if not files:
             raise HTTPException(status_code=400, detail="No files uploaded")
         
-        # Save uploaded files temporarily
-        temp_files = []
-        for file in files:
-            # Validate file type
-            if not file.content_type in ['application/pdf', 'image/png', 'image/jpeg']:
-                raise HTTPException(status_code=400, detail=f"Unsupported file type: {file.content_type}")
-            
-            # Create temporary file
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=Path(file.filename).suffix)
-            content = await file.read()
-            temp_file.write(content)
-            temp_file.close()
-            temp_files.append(temp_file.name)
+        # Stream uploaded files into this request's spool directory, hashing them on the way
+        await _spool_uploads(spool, files)
         
-        # Process files with GST extraction graph
-        graph = build_gst_graph()
-        all_invoices = []
+        # Process files with GST extraction graph, several files at a time
+        report_id = report_store.new_report_id()
+        graph = get_gst_graph()
+        report = new_report_builder()
+        # Model calls are awaited on this event loop, so other requests keep being served meanwhile
+        results = await run_batch_async(
+            graph, spool.paths,
+            on_result=lambda index, result: report.add_file_result(index, result["gst_data"]),
+            batch_id=report_id,
+            file_hashes=spool.hashes,
+        )
+        for result in results:
+            if result["error"]:
+                logger.warning("failed to process file=%s: %s", result["file_path"], result["error"])
+        all_invoices = collect_invoices(results)
         
-        for temp_file_path in temp_files:
-            print(f"Processing: {temp_file_path}")
-            result_state = graph.invoke({
-                "file_path": temp_file_path,
-                "output_path": "output/Consolidated_Invoices_Output.xlsx"
-            })
-            gst_data = result_state.get("gst_data", [])
-            all_invoices.extend(gst_data)
-        
-        # Generate Excel file
-        output_path = "output/Consolidated_Invoices_Output.xlsx"
+        # Generate Excel file in a directory owned by this request
         if all_invoices:
-            writer_agent(all_invoices, output_path)
+            await run_in_threadpool(report.finalize, report_store.report_path(report_id))
         else:
             raise HTTPException(status_code=400, detail="No GST data could be extracted from the files")
         
-        # Cleanup temporary files
-        for temp_file in temp_files:
-            try:
-                os.unlink(temp_file)
-            except:
-                pass
-        
         return {
             "success": True,
             "message": f"Successfully processed {len(files)} files and extracted {len(all_invoices)} invoices",
-            "download_url": f"/api/download-excel",
-            "invoices_count": len(all_invoices)
+            "job_id": report_id,
+            "download_url": f"/api/download-excel/{report_id}",
+            "invoices_count": len(all_invoices),
+            "text_layer": summarize_text_sources(results),
+            "preprocess": summarize_preprocess(results),
+            "duplicates": summarize_duplicates(results)
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Error processing files: {e}")
-        # Cleanup temporary files on error
-        for temp_file in temp_files:
-            try:
-                os.unlink(temp_file)
-            except:
-                pass
+        logger.exception("error processing files")
         raise HTTPException(status_code=500, detail=f"Error processing files: {str(e)}")
+    finally:
+        # Uploads never outlive the request, whichever way it ends
+        await run_in_threadpool(spool.remove)
+
+async def _spool_uploads(spool, files):
+    """Check each upload's type and stream it into the spool; size limits answer 413"""
+    for file in files:
+        if not file.content_type in ALLOWED_CONTENT_TYPES:
+            raise HTTPException(status_code=400, detail=f"Unsupported file type: {file.content_type}")
+        try:
+            await run_in_threadpool(spool.add, file.file, file.filename)
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+
+def _new_exporter_or_400(format):
+    try:
+        return new_exporter(format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _export_response(chunks, exporter):
+    # No Content-Length: the body goes out with chunked transfer encoding as rows become ready
+    return StreamingResponse(
+        chunks,
+        media_type=exporter.media_type,
+        headers={"Content-Disposition": f'attachment; filename="GST_Invoices_Extract{exporter.extension}"'},
+    )
+
+@app.post("/api/extract-gst/stream")
+async def extract_gst_stream(files: List[UploadFile] = File(...), format: str = Form("csv")):
+    """
+    Extract GST data and stream it back as CSV, JSONL or Parquet, one row per line item.
+    Rows are sent in upload order as files finish instead of after the whole batch.
+    """
+    if not files:
+        raise HTTPException(status_code=400, detail="No files uploaded")
+    exporter = _new_exporter_or_400(format)
+    spool = UploadSpool()
+    try:
+        await _spool_uploads(spool, files)
+    except Exception:
+        spool.remove()
+        raise
+    
+    loop = asyncio.get_running_loop()
+    chunks = asyncio.Queue()
+    
+    def on_result(index, result):
+        if result["error"]:
+            logger.warning("failed to process file=%s: %s", result["file_path"], result["error"])
+        data = exporter.add_file_result(index, result["gst_data"])
+        if data:
+            loop.call_soon_threadsafe(chunks.put_nowait, data)
+    
+    async def stream():
+        batch = asyncio.ensure_future(run_batch_async(
+            get_gst_graph(), spool.paths, on_result=on_result,
+            batch_id=report_store.new_report_id(), file_hashes=spool.hashes,
+        ))
+        # Queued after every on_result chunk, so it marks the end of the stream
+        batch.add_done_callback(lambda _: chunks.put_nowait(None))
+        try:
+            yield exporter.header()
+            while (data := await chunks.get()) is not None:
+                yield data
+            await batch
+            yield exporter.finish()
+        finally:
+            # The client may disconnect mid-stream; the batch still owns the spool until it ends
+            await asyncio.wait([batch])
+            spool.remove()
+    
+    return _export_response(stream(), exporter)
 
 @app.get("/api/download-excel")
 async def download_excel():
     """
-    Download the generated Excel file
+    Download the most recently generated Excel file (prefer /api/download-excel/{job_id})
     """
-    excel_path = "output/Consolidated_Invoices_Output.xlsx"
-    if not os.path.exists(excel_path):
+    excel_path = report_store.latest_report()
+    if not excel_path:
         raise HTTPException(status_code=404, detail="Excel file not found")
     
     return FileResponse(
@@ -107,6 +202,210 @@ async def download_excel():
         media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
     )
 
+@app.get("/api/download-excel/{job_id}")
+async def download_job_excel(job_id: str):
+    """
+    Download the Excel file generated for a specific job
+    """
+    excel_path = report_store.find_report(job_id)
+    if not excel_path:
+        raise HTTPException(status_code=404, detail="Excel file not found")
+    
+    return FileResponse(
+        path=excel_path,
+        filename="GST_Invoices_Extract.xlsx",
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    )
+
+@app.post("/api/jobs", status_code=202)
+async def submit_job(files: List[UploadFile] = File(...), mode: Optional[str] = Form(None)):
+    """
+    Queue GST extraction for uploaded files and return a job id immediately
+    """
+    if not files:
+        raise HTTPException(status_code=400, detail="No files uploaded")
+    if mode not in (None, "pipeline", "single"):
+        raise HTTPException(status_code=400, detail=f"Unknown extraction mode: {mode}")
+    for file in files:
+        if not file.content_type in ALLOWED_CONTENT_TYPES:
+            raise HTTPException(status_code=400, detail=f"Unsupported file type: {file.content_type}")
+    
+    job_id = job_manager.new_job_id()
+    spool = UploadSpool(job_manager.spool_dir(job_id))
+    try:
+        await _spool_uploads(spool, files)
+    except HTTPException:
+        spool.remove()
+        raise
+    except Exception as e:
+        spool.remove()
+        raise HTTPException(status_code=500, detail=f"Error saving uploads: {str(e)}")
+    
+    # The job owns the spool from here on and removes it when it finishes
+    job_manager.submit(job_id, spool.files, mode=mode, file_hashes=spool.hashes)
+    return {
+        "job_id": job_id,
+        "status": "queued",
+        "status_url": f"/api/jobs/{job_id}",
+        "events_url": f"/api/jobs/{job_id}/events",
+        "results_url": f"/api/jobs/{job_id}/results",
+    }
+
+def _get_job_or_404(job_id: str):
+    snapshot = job_manager.snapshot(job_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return snapshot
+
+@app.get("/api/jobs/{job_id}")
+async def job_status(job_id: str):
+    snapshot = await run_in_threadpool(_get_job_or_404, job_id)
+    snapshot.pop("output_path", None)
+    return snapshot
+
+@app.get("/api/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """
+    Server-Sent Events stream of per-file progress until the job finishes
+    """
+    await run_in_threadpool(_get_job_or_404, job_id)
+    
+    def sse(event, data):
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    
+    async def stream():
+        seen_files = {}
+        last_status = None
+        while True:
+            snapshot = await run_in_threadpool(job_manager.snapshot, job_id)
+            if snapshot is None:
+                yield sse("error", {"detail": "Job not found"})
+                return
+            for file in snapshot["files"]:
+                if file["status"] != "pending" and seen_files.get(file["idx"]) != file["status"]:
+                    seen_files[file["idx"]] = file["status"]
+                    yield sse("file", {k: v for k, v in file.items() if k != "file_path"})
+            if snapshot["status"] != last_status:
+                last_status = snapshot["status"]
+                yield sse("status", {
+                    "status": snapshot["status"],
+                    "completed_files": snapshot["completed_files"],
+                    "total_files": snapshot["total_files"],
+                })
+            if snapshot["status"] in TERMINAL_STATUSES:
+                yield sse("done", {
+                    "status": snapshot["status"],
+                    "message": snapshot["message"],
+                    "invoices_count": snapshot["invoices_count"],
+                })
+                return
+            await asyncio.sleep(JOB_EVENTS_POLL_SECONDS)
+    
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.get("/api/jobs/{job_id}/results")
+async def job_results(job_id: str):
+    snapshot = await run_in_threadpool(_get_job_or_404, job_id)
+    if snapshot["status"] not in TERMINAL_STATUSES:
+        raise HTTPException(status_code=409, detail=f"Job is still {snapshot['status']}")
+    results = await run_in_threadpool(job_manager.store.get_results, job_id)
+    return {
+        "job_id": job_id,
+        "success": snapshot["status"] == "completed",
+        "message": snapshot["message"],
+        "invoices_count": snapshot["invoices_count"],
+        "download_url": f"/api/jobs/{job_id}/download" if snapshot["output_path"] else None,
+        "files": [
+            {
+                "file_name": file["file_name"],
+                "status": file["status"],
+                "error": file["error"],
+                "gst_data": (result or {}).get("gst_data", []),
+            }
+            for file, result in zip(snapshot["files"], results)
+        ],
+    }
+
+@app.get("/api/jobs/{job_id}/download")
+async def job_download(job_id: str):
+    snapshot = await run_in_threadpool(_get_job_or_404, job_id)
+    excel_path = snapshot["output_path"]
+    if not excel_path or not os.path.exists(excel_path):
+        raise HTTPException(status_code=404, detail="Excel file not found")
+    
+    return FileResponse(
+        path=excel_path,
+        filename="GST_Invoices_Extract.xlsx",
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    )
+
+def _invoice_filters(gstin, vendor, hsn, date_from, date_to, job_id):
+    try:
+        return {
+            "gstin": gstin,
+            "vendor": vendor,
+            "hsn": hsn,
+            "date_from": date.fromisoformat(date_from) if date_from else None,
+            "date_to": date.fromisoformat(date_to) if date_to else None,
+            "batch_id": job_id,
+        }
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be in YYYY-MM-DD format")
+
+@app.get("/api/invoices")
+async def list_invoices(gstin: Optional[str] = None, vendor: Optional[str] = None, hsn: Optional[str] = None,
+                        date_from: Optional[str] = None, date_to: Optional[str] = None,
+                        job_id: Optional[str] = None, limit: int = 100, offset: int = 0):
+    """
+    Query previously extracted invoices by GSTIN, vendor name, HSN code, date range or job
+    """
+    filters = _invoice_filters(gstin, vendor, hsn, date_from, date_to, job_id)
+    store = get_default_store()
+    total = await run_in_threadpool(store.count, **filters)
+    invoices = await run_in_threadpool(store.query, limit=max(0, min(limit, 1000)), offset=max(0, offset), **filters)
+    return {
+        "total": total,
+        "count": len(invoices),
+        "offset": offset,
+        "invoices": [invoice_record(invoice) for invoice in invoices],
+    }
+
+@app.get("/api/invoices/export")
+async def export_invoices(gstin: Optional[str] = None, vendor: Optional[str] = None, hsn: Optional[str] = None,
+                          date_from: Optional[str] = None, date_to: Optional[str] = None,
+                          job_id: Optional[str] = None, format: str = "xlsx"):
+    """
+    Build a report for a subset of stored invoices, without re-running the extraction.
+    ``format`` is xlsx (the default) or a line-item export: csv, jsonl or parquet.
+    """
+    filters = _invoice_filters(gstin, vendor, hsn, date_from, date_to, job_id)
+    exporter = _new_exporter_or_400(format) if format != "xlsx" else None
+    
+    store = get_default_store()
+    if not await run_in_threadpool(store.count, **filters):
+        raise HTTPException(status_code=404, detail="No stored invoices match the filters")
+    
+    if exporter is not None:
+        return _export_response(stream_invoices(exporter, store.iter_invoices(**filters)), exporter)
+    
+    def build_report():
+        report = new_report_builder()
+        report.add_invoices(store.iter_invoices(**filters))
+        return report.finalize(report_store.report_path(report_store.new_report_id()))
+    
+    excel_path = await run_in_threadpool(build_report)
+    
+    return FileResponse(
+        path=excel_path,
+        filename="GST_Invoices_Extract.xlsx",
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    )
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint: node timings, model calls, tokens, uploads and cache hits"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "service": "FinSync GST Backend"}
@@ -8,49 +8,72 @@ from pathlib import Path
 # Add current directory to Python path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-def process_invoice_files(file_paths):
-    """Process invoice files and return GST data"""
+# Requests a single-process worker runs side by side; run_batch is thread-safe, and model
+# calls are still bounded by the Gemini client's in-flight limit
+WORKER_CONCURRENCY = int(os.getenv("GST_WORKER_CONCURRENCY", "4"))
+
+def get_graph(mode=None):
+    # Compiled once per process and mode, and kept warm across requests
+    from graphs.gst_extraction_graph import get_gst_graph
+
+    return get_gst_graph(mode)
+
+def process_invoice_files(file_paths, max_workers=None, mode=None, pack=None):
+    """Process invoice files concurrently and return GST data"""
     import traceback
     try:
-        from graphs.gst_extraction_graph import build_gst_graph
-        from agents.writer_agent import writer_agent
+        from agents.writer_agent import new_report_builder
+        from utils.batch_runner import run_batch, collect_invoices, summarize_text_sources, summarize_preprocess, summarize_duplicates
+        from utils import report_store
         
         print(f"[STATUS] Processing {len(file_paths)} files...", flush=True)
         
-        # Generate Excel file path first
-        output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "output")
-        os.makedirs(output_dir, exist_ok=True)
-        output_path = os.path.join(output_dir, "Consolidated_Invoices_Output.xlsx")
+        # Job-scoped report id so concurrent batches never overwrite each other's Excel file
+        job_id = report_store.new_report_id()
+        
+        # Reuse the compiled GST extraction graph when running as a worker
+        graph = get_graph(mode)
+        report = new_report_builder()
         
-        # Build the GST extraction graph
-        graph = build_gst_graph()
-        all_invoices = []
+        def report_progress(index, file_result):
+            # Rows are appended as each file finishes; the workbook is saved once at the end
+            report.add_file_result(index, file_result["gst_data"])
+            file_path = file_result["file_path"]
+            if file_result["error"]:
+                print(f"[ERROR] Failed to process {file_path}: {file_result['error']}", flush=True)
+            elif file_result["gst_data"]:
+                print(f"[STATUS] Extracted {len(file_result['gst_data'])} invoices from {file_path}", flush=True)
+            else:
+                print(f"[WARNING] No data extracted from {file_path}", flush=True)
         
-        # Process each file
-        for file_path in file_paths:
-            print(f"[STATUS] Processing: {file_path}", flush=True)
-            try:
-                result_state = graph.invoke({
-                    "file_path": file_path,
-                    "output_path": output_path
-                })
-                gst_data = result_state.get("gst_data", [])
-                if gst_data:
-                    all_invoices.extend(gst_data)
-                    print(f"[STATUS] Extracted {len(gst_data)} invoices from {file_path}", flush=True)
-                else:
-                    print(f"[WARNING] No data extracted from {file_path}", flush=True)
-            except Exception as e:
-                print(f"[ERROR] Failed to process {file_path}: {str(e)}", flush=True)
-                continue
+        # Process files concurrently; results come back in input order
+        results = run_batch(graph, file_paths, max_workers=max_workers, on_result=report_progress, batch_id=job_id, pack=pack)
+        all_invoices = collect_invoices(results)
+        failed_files = [r["file_path"] for r in results if r["error"]]
+        text_layer = summarize_text_sources(results)
+        print(f"[STATUS] Text layer used for {text_layer['local']} files, Gemini OCR for {text_layer['gemini']}", flush=True)
+        packed = sum(1 for r in results if r.get("packed"))
+        if packed:
+            print(f"[STATUS] {packed} small files were extracted several to a model request", flush=True)
+        preprocess = summarize_preprocess(results)
+        duplicates = summarize_duplicates(results)
+        if duplicates["invoices"]:
+            print(f"[WARNING] {duplicates['invoices']} invoices were already extracted in earlier uploads", flush=True)
+        if preprocess["bytes_saved"]:
+            print(f"[STATUS] Image preprocessing saved {preprocess['bytes_saved']} upload bytes", flush=True)
         
         if all_invoices:
-            writer_agent(all_invoices, output_path)
+            output_path = report.finalize(report_store.report_path(job_id))
             result = {
                 "success": True,
                 "message": f"Successfully processed {len(file_paths)} files and extracted {len(all_invoices)} invoices",
+                "job_id": job_id,
                 "output_file": output_path,
-                "invoices_count": len(all_invoices)
+                "invoices_count": len(all_invoices),
+                "failed_files": failed_files,
+                "text_layer": text_layer,
+                "preprocess": preprocess,
+                "duplicates": duplicates
             }
             print(f"[RESULT] {json.dumps(result)}", flush=True)
             return result
@@ -59,7 +82,11 @@ def process_invoice_files(file_paths):
                 "success": False, 
                 "message": "No GST data could be extracted from the files",
                 "output_file": None,
-                "invoices_count": 0
+                "invoices_count": 0,
+                "failed_files": failed_files,
+                "text_layer": text_layer,
+                "preprocess": preprocess,
+                "duplicates": duplicates
             }
             print(f"[RESULT] {json.dumps(result)}", flush=True)
             return result
@@ -76,11 +103,105 @@ def process_invoice_files(file_paths):
         print(f"[RESULT] {json.dumps(result)}", flush=True)
         return result
 
+def _init_worker():
+    # Worker processes inherit the frame channel on stdout; keep agent logs off it
+    sys.stdout = sys.stderr
+    from utils.logging_setup import configure_logging
+    from graphs.gst_extraction_graph import warm_up
+    configure_logging()
+    warm_up()
+
+def handle_request(request):
+    """Process one framed job request and return its response frame"""
+    result = process_invoice_files(
+        request.get("files") or [],
+        max_workers=request.get("workers"),
+        mode=request.get("mode"),
+        pack=request.get("pack"),
+    )
+    return {"type": "result", "id": request.get("id"), **result}
+
+def serve(processes=1, concurrency=WORKER_CONCURRENCY):
+    """
+    Long-lived worker mode: read newline-delimited JSON requests from stdin and
+    write one JSON response frame per request to stdout.
+    
+    Request:  {"id": "...", "files": ["a.pdf", ...], "mode": "pipeline", "workers": 4, "pack": false}
+    Response: {"type": "result", "id": "...", "success": true, ...}
+    A {"type": "shutdown"} request (or EOF) stops the worker after in-flight jobs finish.
+    With one process, up to ``concurrency`` requests run at once on threads.
+    """
+    import threading
+    import multiprocessing
+    from concurrent.futures import ThreadPoolExecutor
+    
+    frames = sys.stdout
+    write_lock = threading.Lock()
+    
+    def send(frame):
+        with write_lock:
+            frames.write(json.dumps(frame) + "\n")
+            frames.flush()
+    
+    _init_worker()
+    if processes > 1:
+        pool = multiprocessing.get_context("spawn").Pool(processes, initializer=_init_worker)
+        submit = lambda request: pool.apply_async(
+            handle_request, (request,), callback=send,
+            error_callback=lambda e, request_id=request.get("id"): send(
+                {"type": "error", "id": request_id, "success": False, "message": str(e)}
+            ),
+        )
+    else:
+        executor = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="gst-worker")
+        submit = lambda request: executor.submit(lambda: send(handle_request(request)))
+    
+    send({"type": "ready", "processes": processes, "pid": os.getpid()})
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError as e:
+            send({"type": "error", "id": None, "success": False, "message": f"Invalid request frame: {e}"})
+            continue
+        if request.get("type") == "shutdown":
+            break
+        submit(request)
+    
+    if processes > 1:
+        pool.close()
+        pool.join()
+    else:
+        executor.shutdown(wait=True)
+
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python simple_server.py <file1> [file2] ...")
-        sys.exit(1)
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Extract GST data from invoice files")
+    parser.add_argument("files", nargs="*", help="Invoice files (PDF, PNG, JPG)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Maximum number of files processed concurrently (default: GST_MAX_WORKERS or 4)")
+    parser.add_argument("--mode", choices=["pipeline", "single"], default=None,
+                        help="Extraction mode (default: GST_EXTRACTION_MODE or pipeline)")
+    parser.add_argument("--pack", action="store_true", default=None,
+                        help="Extract small single-page files several to a model request (default: GST_PACK_DOCUMENTS)")
+    parser.add_argument("--serve", action="store_true",
+                        help="Run as a long-lived worker reading JSON requests from stdin")
+    parser.add_argument("--processes", type=int, default=int(os.getenv("GST_WORKER_PROCESSES", "1")),
+                        help="Worker processes in --serve mode (default: GST_WORKER_PROCESSES or 1)")
+    parser.add_argument("--concurrency", type=int, default=WORKER_CONCURRENCY,
+                        help="Requests run at once by a single-process worker (default: GST_WORKER_CONCURRENCY or 4)")
+    args = parser.parse_args()
+    
+    from utils.logging_setup import configure_logging
+    configure_logging()
+    if args.serve:
+        serve(processes=max(1, args.processes), concurrency=args.concurrency)
+        sys.exit(0)
+    if not args.files:
+        parser.error("at least one file is required unless --serve is given")
     
-    file_paths = sys.argv[1:]
-    result = process_invoice_files(file_paths)
+    result = process_invoice_files(args.files, max_workers=args.workers, mode=args.mode, pack=args.pack)
     print(json.dumps(result, indent=2))
\ No newline at end of file
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Exports stored invoices through /api/invoices/export on a uvicorn server: several
+CSV exports in parallel (each streamed chunk may be produced on a different
+threadpool thread), then a Parquet round-trip read back with pyarrow.
+"""
+import io
+import os
+import sys
+import csv
+import time
+import shutil
+import socket
+import tempfile
+import subprocess
+from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BACKEND_DIR)
+
+tmp = tempfile.mkdtemp(prefix="gst_export_test_")
+os.environ.update({
+    "GEMINI_BACKEND": "fake",
+    "GST_WARM_UP": "0",
+    "GST_INVOICE_DB": os.path.join(tmp, "invoices.db"),
+    "GST_JOB_DB": os.path.join(tmp, "jobs.db"),
+    "GST_REPORTS_DIR": os.path.join(tmp, "reports"),
+    "GST_UPLOAD_DIR": os.path.join(tmp, "uploads"),
+})
+
+import httpx
+import pyarrow.parquet as pq
+
+from utils.invoice_store import get_default_store
+
+INVOICES = 3000
+PARALLEL_EXPORTS = 6
+
+store = get_default_store()
+for i in range(INVOICES):
+    store.save("export-test", f"invoice_{i}.pdf", [{
+        "Shop Name": f"Vendor {i % 7}",
+        "GSTIN": "27AAPFU0939F1ZV",
+        "Invoice Number": f"INV-{i:05d}",
+        "Invoice Date": f"2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}",
+        "Total Amount": "1180.00",
+        "Tax Amount": "180.00",
+        "CGST": "90.00",
+        "SGST": "90.00",
+        "IGST": "N/A",
+        "HSN Code": ["62052000"],
+    }])
+
+with socket.socket() as s:
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+server = subprocess.Popen(
+    [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+    cwd=BACKEND_DIR, env=os.environ,
+)
+client = httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=60)
+for _ in range(300):
+    try:
+        client.get("/health").raise_for_status()
+        break
+    except httpx.TransportError:
+        time.sleep(0.1)
+
+
+def export_csv(_):
+    with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=60) as exporter:
+        response = exporter.get("/api/invoices/export", params={"format": "csv"})
+    return response.status_code, list(csv.reader(io.StringIO(response.text)))
+
+
+try:
+    with ThreadPoolExecutor(max_workers=PARALLEL_EXPORTS) as pool:
+        exports = list(pool.map(export_csv, range(PARALLEL_EXPORTS)))
+    parquet = client.get("/api/invoices/export", params={"format": "parquet"})
+finally:
+    client.close()
+    server.terminate()
+    server.wait()
+    shutil.rmtree(tmp, ignore_errors=True)
+
+for status, rows in exports:
+    assert status == 200, status
+    assert len(rows) == INVOICES + 1, len(rows)
+    assert sorted(row[rows[0].index("Invoice No.")] for row in rows[1:]) == [f"INV-{i:05d}" for i in range(INVOICES)]
+print(f"✅ {PARALLEL_EXPORTS} parallel CSV exports of {INVOICES} invoices")
+
+assert parquet.status_code == 200, parquet.text
+table = pq.read_table(io.BytesIO(parquet.content))
+assert table.num_rows == INVOICES, table.num_rows
+assert str(table.schema.field("Date").type) == "date32[day]"
+assert table.column("Total Tax")[0].as_py() == Decimal("180.00")
+assert table.column("S.No.").to_pylist() == list(range(1, INVOICES + 1))
+print(f"✅ Parquet export read back: {table.num_rows} rows, {table.num_columns} columns")
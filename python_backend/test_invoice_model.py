@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Amount parsing in utils.invoice_model: currency markers and separators are removed,
+anything that is not then a plain number keeps its extracted text.
+"""
+import os
+import sys
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils.invoice_model import normalize_records
+
+AMOUNT_CASES = {
+    "Rs. 100": Decimal("100"),
+    "Rs.1,234.50": Decimal("1234.50"),
+    "INR 2,000": Decimal("2000"),
+    "₹ 99.9": Decimal("99.9"),
+    "Rs. 500/-": Decimal("500"),
+    "1,00,000": Decimal("100000"),
+    "-12.5": Decimal("-12.5"),
+    1180.0: Decimal("1180.0"),
+    # Not plain numbers: kept as extracted, never joined into a different amount
+    "90.00 (9%)": "90.00 (9%)",
+    "1e5": "1e5",
+    "12 Lakh": "12 Lakh",
+    "1.2.3": "1.2.3",
+    ".5": ".5",
+    "Rs.": "Rs.",
+    # Missing values
+    "N/A": None,
+    None: None,
+}
+
+invoices = normalize_records([{"Total Amount": value} for value in AMOUNT_CASES])
+for (value, expected), invoice in zip(AMOUNT_CASES.items(), invoices):
+    assert invoice.total_amount == expected and type(invoice.total_amount) is type(expected), (value, invoice.total_amount)
+print(f"✅ {len(AMOUNT_CASES)} amount strings parsed as expected")
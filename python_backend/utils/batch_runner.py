@@ -0,0 +1,469 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from agents.extraction_agent import extract_packed
+from utils.doc_packer import PACK_DOCUMENTS, packable_size, plan_packs
+from utils.doc_splitter import SPLIT_DOCUMENTS, split_document
+from utils.duplicate_index import DUPLICATE_INDEX_ENABLED, get_default_index, duplicate_remark
+from utils.extraction_cache import get_default_cache, hash_file, page_range_key, version_tag
+from utils.gemini_client import MODEL_NAME
+from utils.invoice_store import INVOICE_STORE_ENABLED, get_default_store
+from utils.metrics import CACHE_LOOKUPS, FILE_SECONDS, FILES_PROCESSED
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on files that run through the graph at the same time
+DEFAULT_MAX_WORKERS = int(os.getenv("GST_MAX_WORKERS", "4"))
+
+# Extraction cache version of packed answers; they come from their own prompt, not the graph's
+PACKED_VERSION = version_tag(MODEL_NAME, "packed")
+
+
+def _initial_state(file_path, file_hash):
+    state = {"file_path": file_path}
+    if file_hash:
+        # Already computed by the batch runner; saves re-hashing in the cache lookup
+        state["file_hash"] = file_hash
+    return state
+
+
+def _file_result(file_path, result_state):
+    FILES_PROCESSED.inc(outcome="error" if result_state.get("error") else "ok")
+    return {
+        "file_path": file_path,
+        "gst_data": result_state.get("gst_data") or [],
+        "validated": result_state.get("validated", False),
+        "cache_hit": bool(result_state.get("cache_hit")),
+        "text_source": result_state.get("text_source"),
+        "preprocess": result_state.get("preprocess"),
+        # Agents record model failures here instead of raising
+        "error": result_state.get("error"),
+    }
+
+
+def _failed_result(file_path, error):
+    FILES_PROCESSED.inc(outcome="error")
+    logger.error("failed to process file=%s: %s", file_path, error)
+    return {
+        "file_path": file_path,
+        "gst_data": [],
+        "validated": False,
+        "cache_hit": False,
+        "text_source": None,
+        "preprocess": None,
+        "error": str(error),
+    }
+
+
+def process_file(graph, file_path, file_hash=None):
+    """Run the GST graph for a single file, capturing any failure in the result"""
+    started = time.perf_counter()
+    try:
+        return _file_result(file_path, graph.invoke(_initial_state(file_path, file_hash)))
+    except Exception as e:
+        return _failed_result(file_path, e)
+    finally:
+        FILE_SECONDS.observe(time.perf_counter() - started)
+
+
+async def process_file_async(graph, file_path, file_hash=None):
+    """process_file with graph.ainvoke: model calls are awaited on the running event loop"""
+    started = time.perf_counter()
+    try:
+        return _file_result(file_path, await graph.ainvoke(_initial_state(file_path, file_hash)))
+    except Exception as e:
+        return _failed_result(file_path, e)
+    finally:
+        FILE_SECONDS.observe(time.perf_counter() - started)
+
+
+def process_pack(file_paths):
+    """
+    Extract several small files with one model request. Returns one result per
+    file, in order, or None for each file the packed answer did not cover; those
+    should run through the graph on their own.
+    """
+    started = time.perf_counter()
+    try:
+        states = extract_packed(file_paths)
+    except Exception as e:
+        logger.warning("packed extraction failed files=%d: %s", len(file_paths), e)
+        return [None] * len(file_paths)
+    elapsed = time.perf_counter() - started
+    results = []
+    for file_path, state in zip(file_paths, states):
+        if state is None:
+            results.append(None)
+            continue
+        # Every file in the pack waited for the whole request
+        FILE_SECONDS.observe(elapsed)
+        results.append({**_file_result(file_path, state), "packed": True})
+    return results
+
+
+def _graph_version(graph):
+    """Version tag of a graph's extractions, set by build_gst_graph; other graphs get the default mode's"""
+    return getattr(graph, "version_tag", None) or version_tag(MODEL_NAME)
+
+
+def _split_units(file_path):
+    try:
+        return split_document(file_path)
+    except Exception as e:
+        logger.warning("could not split file=%s, processing it whole: %s", file_path, e)
+        return [(file_path, None)]
+
+
+def merge_unit_results(file_path, unit_results, unit_pages):
+    """Combine the results of one file's page-range units into a single file result"""
+    if len(unit_results) == 1:
+        return {**unit_results[0], "file_path": file_path}
+
+    errors = [
+        f"pages {pages[0] + 1}-{pages[1]}: {result['error']}"
+        for result, pages in zip(unit_results, unit_pages) if result["error"]
+    ]
+    sources = {result["text_source"] for result in unit_results}
+    gst_data = []
+    for result in unit_results:
+        gst_data.extend(result["gst_data"])
+    return {
+        "file_path": file_path,
+        "gst_data": gst_data,
+        "validated": all(result["validated"] for result in unit_results),
+        "cache_hit": all(result["cache_hit"] for result in unit_results),
+        "text_source": sources.pop() if len(sources) == 1 else "gemini",
+        "preprocess": None,
+        "error": "; ".join(errors) or None,
+        "units": len(unit_results),
+    }
+
+
+def duplicate_result(file_path, known):
+    """Result for a byte-identical file extracted before: earlier records, flagged, no graph run"""
+    remark = duplicate_remark(known["source"], known["first_seen"])
+    return {
+        "file_path": file_path,
+        "gst_data": [{**record, "Remarks": remark} for record in known["gst_data"]],
+        "validated": known["validated"],
+        "cache_hit": False,
+        "text_source": None,
+        "preprocess": None,
+        "error": None,
+        "duplicate": True,
+    }
+
+
+def flag_duplicates(result, file_hash, index, version):
+    """Register a fresh extraction and mark records already seen in another file"""
+    if result["error"] or not result["gst_data"]:
+        return result
+    try:
+        seen = index.register(
+            file_hash, os.path.basename(result["file_path"]), result["gst_data"], version, result["validated"]
+        )
+    except Exception as e:
+        logger.warning("duplicate index unavailable file=%s: %s", result["file_path"], e)
+        return result
+    if not any(seen):
+        return result
+    gst_data = [
+        {**record, "Remarks": duplicate_remark(earlier["source"], earlier["first_seen"])} if earlier else record
+        for record, earlier in zip(result["gst_data"], seen)
+    ]
+    return {**result, "gst_data": gst_data, "duplicate_invoices": sum(1 for earlier in seen if earlier)}
+
+
+class _Batch:
+    """
+    Bookkeeping shared by run_batch and run_batch_async: duplicate checks, document
+    splitting, merging unit results, flagging duplicates and storing invoices.
+    """
+
+    def __init__(self, file_paths, on_result, split, dedupe, batch_id, store, file_hashes, version):
+        self.file_paths = file_paths
+        self.on_result = on_result
+        self.split = SPLIT_DOCUMENTS if split is None else split
+        dedupe = DUPLICATE_INDEX_ENABLED if dedupe is None else dedupe
+        self.index_db = get_default_index() if dedupe else None
+        store = INVOICE_STORE_ENABLED if store is None else store
+        self.invoice_store = get_default_store() if store else None
+        self.batch_id = batch_id
+        self.file_hashes = file_hashes
+        self.version = version
+        self.cache = get_default_cache()
+        self.results = [None] * len(file_paths)
+        self.lock = threading.Lock()
+
+    def finish(self, index, result):
+        self.results[index] = result
+        # Byte-identical files were stored when they were first extracted
+        if self.invoice_store is not None and result["gst_data"] and not result.get("duplicate"):
+            try:
+                self.invoice_store.save(self.batch_id, os.path.basename(result["file_path"]), result["gst_data"])
+            except Exception as e:
+                logger.warning("could not store invoices file=%s: %s", result["file_path"], e)
+        if self.on_result is not None:
+            try:
+                self.on_result(index, result)
+            except Exception as e:
+                logger.warning("progress callback failed index=%d: %s", index, e)
+
+    def prepare(self, index):
+        """(file hash, earlier extraction or None, units to run)"""
+        file_path = self.file_paths[index]
+        file_hash = self.file_hashes[index] if self.file_hashes else None
+        if self.index_db is not None:
+            try:
+                file_hash = file_hash or hash_file(file_path)
+                known = self.index_db.find_document(file_hash, self.version)
+            except Exception as e:
+                logger.warning("duplicate check failed file=%s: %s", file_path, e)
+                known = None
+            if known is not None:
+                return file_hash, known, []
+        units = _split_units(file_path) if self.split else [(file_path, None)]
+        if len(units) > 1 and not file_hash:
+            # Split units are cached under the parent's hash (see unit_hash)
+            try:
+                file_hash = hash_file(file_path)
+            except OSError as e:
+                logger.warning("could not hash file=%s: %s", file_path, e)
+        return file_hash, None, units
+
+    def start(self, prepared):
+        """Answer already known files and return the (index, unit index, unit path) runs left"""
+        self.prepared = prepared
+        self.units = [file_units for _, _, file_units in prepared]
+        self.unit_results = [[None] * len(file_units) for file_units in self.units]
+        self.remaining = [len(file_units) for file_units in self.units]
+
+        for index, (_, known, _) in enumerate(prepared):
+            if known is not None:
+                logger.info("skipping already extracted file=%s", self.file_paths[index])
+                self.finish(index, duplicate_result(self.file_paths[index], known))
+
+        return [
+            (index, unit_index, unit_path)
+            for index, file_units in enumerate(self.units)
+            for unit_index, (unit_path, _) in enumerate(file_units)
+        ]
+
+    def unit_hash(self, index, unit_index):
+        """
+        Cache key for one unit: the file's hash, or for a page range split out of it,
+        a key derived from the file's hash and the range. Split PDFs are not
+        byte-identical from one run to the next, so hashing them would never hit.
+        """
+        file_hash = self.prepared[index][0]
+        pages = self.units[index][unit_index][1]
+        if file_hash and pages is not None:
+            return page_range_key(file_hash, *pages)
+        return file_hash
+
+    def pack_probe(self, run):
+        """
+        (run, cache key, packable size) for a unit that may go into a pack, or None when
+        the extraction cache already answered it: the graph's entries are tried first,
+        then earlier packed answers.
+        """
+        index, unit_index, unit_path = run
+        key = self.unit_hash(index, unit_index)
+        if key is None:
+            try:
+                key = hash_file(unit_path)
+            except OSError as e:
+                logger.warning("could not hash file=%s: %s", unit_path, e)
+        if self.cache is not None and key is not None:
+            for version in (self.version, PACKED_VERSION):
+                entry = self.cache.get(key, version)
+                if entry is not None:
+                    CACHE_LOOKUPS.inc(result="hit")
+                    state = {"gst_data": entry["gst_data"], "validated": entry["validated"], "cache_hit": True}
+                    self.unit_done(*run, _file_result(unit_path, state))
+                    return None
+            CACHE_LOOKUPS.inc(result="miss")
+        return run, key, packable_size(unit_path)
+
+    def pack_done(self, run, key, unit_result):
+        """Cache a unit's packed answer like the graph caches its own, then finish the unit"""
+        if self.cache is not None and key and unit_result["gst_data"] and not unit_result["error"]:
+            try:
+                self.cache.put(key, PACKED_VERSION, unit_result["gst_data"], unit_result["validated"])
+            except OSError as e:
+                logger.warning("could not cache packed result file=%s: %s", run[2], e)
+        self.unit_done(*run, unit_result)
+
+    def unit_done(self, index, unit_index, unit_path, unit_result):
+        if unit_path != self.file_paths[index]:
+            try:
+                os.remove(unit_path)
+            except OSError:
+                pass
+        with self.lock:
+            self.unit_results[index][unit_index] = unit_result
+            self.remaining[index] -= 1
+            if self.remaining[index]:
+                return
+        result = merge_unit_results(
+            self.file_paths[index], self.unit_results[index], [pages for _, pages in self.units[index]]
+        )
+        file_hash = self.prepared[index][0]
+        if self.index_db is not None and file_hash:
+            result = flag_duplicates(result, file_hash, self.index_db, self.version)
+        self.finish(index, result)
+
+
+def run_batch(graph, file_paths, max_workers=None, on_result=None, split=None, dedupe=None, batch_id=None, store=None,
+              file_hashes=None, pack=None):
+    """
+    Run the GST graph over many files concurrently.
+
+    Files whose content hash is already in the duplicate index (utils.duplicate_index)
+    under the graph's version tag are answered from it without running the graph;
+    invoices of new files that match an earlier (GSTIN, invoice number, date) are
+    flagged in a "Remarks" field.
+    Multi-invoice PDFs are split into per-invoice page ranges (see
+    utils.doc_splitter) and every unit runs through the graph on the shared
+    pool, so a 40-invoice PDF scales with the workers instead of being one
+    request. Results are merged back per file and returned in the same order as
+    ``file_paths``. A failing file produces a result with ``error`` set and never
+    aborts the rest of the batch. ``on_result`` is called with (index, result)
+    as each file completes. Newly extracted invoices are also saved to the
+    invoice store (utils.invoice_store) under ``batch_id``. ``file_hashes``, when
+    given, are the files' SHA-256 digests computed while they were uploaded.
+
+    With ``pack`` (default GST_PACK_DOCUMENTS), small single-page units are
+    grouped by utils.doc_packer and each group is extracted with one model
+    request instead of a graph run per unit; units the packed answer does not
+    cover fall back to the graph. Packed units are looked up in and stored to the
+    extraction cache (under PACKED_VERSION) like graph runs, but are sent without
+    image preprocessing: only small single-page files are packed.
+    """
+    file_paths = list(file_paths)
+    if not file_paths:
+        return []
+
+    batch = _Batch(file_paths, on_result, split, dedupe, batch_id, store, file_hashes, _graph_version(graph))
+    workers = max(1, max_workers or DEFAULT_MAX_WORKERS)
+
+    pack = PACK_DOCUMENTS if pack is None else pack
+
+    def run(index, unit_index, unit_path):
+        unit_result = process_file(graph, unit_path, batch.unit_hash(index, unit_index))
+        batch.unit_done(index, unit_index, unit_path, unit_result)
+
+    def run_pack(probes):
+        for (unit, key, _), unit_result in zip(probes, process_pack([unit[2] for unit, _, _ in probes])):
+            if unit_result is None:
+                run(*unit)
+            else:
+                batch.pack_done(unit, key, unit_result)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gst-batch") as pool:
+        runs = batch.start(list(pool.map(batch.prepare, range(len(file_paths)))))
+        futures = []
+        if pack and runs:
+            probes = [probe for probe in pool.map(batch.pack_probe, runs) if probe is not None]
+            packs, singles = plan_packs([size for _, _, size in probes])
+            futures = [pool.submit(run_pack, [probes[position] for position in positions]) for positions in packs]
+            runs = [probes[position][0] for position in singles]
+        futures += [pool.submit(run, *unit) for unit in runs]
+        for future in futures:
+            future.result()
+
+    return batch.results
+
+
+async def run_batch_async(graph, file_paths, max_workers=None, on_result=None, split=None, dedupe=None,
+                          batch_id=None, store=None, file_hashes=None, pack=None):
+    """
+    run_batch for async callers: graphs run with ainvoke on the caller's event loop,
+    at most ``max_workers`` files at a time. Hashing, splitting, merging and storing
+    run in worker threads, so the loop keeps serving other requests during a batch.
+    ``on_result`` is called from a worker thread. Packed requests (``pack``) also run
+    in a worker thread and count against ``max_workers``.
+    """
+    file_paths = list(file_paths)
+    if not file_paths:
+        return []
+
+    batch = _Batch(file_paths, on_result, split, dedupe, batch_id, store, file_hashes, _graph_version(graph))
+    semaphore = asyncio.Semaphore(max(1, max_workers or DEFAULT_MAX_WORKERS))
+    pack = PACK_DOCUMENTS if pack is None else pack
+
+    async def prepare(index):
+        async with semaphore:
+            return await asyncio.to_thread(batch.prepare, index)
+
+    async def run(index, unit_index, unit_path):
+        async with semaphore:
+            unit_result = await process_file_async(graph, unit_path, batch.unit_hash(index, unit_index))
+        await asyncio.to_thread(batch.unit_done, index, unit_index, unit_path, unit_result)
+
+    async def probe_unit(unit):
+        async with semaphore:
+            return await asyncio.to_thread(batch.pack_probe, unit)
+
+    async def run_pack(probes):
+        async with semaphore:
+            unit_results = await asyncio.to_thread(process_pack, [unit[2] for unit, _, _ in probes])
+        for (unit, key, _), unit_result in zip(probes, unit_results):
+            if unit_result is None:
+                await run(*unit)
+            else:
+                await asyncio.to_thread(batch.pack_done, unit, key, unit_result)
+
+    prepared = await asyncio.gather(*(prepare(index) for index in range(len(file_paths))))
+    runs = await asyncio.to_thread(batch.start, list(prepared))
+    tasks = []
+    if pack and runs:
+        probes = [probe for probe in await asyncio.gather(*(probe_unit(unit) for unit in runs)) if probe is not None]
+        packs, singles = plan_packs([size for _, _, size in probes])
+        tasks = [run_pack([probes[position] for position in positions]) for positions in packs]
+        runs = [probes[position][0] for position in singles]
+    await asyncio.gather(*tasks, *(run(*unit) for unit in runs))
+    return batch.results
+
+
+def summarize_duplicates(results):
+    """Files answered from the duplicate index, and invoices flagged as seen before"""
+    files = sum(1 for r in results if r.get("duplicate"))
+    invoices = sum(len(r["gst_data"]) if r.get("duplicate") else r.get("duplicate_invoices", 0) for r in results)
+    return {"files": files, "invoices": invoices}
+
+
+def summarize_text_sources(results):
+    """How often the local PDF text layer replaced the Gemini OCR call"""
+    local = sum(1 for r in results if r.get("text_source") == "local")
+    gemini = sum(1 for r in results if r.get("text_source") == "gemini")
+    return {
+        "local": local,
+        "gemini": gemini,
+        "local_hit_rate": round(local / (local + gemini), 3) if (local + gemini) else 0.0,
+    }
+
+
+def summarize_preprocess(results):
+    """Upload bytes before and after image preprocessing, summed over the batch"""
+    stats = [r["preprocess"] for r in results if r.get("preprocess")]
+    original = sum(s["original_bytes"] for s in stats)
+    processed = sum(s["processed_bytes"] for s in stats)
+    return {
+        "files": len(stats),
+        "original_bytes": original,
+        "processed_bytes": processed,
+        "bytes_saved": original - processed,
+    }
+
+
+def collect_invoices(results):
+    """Flatten per-file results into a single invoice list, preserving order"""
+    invoices = []
+    for result in results:
+        invoices.extend(result.get("gst_data") or [])
+    return invoices
@@ -0,0 +1,54 @@
+import os
+import logging
+
+from utils.pdf_utils import count_pages
+
+logger = logging.getLogger(__name__)
+
+# Pack small documents several to a model request ("1" enables; see agents.extraction_agent.extract_packed)
+PACK_DOCUMENTS = os.getenv("GST_PACK_DOCUMENTS", "0") != "0"
+# At most this many documents share one request
+PACK_MAX_DOCUMENTS = int(os.getenv("GST_PACK_MAX_DOCS", "8"))
+# Only single-page files up to this size are packed; anything larger gets its own request
+PACK_MAX_FILE_BYTES = int(float(os.getenv("GST_PACK_MAX_FILE_KB", "512")) * 1024)
+# Inline payload budget of one packed request (Gemini caps inline requests at 20 MB)
+PACK_MAX_BYTES = int(float(os.getenv("GST_PACK_MAX_MB", "4")) * 1024 * 1024)
+
+
+def packable_size(file_path, max_file_bytes=PACK_MAX_FILE_BYTES):
+    """Size in bytes of a small single-page file that may share a request, otherwise None"""
+    try:
+        size = os.path.getsize(file_path)
+        if size > max_file_bytes or count_pages(file_path) != 1:
+            return None
+    except Exception as e:
+        logger.debug("not packing file=%s: %s", file_path, e)
+        return None
+    return size
+
+
+def plan_packs(sizes, max_documents=PACK_MAX_DOCUMENTS, max_bytes=PACK_MAX_BYTES):
+    """
+    Group files into packs given their packable_size() results (None = not packable).
+
+    Files are taken in order and a pack closes once it holds ``max_documents``
+    files or the next file would push its payload past ``max_bytes``, so tiny
+    receipts travel up to ``max_documents`` at a time while larger photos share a
+    request with fewer others. Returns (packs, singles): packs are lists of
+    positions with at least two files, singles the positions to extract alone.
+    """
+    packs, singles, current, current_bytes = [], [], [], 0
+    for position, size in enumerate(sizes):
+        if size is None:
+            singles.append(position)
+            continue
+        if current and (len(current) >= max_documents or current_bytes + size > max_bytes):
+            packs.append(current)
+            current, current_bytes = [], 0
+        current.append(position)
+        current_bytes += size
+    if current:
+        packs.append(current)
+
+    singles.extend(pack[0] for pack in packs if len(pack) == 1)
+    return [pack for pack in packs if len(pack) > 1], sorted(singles)
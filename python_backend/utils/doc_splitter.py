@@ -0,0 +1,106 @@
+import os
+import re
+import logging
+import tempfile
+import uuid
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Split multi-invoice PDFs into one extraction unit per invoice ("0" disables)
+SPLIT_DOCUMENTS = os.getenv("GST_SPLIT_DOCUMENTS", "1") != "0"
+MIN_PAGES_TO_SPLIT = 2
+# Pages with less text than this are treated as scans, which cannot be split by text
+MIN_PAGE_CHARS = 40
+
+SPLIT_DIR = os.path.join(tempfile.gettempdir(), "gst_split")
+
+INVOICE_NUMBER_PATTERN = re.compile(
+    r"invoice\s*(?:no|number|num|#)\.?\s*[:#\-]?\s*([A-Z0-9][A-Z0-9/\-]{2,})", re.IGNORECASE
+)
+PAGE_OF_PATTERN = re.compile(r"page\s*(\d+)\s*(?:of|/)\s*(\d+)", re.IGNORECASE)
+CONTINUED_PATTERN = re.compile(r"\b(?:continued|contd\.?)\b", re.IGNORECASE)
+
+
+def _page_markers(text):
+    page_of = PAGE_OF_PATTERN.search(text)
+    number = INVOICE_NUMBER_PATTERN.search(text)
+    return {
+        "page_of": (int(page_of.group(1)), int(page_of.group(2))) if page_of else None,
+        "invoice_number": number.group(1).upper() if number else None,
+        "continued": bool(CONTINUED_PATTERN.search(text)),
+    }
+
+
+def _starts_invoice(markers, current_number):
+    # "Page 1 of N" is the strongest signal, either way
+    if markers["page_of"] is not None:
+        return markers["page_of"][0] == 1
+    if markers["continued"]:
+        return False
+    if markers["invoice_number"] is not None and current_number is not None:
+        return markers["invoice_number"] != current_number
+    return False
+
+
+def detect_invoice_ranges(file_path):
+    """
+    Return [(start, end)] 0-based, end-exclusive page ranges, one per invoice.
+
+    A page starts a new invoice when it says "Page 1 of N", or when it carries an
+    invoice number different from the current invoice's. Pages without either
+    marker, or seen before any invoice number, continue the current invoice.
+    Documents that are mostly scanned (no text layer) come back as one range.
+    """
+    import fitz  # PyMuPDF
+
+    with fitz.open(file_path) as doc:
+        page_count = doc.page_count
+        if page_count < MIN_PAGES_TO_SPLIT:
+            return [(0, page_count)]
+        texts = [page.get_text("text") for page in doc]
+
+    if sum(1 for text in texts if len(text.strip()) >= MIN_PAGE_CHARS) * 2 < page_count:
+        return [(0, page_count)]
+
+    starts = [0]
+    current_number = None
+    for page_number, text in enumerate(texts):
+        markers = _page_markers(text)
+        if page_number > 0 and _starts_invoice(markers, current_number):
+            starts.append(page_number)
+            current_number = None
+        if markers["invoice_number"] is not None and current_number is None:
+            current_number = markers["invoice_number"]
+
+    return list(zip(starts, starts[1:] + [page_count]))
+
+
+def write_page_range(file_path, start, end, output_dir=None):
+    """Copy pages [start, end) into a new PDF and return its path"""
+    import fitz  # PyMuPDF
+
+    output_dir = output_dir or SPLIT_DIR
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, f"{Path(file_path).stem[:40]}-p{start + 1}-{end}-{uuid.uuid4().hex[:8]}.pdf")
+    with fitz.open(file_path) as source, fitz.open() as part:
+        part.insert_pdf(source, from_page=start, to_page=end - 1)
+        part.save(output_path, garbage=3, deflate=True)
+    return output_path
+
+
+def split_document(file_path, output_dir=None):
+    """
+    Split a PDF into per-invoice units.
+
+    Returns [(unit_path, (start, end))]. A file that is not a PDF, or holds a
+    single invoice, comes back as [(file_path, None)]; any other unit_path is a
+    temporary PDF the caller must delete.
+    """
+    if Path(file_path).suffix.lower() != ".pdf":
+        return [(file_path, None)]
+    ranges = detect_invoice_ranges(file_path)
+    if len(ranges) < 2:
+        return [(file_path, None)]
+    logger.info("split file=%s invoices=%d pages=%d", file_path, len(ranges), ranges[-1][1])
+    return [(write_page_range(file_path, start, end, output_dir), (start, end)) for start, end in ranges]
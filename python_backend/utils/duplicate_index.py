@@ -0,0 +1,173 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+
+from utils.invoice_model import normalize_records
+
+DEFAULT_DB_PATH = os.getenv(
+    "GST_DUPLICATE_DB",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "invoice_index.db"),
+)
+DUPLICATE_INDEX_ENABLED = os.getenv("GST_DUPLICATE_INDEX_ENABLED", "1") != "0"
+
+# Both lookups are primary-key probes, so they stay flat as the history grows
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    file_hash TEXT PRIMARY KEY,
+    source TEXT,
+    gst_data_json TEXT NOT NULL,
+    first_seen REAL NOT NULL,
+    version_tag TEXT,
+    validated INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS invoices (
+    invoice_key TEXT PRIMARY KEY,
+    file_hash TEXT NOT NULL,
+    source TEXT,
+    first_seen REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+# Columns added to documents after the first release; older databases get them on open
+DOCUMENT_COLUMNS = {
+    "version_tag": "TEXT",
+    "validated": "INTEGER NOT NULL DEFAULT 0",
+}
+
+
+def _compact(value):
+    return re.sub(r"[^0-9A-Z]", "", str(value).upper()) if value else ""
+
+
+def invoice_key(invoice):
+    """Normalized (GSTIN, invoice number, date) key, or None when any part is missing"""
+    gstin, number = _compact(invoice.gstin), _compact(invoice.invoice_number)
+    day = invoice.invoice_date.isoformat() if invoice.invoice_date else _compact(invoice.invoice_date_text)
+    if not (gstin and number and day):
+        return None
+    return f"{gstin}|{number}|{day}"
+
+
+def duplicate_remark(source, first_seen):
+    seen_on = time.strftime("%Y-%m-%d", time.localtime(first_seen))
+    return f"Duplicate: already extracted from {source or 'an earlier upload'} on {seen_on}"
+
+
+class DuplicateIndex:
+    """SQLite index of every invoice extracted so far, by file content hash and by invoice identity"""
+
+    def __init__(self, db_path=DEFAULT_DB_PATH):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            existing = {row["name"] for row in conn.execute("PRAGMA table_info(documents)")}
+            for column, definition in DOCUMENT_COLUMNS.items():
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE documents ADD COLUMN {column} {definition}")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def find_document(self, file_hash, version):
+        """
+        The earlier extraction of a byte-identical file, or None. Only extractions made
+        with the same version tag (utils.extraction_cache.version_tag) are replayed, so a
+        prompt or model change re-extracts the file like it misses the extraction cache.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT source, gst_data_json, first_seen, validated FROM documents WHERE file_hash = ? AND version_tag = ?",
+                (file_hash, version),
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "source": row["source"],
+            "gst_data": json.loads(row["gst_data_json"]),
+            "first_seen": row["first_seen"],
+            "validated": bool(row["validated"]),
+        }
+
+    def register(self, file_hash, source, gst_data, version, validated):
+        """
+        Record a file's extracted invoices under ``version`` and return, per record, the earlier sighting
+        ({"source", "first_seen"}) of the same invoice in a different file, or None.
+
+        Lookup and insert run in one transaction under the lock, so two files holding
+        the same invoice in one batch see each other.
+        """
+        keys = [invoice_key(invoice) for invoice in normalize_records(gst_data)]
+        now = time.time()
+        seen = []
+        with self.lock, self._connect() as conn:
+            for key in keys:
+                row = None
+                if key is not None:
+                    row = conn.execute(
+                        "SELECT file_hash, source, first_seen FROM invoices WHERE invoice_key = ?", (key,)
+                    ).fetchone()
+                    if row is None:
+                        conn.execute(
+                            "INSERT INTO invoices (invoice_key, file_hash, source, first_seen) VALUES (?, ?, ?, ?)",
+                            (key, file_hash, source, now),
+                        )
+                seen.append(
+                    {"source": row["source"], "first_seen": row["first_seen"]}
+                    if row is not None and row["file_hash"] != file_hash else None
+                )
+            # A re-extraction under a newer version replaces the stored one but keeps first_seen
+            conn.execute(
+                """
+                INSERT INTO documents (file_hash, source, gst_data_json, first_seen, version_tag, validated)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (file_hash) DO UPDATE SET
+                    gst_data_json = excluded.gst_data_json,
+                    version_tag = excluded.version_tag,
+                    validated = excluded.validated
+                """,
+                (file_hash, source, json.dumps(gst_data, default=str), now, version, int(bool(validated))),
+            )
+        return seen
+
+    def forget_documents(self, file_hash=None, version=None):
+        """
+        Drop stored extractions of one file, of one version tag, or all of them, so the
+        files are extracted again instead of replayed. Invoice identities are kept and
+        still flag duplicates across files. Returns the number of documents removed.
+        """
+        clauses, params = [], []
+        if file_hash:
+            clauses.append("file_hash = ?")
+            params.append(file_hash)
+        if version:
+            clauses.append("version_tag = ?")
+            params.append(version)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self.lock, self._connect() as conn:
+            return conn.execute(f"DELETE FROM documents{where}", params).rowcount
+
+    def stats(self):
+        with self._connect() as conn:
+            documents = conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+            invoices = conn.execute("SELECT COUNT(*) FROM invoices").fetchone()[0]
+        return {"documents": documents, "invoices": invoices, "db_path": self.db_path}
+
+
+_default_index = None
+_default_index_lock = threading.Lock()
+
+
+def get_default_index():
+    global _default_index
+    with _default_index_lock:
+        if _default_index is None:
+            _default_index = DuplicateIndex()
+        return _default_index
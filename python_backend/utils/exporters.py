@@ -0,0 +1,232 @@
+import io
+import csv
+import json
+import threading
+from decimal import Decimal, ROUND_HALF_UP
+
+from agents.writer_agent import HEADERS, HEADER_FIELDS, NORMALIZE_CHUNK
+from utils.invoice_model import normalize_records
+
+# One row per line item: the report's "HSN Codes" column becomes a single "HSN Code",
+# and the invoice-level fields repeat on every line item of the invoice
+EXPORT_HEADERS = [header if header != "HSN Codes" else "HSN Code" for header in HEADERS]
+AMOUNT_HEADERS = ("CGST", "SGST", "IGST", "Total Tax", "Taxable Amount")
+
+# Parquet rows are buffered into row groups of this size before they are written out
+PARQUET_ROW_GROUP = 5000
+
+
+def line_item_rows(invoices, first_sno=1):
+    """Yield one list of raw values (date, Decimal, str or None) per line item, aligned with EXPORT_HEADERS"""
+    for sno, invoice in enumerate(invoices, start=first_sno):
+        values = [sno]
+        hsn_position = None
+        for header in HEADERS[1:]:
+            if HEADER_FIELDS[header] == "hsn_codes":
+                hsn_position = len(values)
+                values.append(None)
+            else:
+                values.append(getattr(invoice, HEADER_FIELDS[header]))
+        for code in invoice.hsn_codes or [None]:
+            row = list(values)
+            row[hsn_position] = code
+            yield row
+
+
+def _text(value):
+    if value is None:
+        return ""
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+
+class _RowExporter:
+    """
+    Encodes extracted invoices as line-item rows, chunk by chunk. Like the report
+    builders in agents.writer_agent, file results may arrive out of order and rows
+    still follow the batch's input order; every call returns the bytes that are
+    ready to send, so a batch never has to be held in memory as one document.
+    """
+
+    media_type = "application/octet-stream"
+    extension = ""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.next_sno = 1
+        self._pending = {}
+        self._next_index = 0
+
+    def header(self):
+        return b""
+
+    def _encode(self, rows):
+        raise NotImplementedError
+
+    def _footer(self):
+        return b""
+
+    def _rows(self, records):
+        chunks = []
+        for start in range(0, len(records), NORMALIZE_CHUNK):
+            invoices = normalize_records(records[start:start + NORMALIZE_CHUNK])
+            chunks.append(self._encode(line_item_rows(invoices, self.next_sno)))
+            self.next_sno += len(invoices)
+        return b"".join(chunks)
+
+    def add_invoices(self, invoices):
+        """Encode a list of already normalized Invoice objects, e.g. read back from the invoice store"""
+        with self.lock:
+            data = self._encode(line_item_rows(invoices, self.next_sno))
+            self.next_sno += len(invoices)
+            return data
+
+    def add_file_result(self, index, records):
+        """Add one file's records; returns the bytes of every row that is now in order"""
+        with self.lock:
+            self._pending[index] = records or []
+            ready = []
+            while self._next_index in self._pending:
+                ready.extend(self._pending.pop(self._next_index))
+                self._next_index += 1
+            return self._rows(ready) if ready else b""
+
+    def finish(self):
+        with self.lock:
+            # Flush anything still waiting on a missing earlier index
+            remaining = []
+            for index in sorted(self._pending):
+                remaining.extend(self._pending.pop(index))
+            return self._rows(remaining) + self._footer()
+
+
+class CsvExporter(_RowExporter):
+    media_type = "text/csv"
+    extension = ".csv"
+
+    def header(self):
+        return self._encode([EXPORT_HEADERS])
+
+    def _encode(self, rows):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerows([_text(value) for value in row] for row in rows)
+        return buffer.getvalue().encode("utf-8")
+
+
+class JsonlExporter(_RowExporter):
+    media_type = "application/x-ndjson"
+    extension = ".jsonl"
+
+    def _encode(self, rows):
+        lines = []
+        for row in rows:
+            record = {
+                header: (value if value is None or isinstance(value, int) else _text(value))
+                for header, value in zip(EXPORT_HEADERS, row)
+            }
+            lines.append(json.dumps(record, ensure_ascii=False) + "\n")
+        return "".join(lines).encode("utf-8")
+
+
+class _ChunkSink:
+    """Write-only file object for pyarrow that hands out what was written since the last drain"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.buffer += data
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+class ParquetExporter(_RowExporter):
+    """Parquet output with typed columns"""
+
+    media_type = "application/vnd.apache.parquet"
+    extension = ".parquet"
+
+    def __init__(self):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError("Parquet export needs the pyarrow package (pip install pyarrow)")
+        super().__init__()
+        self.pa = pa
+        types = {"S.No.": pa.int64(), "Date": pa.date32()}
+        types.update({header: pa.decimal128(18, 2) for header in AMOUNT_HEADERS})
+        self.schema = pa.schema([(header, types.get(header, pa.string())) for header in EXPORT_HEADERS])
+        self._amount_positions = {EXPORT_HEADERS.index(header) for header in AMOUNT_HEADERS}
+        self.sink = _ChunkSink()
+        self.writer = pq.ParquetWriter(self.sink, self.schema)
+        self._rows_buffer = []
+
+    def _write_row_group(self):
+        if self._rows_buffer:
+            columns = list(zip(*self._rows_buffer))
+            self._rows_buffer = []
+            self.writer.write_table(self.pa.Table.from_arrays(
+                [self.pa.array(column, type=field.type) for column, field in zip(columns, self.schema)],
+                schema=self.schema,
+            ))
+        return self.sink.drain()
+
+    def _encode(self, rows):
+        cent = Decimal("0.01")
+        for row in rows:
+            # Amount columns are decimal; an amount kept as text (not a number) is written as null
+            for position in self._amount_positions:
+                value = row[position]
+                row[position] = value.quantize(cent, rounding=ROUND_HALF_UP) if isinstance(value, Decimal) else None
+            self._rows_buffer.append(row)
+        if len(self._rows_buffer) >= PARQUET_ROW_GROUP:
+            return self._write_row_group()
+        return b""
+
+    def _footer(self):
+        data = self._write_row_group()
+        self.writer.close()
+        return data + self.sink.drain()
+
+
+def stream_invoices(exporter, invoices):
+    """Yield an export of an iterable of Invoice objects (consumed lazily) in NORMALIZE_CHUNK pieces"""
+    yield exporter.header()
+    batch = []
+    for invoice in invoices:
+        batch.append(invoice)
+        if len(batch) >= NORMALIZE_CHUNK:
+            yield exporter.add_invoices(batch)
+            batch = []
+    yield exporter.add_invoices(batch)
+    yield exporter.finish()
+
+
+EXPORTERS = {
+    "csv": CsvExporter,
+    "jsonl": JsonlExporter,
+    "parquet": ParquetExporter,
+}
+
+
+def new_exporter(kind):
+    if kind not in EXPORTERS:
+        raise ValueError(f"Unknown export format: {kind} (expected one of {list(EXPORTERS)})")
+    return EXPORTERS[kind]()
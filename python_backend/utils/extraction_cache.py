@@ -0,0 +1,238 @@
+"""
+Content-addressed on-disk cache for GST extraction results.
+
+Entries are keyed on the SHA-256 of the invoice file (page ranges split out of a
+file on page_range_key) plus a version tag made of the prompt version,
+extraction mode and model name, so editing a prompt or switching models never
+serves stale data. Each entry is a small JSON file; the least recently
+used entries are evicted once the cache grows beyond its size budget.
+
+Byte-identical files are also replayed from the duplicate index
+(utils.duplicate_index), so invalidate and clear drop the matching documents
+there as well.
+
+Usage:
+    python -m utils.extraction_cache stats
+    python -m utils.extraction_cache invalidate --file invoice.pdf
+    python -m utils.extraction_cache invalidate --sha <sha256>
+    python -m utils.extraction_cache invalidate --version v2:pipeline:gemini-1.5-flash
+    python -m utils.extraction_cache clear
+"""
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from pathlib import Path
+
+# Bump whenever an agent prompt or the validation rules change so old extractions and verdicts are not reused
+# (v2: utils.gst_validation checks checksums, state codes, tax splits and dates)
+PROMPT_VERSION = os.getenv("GST_PROMPT_VERSION", "v2")
+
+DEFAULT_CACHE_DIR = os.getenv(
+    "GST_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "extractions"),
+)
+DEFAULT_MAX_BYTES = int(os.getenv("GST_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+CACHE_ENABLED = os.getenv("GST_CACHE_ENABLED", "1") not in ("0", "false", "False")
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(file_path):
+    """SHA-256 of a file, read in chunks so large scans are not loaded at once"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def page_range_key(file_sha256, start, end):
+    """
+    Stable key for pages [start, end) of a file, used for the units a multi-invoice PDF
+    is split into. It starts with the file's hash, so invalidate_file drops them too.
+    """
+    return f"{file_sha256}.p{start}-{end}"
+
+
+def version_tag(model_name, mode="pipeline"):
+    return f"{PROMPT_VERSION}:{mode}:{model_name}"
+
+
+def _version_hash(version):
+    return hashlib.sha256(version.encode("utf-8")).hexdigest()[:16]
+
+
+class ExtractionCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._total_bytes = None
+
+    def _entry_path(self, file_sha256, version):
+        return self.cache_dir / f"{file_sha256}-{_version_hash(version)}.json"
+
+    def _entries(self):
+        if not self.cache_dir.exists():
+            return []
+        return list(self.cache_dir.glob("*.json"))
+
+    def _current_total(self):
+        if self._total_bytes is None:
+            self._total_bytes = sum(p.stat().st_size for p in self._entries())
+        return self._total_bytes
+
+    def get(self, file_sha256, version):
+        """Return the cached entry dict or None; a hit refreshes the entry's LRU position"""
+        path = self._entry_path(file_sha256, version)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            os.utime(path, None)
+        except (OSError, ValueError):
+            with self.lock:
+                self.misses += 1
+            return None
+        with self.lock:
+            self.hits += 1
+        return entry
+
+    def put(self, file_sha256, version, gst_data, validated):
+        entry = {
+            "file_sha256": file_sha256,
+            "version": version,
+            "gst_data": gst_data,
+            "validated": validated,
+            "created_at": time.time(),
+        }
+        payload = json.dumps(entry, ensure_ascii=False).encode("utf-8")
+        path = self._entry_path(file_sha256, version)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        # Write to a temp file first so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(payload)
+
+        with self.lock:
+            total = self._current_total()
+            if path.exists():
+                total -= path.stat().st_size
+            os.replace(tmp_path, path)
+            self._total_bytes = total + len(payload)
+            self.writes += 1
+            self._evict_locked()
+
+    def _evict_locked(self):
+        if self._total_bytes <= self.max_bytes:
+            return
+        entries = []
+        for path in self._entries():
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        for _, size, path in entries:
+            if self._total_bytes <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            self._total_bytes -= size
+            self.evictions += 1
+
+    def _remove(self, paths):
+        removed = 0
+        with self.lock:
+            for path in paths:
+                try:
+                    path.unlink()
+                    removed += 1
+                except OSError:
+                    pass
+            self._total_bytes = None
+        return removed
+
+    def invalidate_file(self, file_sha256):
+        """Drop every cached version for one file, including the page ranges split out of it"""
+        entries = list(self.cache_dir.glob(f"{file_sha256}-*.json")) + list(self.cache_dir.glob(f"{file_sha256}.p*-*.json"))
+        return self._remove(entries)
+
+    def invalidate_version(self, version):
+        """Drop every entry produced by a given prompt/model version"""
+        return self._remove(self.cache_dir.glob(f"*-{_version_hash(version)}.json"))
+
+    def clear(self):
+        return self._remove(self._entries())
+
+    def stats(self):
+        with self.lock:
+            entries = self._entries()
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(entries),
+                "bytes": self._current_total(),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "writes": self.writes,
+                "evictions": self.evictions,
+            }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache():
+    """Process-wide cache instance, or None when caching is disabled"""
+    global _default_cache
+    if not CACHE_ENABLED:
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ExtractionCache()
+        return _default_cache
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect or invalidate the GST extraction cache")
+    parser.add_argument("--dir", default=DEFAULT_CACHE_DIR, help="Cache directory")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("stats", help="Show entry count and size")
+    subparsers.add_parser("clear", help="Remove every cached entry")
+    invalidate = subparsers.add_parser("invalidate", help="Remove selected entries")
+    target = invalidate.add_mutually_exclusive_group(required=True)
+    target.add_argument("--file", help="Invoice file whose cached extraction should be dropped")
+    target.add_argument("--sha", help="SHA-256 of the invoice file")
+    target.add_argument("--version", help="Version tag, e.g. v2:pipeline:gemini-1.5-flash")
+    args = parser.parse_args()
+
+    from utils.duplicate_index import DuplicateIndex
+
+    cache = ExtractionCache(cache_dir=args.dir)
+    if args.command == "stats":
+        print(json.dumps(cache.stats(), indent=2))
+    else:
+        index = DuplicateIndex()
+        if args.command == "clear":
+            removed, forgotten = cache.clear(), index.forget_documents()
+        elif args.file or args.sha:
+            file_sha256 = args.sha or hash_file(args.file)
+            removed, forgotten = cache.invalidate_file(file_sha256), index.forget_documents(file_hash=file_sha256)
+        else:
+            removed, forgotten = cache.invalidate_version(args.version), index.forget_documents(version=args.version)
+        print(f"Removed {removed} entries and {forgotten} duplicate-index documents")
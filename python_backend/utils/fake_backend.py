@@ -0,0 +1,169 @@
+import os
+import json
+import time
+import random
+import asyncio
+import hashlib
+import threading
+
+from google.api_core import exceptions as google_exceptions
+
+# Settings for GEMINI_BACKEND=fake
+FAKE_LATENCY_SECONDS = float(os.getenv("GEMINI_FAKE_LATENCY", "0.05"))
+FAKE_JITTER_SECONDS = float(os.getenv("GEMINI_FAKE_JITTER", "0.0"))
+FAKE_ERROR_RATE = float(os.getenv("GEMINI_FAKE_ERROR_RATE", "0.0"))
+FAKE_RESPONSES_PATH = os.getenv("GEMINI_FAKE_RESPONSES")
+FAKE_SEED = int(os.getenv("GEMINI_FAKE_SEED", "0"))
+
+FAKE_GSTIN = "27AAPFU0939F1ZV"
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+def _part_digest(part):
+    """Stable identity of the file part: inline bytes, or the uploaded file's name"""
+    if isinstance(part, dict) and "data" in part:
+        return hashlib.sha256(part["data"]).hexdigest()
+    name = getattr(part, "name", None) or repr(part)
+    return hashlib.sha256(name.encode()).hexdigest()
+
+
+def _is_text(part):
+    return isinstance(part, dict) and "text" in part
+
+
+def request_key(parts):
+    """Key under which a response is recorded and replayed: file identities + prompt text"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part["text"].encode() if _is_text(part) else _part_digest(part).encode())
+    return digest.hexdigest()
+
+
+def synthetic_invoice(file_digest):
+    """A deterministic, internally consistent invoice record for a file"""
+    rng = random.Random(file_digest)
+    taxable = round(rng.uniform(100, 50000), 2)
+    tax = round(taxable * 0.18, 2)
+    return {
+        "Shop Name": f"Vendor {file_digest[:6].upper()}",
+        "GSTIN": FAKE_GSTIN,
+        "Invoice Number": f"INV-{file_digest[:8].upper()}",
+        "Invoice Date": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "Total Amount": f"{taxable + tax:.2f}",
+        "Tax Amount": f"{tax:.2f}",
+        "CGST": f"{tax / 2:.2f}",
+        "SGST": f"{tax / 2:.2f}",
+        "IGST": "N/A",
+        "Items": [{"HSN Code": str(rng.randint(10000000, 99999999))} for _ in range(rng.randint(1, 5))],
+    }
+
+
+def load_recorded_responses(path):
+    responses = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                responses[entry["key"]] = entry["text"]
+    return responses
+
+
+class FakeBackend:
+    """
+    Offline stand-in for genai.GenerativeModel: same generate_content /
+    generate_content_async interface, no network.
+
+    Responses come from ``responses`` (a {request_key: text} dict, e.g. recorded
+    with RecordingBackend) when the request was recorded, otherwise they are
+    synthesized per file: OCR text or a JSON invoice array. Each call
+    sleeps ``latency`` (+ up to ``jitter``) seconds and fails with a retryable
+    ServiceUnavailable with probability ``error_rate``.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, responses=None, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.responses = responses or {}
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+
+    @classmethod
+    def from_env(cls):
+        responses = load_recorded_responses(FAKE_RESPONSES_PATH) if FAKE_RESPONSES_PATH else None
+        return cls(FAKE_LATENCY_SECONDS, FAKE_JITTER_SECONDS, FAKE_ERROR_RATE, responses, FAKE_SEED)
+
+    def _plan(self):
+        """Draw this call's delay and whether it fails"""
+        with self.lock:
+            self.calls += 1
+            delay = self.latency + (self.rng.uniform(0, self.jitter) if self.jitter else 0.0)
+            fail = self.error_rate > 0 and self.rng.random() < self.error_rate
+            if fail:
+                self.errors += 1
+        return delay, fail
+
+    def _respond(self, parts, generation_config):
+        key = request_key(parts)
+        if key in self.responses:
+            return FakeResponse(self.responses[key])
+
+        prompt = parts[-1].get("text", "") if isinstance(parts[-1], dict) else ""
+        file_digests = [_part_digest(part) for part in parts if not _is_text(part)]
+        if len(file_digests) > 1:
+            # Packed request (gemini_client.generate_response_with_files): one keyed entry per document
+            return FakeResponse(json.dumps([
+                {"Document": number, "Invoices": [synthetic_invoice(digest)]}
+                for number, digest in enumerate(file_digests, start=1)
+            ]))
+        file_digest = file_digests[0]
+        wants_json = bool(generation_config and generation_config.get("response_schema")) or "JSON" in prompt
+        if wants_json:
+            return FakeResponse(json.dumps([synthetic_invoice(file_digest)]))
+        record = synthetic_invoice(file_digest)
+        return FakeResponse("TAX INVOICE\n" + "\n".join(f"{k}: {v}" for k, v in record.items() if k != "Items"))
+
+    def generate_content(self, parts, generation_config=None):
+        delay, fail = self._plan()
+        if delay:
+            time.sleep(delay)
+        if fail:
+            raise google_exceptions.ServiceUnavailable("Injected fake backend error")
+        return self._respond(parts, generation_config)
+
+    async def generate_content_async(self, parts, generation_config=None):
+        delay, fail = self._plan()
+        if delay:
+            await asyncio.sleep(delay)
+        if fail:
+            raise google_exceptions.ServiceUnavailable("Injected fake backend error")
+        return self._respond(parts, generation_config)
+
+
+class RecordingBackend:
+    """Wraps a real backend and appends every response to a JSONL file for FakeBackend replay"""
+
+    def __init__(self, backend, path):
+        self.backend = backend
+        self.path = path
+        self.lock = threading.Lock()
+
+    def _record(self, parts, response):
+        line = json.dumps({"key": request_key(parts), "text": response.text}) + "\n"
+        with self.lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+        return response
+
+    def generate_content(self, parts, generation_config=None):
+        return self._record(parts, self.backend.generate_content(parts, generation_config=generation_config))
+
+    async def generate_content_async(self, parts, generation_config=None):
+        response = await self.backend.generate_content_async(parts, generation_config=generation_config)
+        return self._record(parts, response)
@@ -0,0 +1,93 @@
+import os
+import time
+import uuid
+import threading
+from pathlib import Path
+
+from utils.gemini_client import get_genai, guess_mime_type
+
+# "gemini" uploads through the Gemini Files API; "local" keeps bytes in memory (no network)
+DEFAULT_FILE_STORE = os.getenv("GST_FILE_STORE", "gemini")
+UPLOAD_POLL_SECONDS = 1.0
+UPLOAD_TIMEOUT_SECONDS = float(os.getenv("GST_UPLOAD_TIMEOUT", "120"))
+
+
+class FileHandle:
+    """A file uploaded once per pipeline run and referenced by every model call"""
+
+    def __init__(self, name, mime_type, size, part, store):
+        self.name = name
+        self.mime_type = mime_type
+        self.size = size
+        # Object placed in the request parts in place of inline file bytes
+        self.part = part
+        self.store = store
+
+    def __repr__(self):
+        return f"FileHandle(name={self.name!r}, mime_type={self.mime_type!r}, size={self.size})"
+
+
+class GeminiFileStore:
+    def upload(self, file_path):
+        genai = get_genai()
+        mime_type = guess_mime_type(file_path)
+        uploaded = genai.upload_file(path=file_path, mime_type=mime_type)
+
+        # PDFs and large images are processed asynchronously before they can be referenced
+        deadline = time.monotonic() + UPLOAD_TIMEOUT_SECONDS
+        while uploaded.state.name == "PROCESSING":
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Upload of {file_path} still processing after {UPLOAD_TIMEOUT_SECONDS}s")
+            time.sleep(UPLOAD_POLL_SECONDS)
+            uploaded = genai.get_file(uploaded.name)
+        if uploaded.state.name == "FAILED":
+            raise RuntimeError(f"Gemini could not process uploaded file {file_path}")
+
+        return FileHandle(uploaded.name, mime_type, os.path.getsize(file_path), uploaded, self)
+
+    def delete(self, handle):
+        genai = get_genai()
+        genai.delete_file(handle.name)
+
+
+class LocalFileStore:
+    """Network-free store for tests and offline runs; sends the bytes inline, read once"""
+
+    def __init__(self):
+        self.files = {}
+        self.uploads = 0
+        self.deletes = 0
+        self.lock = threading.Lock()
+
+    def upload(self, file_path):
+        mime_type = guess_mime_type(file_path)
+        data = Path(file_path).read_bytes()
+        name = f"local/{uuid.uuid4().hex}"
+        with self.lock:
+            self.files[name] = data
+            self.uploads += 1
+        return FileHandle(name, mime_type, len(data), {"mime_type": mime_type, "data": data}, self)
+
+    def delete(self, handle):
+        with self.lock:
+            if self.files.pop(handle.name, None) is not None:
+                self.deletes += 1
+
+
+FILE_STORES = {
+    "gemini": GeminiFileStore,
+    "local": LocalFileStore,
+}
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_default_file_store():
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            if DEFAULT_FILE_STORE not in FILE_STORES:
+                raise ValueError(f"Unknown file store: {DEFAULT_FILE_STORE} (expected one of {list(FILE_STORES)})")
+            _default_store = FILE_STORES[DEFAULT_FILE_STORE]()
+        return _default_store
@@ -1,39 +1,424 @@
 # utils/gemini_client.py
 
 import os
-import google.generativeai as genai
+import time
+import logging
+import random
+import asyncio
+import threading
+from collections import deque
+from pathlib import Path
+
 from dotenv import load_dotenv
 
+from utils.metrics import MODEL_SECONDS, MODEL_REQUESTS, MODEL_RETRIES, MODEL_TOKENS, THROTTLE_SECONDS, UPLOAD_BYTES
+
+logger = logging.getLogger(__name__)
+
 load_dotenv()
 api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
-genai.configure(api_key=api_key)
 
-gemini_model = genai.GenerativeModel("gemini-1.5-flash")
+MODEL_NAME = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+# "gemini" calls the API; "fake" uses utils.fake_backend (offline, for benchmarks)
+BACKEND_NAME = os.getenv("GEMINI_BACKEND", "gemini")
+# Append every real response to this JSONL file so FakeBackend can replay it
+RECORD_RESPONSES_PATH = os.getenv("GEMINI_RECORD")
+
+# Quota and retry settings (defaults match the free-tier flash limits)
+REQUESTS_PER_MINUTE = int(os.getenv("GEMINI_RPM", "15"))
+TOKENS_PER_MINUTE = int(os.getenv("GEMINI_TPM", "1000000"))
+MAX_IN_FLIGHT = int(os.getenv("GEMINI_MAX_IN_FLIGHT", "4"))
+MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "5"))
+BACKOFF_BASE_SECONDS = float(os.getenv("GEMINI_BACKOFF_BASE", "1.0"))
+BACKOFF_MAX_SECONDS = float(os.getenv("GEMINI_BACKOFF_MAX", "60.0"))
+
+# Gemini bills roughly this many tokens per image / PDF page
+TOKENS_PER_IMAGE = 258
+PDF_BYTES_PER_PAGE_ESTIMATE = 50_000
+
+# google-generativeai and google.api_core take most of a second to import, so they are
+# loaded on the first model call (or by warm_up()) rather than when this module is imported
+_genai = None
+_retryable_errors = None
+_backend_lock = threading.RLock()
+
+
+def get_genai():
+    """The google.generativeai module, imported and configured with the API key on first use"""
+    global _genai
+    with _backend_lock:
+        if _genai is None:
+            import google.generativeai as genai
+
+            genai.configure(api_key=api_key)
+            _genai = genai
+        return _genai
+
+
+def retryable_errors():
+    global _retryable_errors
+    if _retryable_errors is None:
+        from google.api_core import exceptions as google_exceptions
+
+        _retryable_errors = (
+            google_exceptions.ResourceExhausted,
+            google_exceptions.TooManyRequests,
+            google_exceptions.ServiceUnavailable,
+            google_exceptions.InternalServerError,
+            google_exceptions.DeadlineExceeded,
+            ConnectionError,
+            TimeoutError,
+        )
+    return _retryable_errors
+
+
+class GeminiClientError(Exception):
+    """Raised when a Gemini request fails permanently or runs out of retries"""
+
+
+class TokenBucket:
+    """Thread-safe token bucket; callers reserve capacity and sleep for the returned delay"""
+
+    def __init__(self, capacity, refill_per_second):
+        self.capacity = float(capacity)
+        self.refill_per_second = float(refill_per_second)
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self, amount=1.0):
+        """Take ``amount`` tokens and return how many seconds the caller must wait"""
+        amount = min(float(amount), self.capacity)
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_per_second)
+            self.updated_at = now
+            # Going negative queues the caller behind earlier reservations
+            self.tokens -= amount
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.refill_per_second
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute limits shared by sync and async callers"""
+
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.requests = TokenBucket(requests_per_minute, requests_per_minute / 60.0)
+        self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60.0)
+
+    def reserve(self, estimated_tokens):
+        return max(self.requests.reserve(1), self.tokens.reserve(estimated_tokens))
+
+    def acquire(self, estimated_tokens):
+        delay = self.reserve(estimated_tokens)
+        if delay > 0:
+            THROTTLE_SECONDS.inc(delay)
+            time.sleep(delay)
+        return delay
+
+    async def acquire_async(self, estimated_tokens):
+        delay = self.reserve(estimated_tokens)
+        if delay > 0:
+            THROTTLE_SECONDS.inc(delay)
+            await asyncio.sleep(delay)
+        return delay
+
+
+class InFlightLimiter:
+    """
+    Caps requests in flight with one count shared by sync and async callers. A
+    released slot is handed straight to the longest waiter, whichever kind it is.
+    """
+
+    def __init__(self, limit):
+        self.limit = max(1, int(limit))
+        self.active = 0
+        self.waiters = deque()
+        self.lock = threading.Lock()
+
+    def _take(self):
+        # Caller holds self.lock; queued waiters go first so nobody jumps the line
+        if self.active < self.limit and not self.waiters:
+            self.active += 1
+            return True
+        return False
+
+    def acquire(self):
+        with self.lock:
+            if self._take():
+                return
+            granted = threading.Event()
+            self.waiters.append(granted.set)
+        granted.wait()
+
+    async def acquire_async(self):
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def grant():
+            # A waiter cancelled after its slot was handed over passes the slot on
+            if granted.cancelled():
+                self.release()
+            else:
+                granted.set_result(None)
+
+        def wake():
+            try:
+                loop.call_soon_threadsafe(grant)
+            except RuntimeError:
+                # The waiter's loop is closed
+                self.release()
+
+        with self.lock:
+            if self._take():
+                return
+            self.waiters.append(wake)
+        try:
+            await granted
+        except asyncio.CancelledError:
+            with self.lock:
+                try:
+                    self.waiters.remove(wake)
+                except ValueError:
+                    pass  # already woken; grant() releases the slot
+            raise
+
+    def release(self):
+        with self.lock:
+            if not self.waiters:
+                self.active -= 1
+                return
+            wake = self.waiters.popleft()
+        wake()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+    async def __aenter__(self):
+        await self.acquire_async()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.release()
+
+
+def create_backend(name=None):
+    """
+    Build a model backend: any object with generate_content(parts, generation_config=None)
+    and an awaitable generate_content_async with the same signature.
+    """
+    name = name or BACKEND_NAME
+    if name == "gemini":
+        backend = get_genai().GenerativeModel(MODEL_NAME)
+    elif name == "fake":
+        from utils.fake_backend import FakeBackend
+        backend = FakeBackend.from_env()
+    else:
+        raise ValueError(f"Unknown Gemini backend: {name} (expected 'gemini' or 'fake')")
+    if RECORD_RESPONSES_PATH:
+        from utils.fake_backend import RecordingBackend
+        backend = RecordingBackend(backend, RECORD_RESPONSES_PATH)
+    return backend
+
 
-def generate_response_with_file(prompt, file_path):
+def set_backend(backend):
+    """Swap the backend used by every call in this process; returns the previous one"""
+    global gemini_model
+    previous, gemini_model = gemini_model, backend
+    return previous
+
+
+def get_backend():
+    """The process-wide backend, created on first use"""
+    global gemini_model
+    with _backend_lock:
+        if gemini_model is None:
+            gemini_model = create_backend()
+        return gemini_model
+
+
+def warm_up():
+    """Import the model SDK and create the backend ahead of the first request"""
+    retryable_errors()
+    return get_backend()
+
+
+gemini_model = None
+
+
+rate_limiter = RateLimiter(REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE)
+_in_flight = InFlightLimiter(MAX_IN_FLIGHT)
+
+
+def guess_mime_type(file_path):
+    ext = Path(file_path).suffix.lower()
+    if ext == '.pdf':
+        return "application/pdf"
+    elif ext in ['.png', '.jpg', '.jpeg']:
+        return f"image/{ext[1:]}" if ext != '.jpg' else "image/jpeg"
+    return "application/pdf"  # default
+
+
+def estimate_tokens(prompt, file_size, mime_type):
+    """Rough input token count used for TPM throttling (no network call)"""
+    text_tokens = len(prompt) // 4
+    if mime_type == "application/pdf":
+        pages = max(1, file_size // PDF_BYTES_PER_PAGE_ESTIMATE)
+        return text_tokens + pages * TOKENS_PER_IMAGE
+    return text_tokens + TOKENS_PER_IMAGE
+
+
+def backoff_delay(attempt):
+    """Exponential backoff with full jitter"""
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt)))
+
+
+def _build_request(prompt, file_path, file_data):
+    mime_type = guess_mime_type(file_path)
+    parts = [
+        {"mime_type": mime_type, "data": file_data},
+        {"text": prompt}
+    ]
+    return parts, estimate_tokens(prompt, len(file_data), mime_type)
+
+
+def _build_packed_request(prompt, file_paths, file_datas):
+    """One part per file, each preceded by a "Document N:" label the prompt can refer to"""
+    parts = []
+    estimated_tokens = len(prompt) // 4
+    for number, (file_path, file_data) in enumerate(zip(file_paths, file_datas), start=1):
+        mime_type = guess_mime_type(file_path)
+        parts.append({"text": f"Document {number}:"})
+        parts.append({"mime_type": mime_type, "data": file_data})
+        estimated_tokens += estimate_tokens("", len(file_data), mime_type)
+    parts.append({"text": prompt})
+    return parts, estimated_tokens
+
+
+def _build_handle_request(prompt, handle):
+    """Reference a file already uploaded through utils.file_store instead of re-sending bytes"""
+    parts = [handle.part, {"text": prompt}]
+    return parts, estimate_tokens(prompt, handle.size, handle.mime_type)
+
+
+def _is_file_handle(file):
+    return hasattr(file, "part") and hasattr(file, "mime_type")
+
+
+def _generation_config(response_schema):
+    """Ask for schema-constrained JSON output when a response schema is given"""
+    if response_schema is None:
+        return None
+    return {"response_mime_type": "application/json", "response_schema": response_schema}
+
+
+def _response_text(response):
     try:
-        from pathlib import Path
-        
-        # Determine mime type based on file extension
-        ext = Path(file_path).suffix.lower()
-        if ext == '.pdf':
-            mime_type = "application/pdf"
-        elif ext in ['.png', '.jpg', '.jpeg']:
-            mime_type = f"image/{ext[1:]}" if ext != '.jpg' else "image/jpeg"
-        else:
-            mime_type = "application/pdf"  # default
-        
-        with open(file_path, "rb") as f:
+        return response.text
+    except ValueError as e:
+        # Raised when the response was blocked or has no candidates
+        raise GeminiClientError(f"Gemini returned no text: {e}") from e
+
+
+def _record_usage(response, text, estimated_tokens):
+    """Count tokens from the response's usage metadata, falling back to estimates"""
+    usage = getattr(response, "usage_metadata", None)
+    MODEL_TOKENS.inc(getattr(usage, "prompt_token_count", None) or estimated_tokens, direction="input")
+    MODEL_TOKENS.inc(getattr(usage, "candidates_token_count", None) or len(text) // 4, direction="output")
+
+
+def _retry_or_raise(attempt, error):
+    """Return the backoff delay for a retryable error, or raise once retries are exhausted"""
+    if attempt == MAX_RETRIES:
+        MODEL_REQUESTS.inc(outcome="error")
+        raise GeminiClientError(f"Gemini request failed after {attempt + 1} attempts: {error}") from error
+    MODEL_RETRIES.inc()
+    delay = backoff_delay(attempt)
+    logger.warning("retryable error attempt=%d delay=%.1fs: %s", attempt + 1, delay, error)
+    return delay
+
+
+def _generate(parts, estimated_tokens, generation_config):
+    """Send one request with throttling and retries; returns the response text"""
+    for attempt in range(MAX_RETRIES + 1):
+        rate_limiter.acquire(estimated_tokens)
+        try:
+            with _in_flight, MODEL_SECONDS.time():
+                response = get_backend().generate_content(parts, generation_config=generation_config)
+            text = _response_text(response)
+            _record_usage(response, text, estimated_tokens)
+            MODEL_REQUESTS.inc(outcome="ok")
+            return text
+        except retryable_errors() as e:
+            time.sleep(_retry_or_raise(attempt, e))
+        except GeminiClientError:
+            MODEL_REQUESTS.inc(outcome="error")
+            raise
+        except Exception as e:
+            MODEL_REQUESTS.inc(outcome="error")
+            raise GeminiClientError(f"Gemini request failed: {e}") from e
+
+
+def generate_response_with_file(prompt, file, response_schema=None):
+    """
+    Blocking Gemini call with throttling and retries; raises GeminiClientError on failure.
+    ``file`` is either a path (sent inline) or a FileHandle from utils.file_store.
+    """
+    if _is_file_handle(file):
+        parts, estimated_tokens = _build_handle_request(prompt, file)
+    else:
+        with open(file, "rb") as f:
             file_data = f.read()
+        parts, estimated_tokens = _build_request(prompt, file, file_data)
+        UPLOAD_BYTES.inc(len(file_data), path="inline")
+    return _generate(parts, estimated_tokens, _generation_config(response_schema))
 
-        parts = [
-            {"mime_type": mime_type, "data": file_data},
-            {"text": prompt}
-        ]
 
-        response = gemini_model.generate_content(parts)
-        return response.text
+def generate_response_with_files(prompt, file_paths, response_schema=None):
+    """
+    One blocking request carrying several files inline, labelled "Document 1:",
+    "Document 2:", ... in order; same throttling, retries and errors as
+    generate_response_with_file.
+    """
+    file_datas = []
+    for file_path in file_paths:
+        with open(file_path, "rb") as f:
+            file_datas.append(f.read())
+    parts, estimated_tokens = _build_packed_request(prompt, file_paths, file_datas)
+    UPLOAD_BYTES.inc(sum(len(data) for data in file_datas), path="inline")
+    return _generate(parts, estimated_tokens, _generation_config(response_schema))
+
+
+async def generate_response_with_file_async(prompt, file, response_schema=None):
+    """Awaitable counterpart of generate_response_with_file sharing the same quota"""
+    if _is_file_handle(file):
+        parts, estimated_tokens = _build_handle_request(prompt, file)
+    else:
+        file_data = await asyncio.to_thread(Path(file).read_bytes)
+        parts, estimated_tokens = _build_request(prompt, file, file_data)
+        UPLOAD_BYTES.inc(len(file_data), path="inline")
+    generation_config = _generation_config(response_schema)
 
-    except Exception as e:
-        print(f"[Gemini Client] ❌ Error in generate_response_with_file: {e}")
-        return ""
\ No newline at end of file
+    for attempt in range(MAX_RETRIES + 1):
+        await rate_limiter.acquire_async(estimated_tokens)
+        try:
+            async with _in_flight:
+                with MODEL_SECONDS.time():
+                    response = await get_backend().generate_content_async(parts, generation_config=generation_config)
+            text = _response_text(response)
+            _record_usage(response, text, estimated_tokens)
+            MODEL_REQUESTS.inc(outcome="ok")
+            return text
+        except retryable_errors() as e:
+            await asyncio.sleep(_retry_or_raise(attempt, e))
+        except GeminiClientError:
+            MODEL_REQUESTS.inc(outcome="error")
+            raise
+        except Exception as e:
+            MODEL_REQUESTS.inc(outcome="error")
+            raise GeminiClientError(f"Gemini request failed: {e}") from e
@@ -0,0 +1,186 @@
+import re
+from datetime import date
+from decimal import Decimal
+
+from utils.invoice_model import AMOUNT_FIELDS, normalize_record, normalize_records
+
+REQUIRED_FIELDS = ["Shop Name", "GSTIN", "Invoice Number", "Invoice Date", "Total Amount"]
+
+# 2-digit state code, 10-char PAN, entity number, 'Z', checksum character
+GSTIN_PATTERN = re.compile(r"^[0-9]{2}[A-Z]{5}[0-9]{4}[A-Z][1-9A-Z]Z[0-9A-Z]$")
+GSTIN_CHARSET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+# GST state/UT codes 01-38, plus 97 (other territory) and 99 (centre jurisdiction)
+STATE_CODES = {f"{code:02d}" for code in range(1, 39)} | {"97", "99"}
+
+# HSN codes are 4, 6 or 8 digits (SAC service codes are 6)
+HSN_PATTERN = r"\d{4}|\d{6}|\d{8}"
+
+# Allowed rounding difference (in rupees) when comparing tax components
+TAX_TOLERANCE = 1.0
+
+GST_START_DATE = date(2017, 7, 1)
+
+# Invoice attributes backing REQUIRED_FIELDS
+REQUIRED_ATTRIBUTES = {
+    "Shop Name": "shop_name",
+    "GSTIN": "gstin",
+    "Invoice Number": "invoice_number",
+    "Invoice Date": "invoice_date_text",
+    "Total Amount": "total_amount",
+}
+
+# Error codes reported per field
+MISSING_FIELD = "MISSING_FIELD"
+GSTIN_FORMAT = "GSTIN_FORMAT"
+GSTIN_CHECKSUM = "GSTIN_CHECKSUM"
+GSTIN_STATE = "GSTIN_STATE"
+TAX_REGIME_MIXED = "TAX_REGIME_MIXED"
+TAX_REGIME_STATE = "TAX_REGIME_STATE"
+TAX_SPLIT_INCOMPLETE = "TAX_SPLIT_INCOMPLETE"
+TAX_SPLIT_UNEQUAL = "TAX_SPLIT_UNEQUAL"
+TAX_SUM_MISMATCH = "TAX_SUM_MISMATCH"
+TAX_EXCEEDS_TOTAL = "TAX_EXCEEDS_TOTAL"
+AMOUNT_UNPARSEABLE = "AMOUNT_UNPARSEABLE"
+DATE_UNPARSEABLE = "DATE_UNPARSEABLE"
+DATE_IN_FUTURE = "DATE_IN_FUTURE"
+DATE_BEFORE_GST = "DATE_BEFORE_GST"
+HSN_FORMAT = "HSN_FORMAT"
+
+
+def gstin_checksum(gstin):
+    """Expected 15th character of a GSTIN (mod-36 check digit over the first 14)"""
+    total = 0
+    for position, char in enumerate(gstin[:14]):
+        product = GSTIN_CHARSET.index(char) * (2 if position % 2 else 1)
+        total += product // 36 + product % 36
+    return GSTIN_CHARSET[(36 - total % 36) % 36]
+
+
+def _issue(field, code, message):
+    return {"field": field, "code": code, "message": message}
+
+
+def _amounts(invoices, attribute):
+    import numpy as np
+    import pandas as pd
+
+    # Amounts that are not numbers stay text on the Invoice and are left out of the tax checks
+    values = (getattr(invoice, attribute) for invoice in invoices)
+    return pd.Series([float(value) if isinstance(value, Decimal) else np.nan for value in values], dtype="float64")
+
+
+def _text(invoices, attribute):
+    import pandas as pd
+
+    return pd.Series([getattr(invoice, attribute) for invoice in invoices], dtype="string")
+
+
+def validate_invoices(invoices, today=None):
+    """
+    Run every rule over a batch of normalized Invoices with column-wise pandas operations.
+
+    Returns one list per invoice of {"field", "code", "message"} issues; an empty
+    list means the invoice passed.
+    """
+    # pandas is imported on first use; it is a large share of the backend's import time
+    import numpy as np
+    import pandas as pd
+
+    count = len(invoices)
+    issues = [[] for _ in range(count)]
+    if not count:
+        return issues
+    today = today or date.today()
+
+    def flag(mask, field, code, message):
+        for i in np.flatnonzero(mask.fillna(False).to_numpy(dtype=bool)):
+            issues[i].append(_issue(field, code, message(i) if callable(message) else message))
+
+    for field in REQUIRED_FIELDS:
+        attribute = REQUIRED_ATTRIBUTES[field]
+        flag(pd.Series([getattr(invoice, attribute) is None for invoice in invoices]),
+             field, MISSING_FIELD, f"Missing {field}")
+
+    for attribute, field in AMOUNT_FIELDS.items():
+        values = [getattr(invoice, attribute) for invoice in invoices]
+        flag(pd.Series([isinstance(value, str) for value in values]), field, AMOUNT_UNPARSEABLE,
+             lambda i: f"Unrecognised {field}: {values[i]}")
+
+    # GSTIN: format, check digit, state code
+    gstin = _text(invoices, "gstin").str.upper()
+    well_formed = gstin.str.match(GSTIN_PATTERN.pattern).fillna(False).astype(bool)
+    flag(gstin.notna() & ~well_formed, "GSTIN", GSTIN_FORMAT, lambda i: f"Invalid GSTIN format: {gstin[i]}")
+    checksum_ok = gstin.where(well_formed).map(
+        lambda value: gstin_checksum(value) == value[14], na_action="ignore"
+    ).fillna(True).astype(bool)
+    flag(well_formed & ~checksum_ok, "GSTIN", GSTIN_CHECKSUM,
+         lambda i: f"GSTIN check digit should be {gstin_checksum(gstin[i])}: {gstin[i]}")
+    supplier_state = gstin.str[:2].where(well_formed)
+    known_state = supplier_state.isin(STATE_CODES).fillna(False).astype(bool)
+    flag(well_formed & ~known_state, "GSTIN", GSTIN_STATE, lambda i: f"Unknown GST state code {supplier_state[i]}")
+
+    # Tax components
+    cgst, sgst, igst = _amounts(invoices, "cgst"), _amounts(invoices, "sgst"), _amounts(invoices, "igst")
+    tax, total = _amounts(invoices, "tax_amount"), _amounts(invoices, "total_amount")
+    charges_split = (cgst.fillna(0) != 0) | (sgst.fillna(0) != 0)
+    charges_igst = igst.fillna(0) != 0
+
+    mixed = charges_igst & charges_split
+    flag(mixed, "IGST", TAX_REGIME_MIXED, "IGST cannot be charged together with CGST/SGST")
+    split = ~mixed & (cgst.notna() | sgst.notna())
+    flag(split & (cgst.isna() | sgst.isna()), "CGST", TAX_SPLIT_INCOMPLETE,
+         "CGST and SGST must both be present for intra-state supply")
+    complete = split & cgst.notna() & sgst.notna()
+    flag(complete & ((cgst - sgst).abs() > TAX_TOLERANCE), "SGST", TAX_SPLIT_UNEQUAL,
+         lambda i: f"CGST ({cgst[i]}) and SGST ({sgst[i]}) should be equal")
+    flag(complete & tax.notna() & ((cgst + sgst - tax).abs() > TAX_TOLERANCE), "Tax Amount", TAX_SUM_MISMATCH,
+         lambda i: f"CGST + SGST ({cgst[i] + sgst[i]:.2f}) does not match Tax Amount ({tax[i]})")
+    igst_only = ~mixed & ~split & igst.notna()
+    flag(igst_only & tax.notna() & ((igst - tax).abs() > TAX_TOLERANCE), "Tax Amount", TAX_SUM_MISMATCH,
+         lambda i: f"IGST ({igst[i]}) does not match Tax Amount ({tax[i]})")
+    flag(tax > total + TAX_TOLERANCE, "Tax Amount", TAX_EXCEEDS_TOTAL,
+         lambda i: f"Tax Amount ({tax[i]}) exceeds Total Amount ({total[i]})")
+
+    # Place of supply: same state as the buyer means CGST+SGST, otherwise IGST
+    buyer_state = _text(invoices, "buyer_gstin").str.upper().str[:2]
+    both_known = known_state & buyer_state.isin(STATE_CODES).fillna(False).astype(bool)
+    intra_state = both_known & (buyer_state == supplier_state).fillna(False).astype(bool)
+    flag(intra_state & charges_igst, "IGST", TAX_REGIME_STATE, "Intra-state supply should charge CGST + SGST, not IGST")
+    flag(both_known & ~intra_state & charges_split, "CGST", TAX_REGIME_STATE,
+         "Inter-state supply should charge IGST, not CGST + SGST")
+
+    # Dates
+    parsed = pd.to_datetime(pd.Series([invoice.invoice_date for invoice in invoices], dtype="object"))
+    date_text = _text(invoices, "invoice_date_text")
+    flag(date_text.notna() & parsed.isna(), "Invoice Date", DATE_UNPARSEABLE,
+         lambda i: f"Unrecognised Invoice Date: {date_text[i]}")
+    flag(parsed > pd.Timestamp(today), "Invoice Date", DATE_IN_FUTURE,
+         lambda i: f"Invoice Date {parsed[i].date()} is in the future")
+    flag(parsed < pd.Timestamp(GST_START_DATE), "Invoice Date", DATE_BEFORE_GST,
+         lambda i: f"Invoice Date {parsed[i].date()} is before GST started ({GST_START_DATE})")
+
+    # HSN codes: one row per line item, grouped back to the invoice
+    hsn = pd.Series([invoice.hsn_codes for invoice in invoices], dtype="object").explode().dropna().astype(str)
+    bad_hsn = hsn[~hsn.str.fullmatch(HSN_PATTERN)]
+    for i, codes in bad_hsn.groupby(level=0):
+        issues[i].append(_issue("HSN Code", HSN_FORMAT, f"HSN codes must be 4, 6 or 8 digits: {', '.join(codes)}"))
+
+    return issues
+
+
+def validate_record(record):
+    """Validate one extracted invoice dict"""
+    return validate_invoices([normalize_record(record)])[0]
+
+
+def validate_records(records):
+    """Validate a list of records; returns (all_valid, list of per-record issue lists)"""
+    if not records:
+        return False, []
+    issues = validate_invoices(normalize_records(records))
+    return not any(issues), issues
+
+
+def issue_messages(issues):
+    return [issue["message"] for issue in issues]
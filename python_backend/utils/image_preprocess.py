@@ -0,0 +1,111 @@
+import os
+import tempfile
+from pathlib import Path
+
+from PIL import Image, ImageFilter, ImageOps
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+# Quality presets: target long edge in pixels, grayscale conversion and JPEG quality.
+# Invoices stay legible for OCR well below phone-camera resolution.
+PRESETS = {
+    "off": None,
+    "high": {"long_edge": 2400, "grayscale": True, "quality": 85},
+    "balanced": {"long_edge": 2000, "grayscale": True, "quality": 75},
+    "compact": {"long_edge": 1600, "grayscale": True, "quality": 60},
+}
+DEFAULT_PRESET = os.getenv("GST_IMAGE_PRESET", "balanced")
+
+# Document crop: pixels brighter than this count as paper; the crop is skipped
+# unless the paper covers a plausible share of the frame
+PAPER_THRESHOLD = 150
+MIN_CROP_AREA = 0.3
+CROP_MARGIN = 0.02
+
+PREPROCESS_DIR = os.path.join(tempfile.gettempdir(), "gst_preprocess")
+
+
+def get_preset(name=None):
+    name = name or DEFAULT_PRESET
+    if name not in PRESETS:
+        raise ValueError(f"Unknown image preset: {name} (expected one of {list(PRESETS)})")
+    return PRESETS[name]
+
+
+def crop_to_document(image):
+    """Crop to the bright paper region of a photo; returns the image unchanged if none is found"""
+    gray = ImageOps.grayscale(image)
+    # Work on a thumbnail: finding the bounding box does not need full resolution
+    scale = max(1, max(gray.size) // 800)
+    small = gray.reduce(scale) if scale > 1 else gray
+    mask = small.point(lambda v: 255 if v > PAPER_THRESHOLD else 0).filter(ImageFilter.MedianFilter(5))
+    bbox = mask.getbbox()
+    if bbox is None:
+        return image
+
+    left, top, right, bottom = (coord * scale for coord in bbox)
+    width, height = image.size
+    if (right - left) * (bottom - top) < MIN_CROP_AREA * width * height:
+        return image
+    margin_x, margin_y = int(width * CROP_MARGIN), int(height * CROP_MARGIN)
+    box = (
+        max(0, left - margin_x), max(0, top - margin_y),
+        min(width, right + margin_x), min(height, bottom + margin_y),
+    )
+    if box == (0, 0, width, height):
+        return image
+    return image.crop(box)
+
+
+def normalize_image(image, preset):
+    """EXIF rotation, document crop, grayscale and downscale, in that order"""
+    image = ImageOps.exif_transpose(image)
+    image = crop_to_document(image)
+    image = ImageOps.grayscale(image) if preset["grayscale"] else image.convert("RGB")
+    long_edge = max(image.size)
+    if long_edge > preset["long_edge"]:
+        ratio = preset["long_edge"] / long_edge
+        image = image.resize((round(image.width * ratio), round(image.height * ratio)), Image.LANCZOS)
+    return image
+
+
+def preprocess_image(file_path, preset_name=None, output_dir=None):
+    """
+    Normalize and re-encode an invoice photo before it is uploaded to the model.
+
+    Returns {"path", "original_bytes", "processed_bytes", "bytes_saved", "preset"}.
+    ``path`` is a new JPEG the caller must delete, or the original file_path when
+    the file is not an image, the preset is "off", or re-encoding would not shrink it.
+    """
+    preset_name = preset_name or DEFAULT_PRESET
+    preset = get_preset(preset_name)
+    original_bytes = os.path.getsize(file_path)
+    result = {
+        "path": file_path,
+        "original_bytes": original_bytes,
+        "processed_bytes": original_bytes,
+        "bytes_saved": 0,
+        "preset": preset_name,
+    }
+    if preset is None or Path(file_path).suffix.lower() not in IMAGE_EXTENSIONS:
+        return result
+
+    with Image.open(file_path) as image:
+        normalized = normalize_image(image, preset)
+
+    output_dir = output_dir or PREPROCESS_DIR
+    os.makedirs(output_dir, exist_ok=True)
+    fd, output_path = tempfile.mkstemp(prefix=Path(file_path).stem[:40] + "-", suffix=".jpg", dir=output_dir)
+    with os.fdopen(fd, "wb") as f:
+        normalized.save(f, format="JPEG", quality=preset["quality"], optimize=True)
+
+    processed_bytes = os.path.getsize(output_path)
+    if processed_bytes >= original_bytes:
+        os.remove(output_path)
+        return result
+    return {
+        **result,
+        "path": output_path,
+        "processed_bytes": processed_bytes,
+        "bytes_saved": original_bytes - processed_bytes,
+    }
@@ -0,0 +1,162 @@
+from dataclasses import dataclass
+from datetime import date
+from decimal import Decimal
+from typing import Optional
+
+# Keys of the extracted invoice dicts (see agents.parser_agent.EXTRACTION_INSTRUCTIONS)
+TEXT_FIELDS = {
+    "shop_name": "Shop Name",
+    "gstin": "GSTIN",
+    "invoice_number": "Invoice Number",
+    # Not requested by the extraction prompt; used by the validator when a model returns it
+    "buyer_gstin": "Buyer GSTIN",
+    # Set by the batch runner, e.g. for invoices already extracted from another upload
+    "remarks": "Remarks",
+}
+AMOUNT_FIELDS = {
+    "total_amount": "Total Amount",
+    "tax_amount": "Tax Amount",
+    "cgst": "CGST",
+    "sgst": "SGST",
+    "igst": "IGST",
+}
+DATE_FIELD = "Invoice Date"
+
+# Values the model uses for "not present"
+MISSING_TEXT = ("", "N/A", "n/a", "NA", "null", "None", "none", "nan")
+MISSING_HSN = ("", "0", "null", "None", "N/A")
+
+ISO_DATE_PATTERN = r"^\d{4}-\d{1,2}-\d{1,2}$"
+
+# Currency markers around extracted amounts: "Rs. 100", "INR 100", "₹100", "100/-"
+CURRENCY_PATTERN = r"(?i)\brs\.?|\binr\b|₹|/-"
+# What is left of an amount after currency markers, commas and spaces are removed
+AMOUNT_PATTERN = r"-?\d+(?:\.\d+)?"
+
+
+@dataclass(slots=True)
+class LineItem:
+    hsn_code: str
+
+
+@dataclass(slots=True)
+class Invoice:
+    """One extracted invoice with cleaned text, Decimal amounts and a parsed date"""
+
+    shop_name: Optional[str] = None
+    gstin: Optional[str] = None
+    invoice_number: Optional[str] = None
+    buyer_gstin: Optional[str] = None
+    remarks: Optional[str] = None
+    invoice_date: Optional[date] = None
+    # The date as extracted, kept for display when it could not be parsed
+    invoice_date_text: Optional[str] = None
+    # Amounts are Decimal, or the extracted text when it is not a number
+    total_amount: Optional[Decimal] = None
+    tax_amount: Optional[Decimal] = None
+    cgst: Optional[Decimal] = None
+    sgst: Optional[Decimal] = None
+    igst: Optional[Decimal] = None
+    items: tuple = ()
+
+    @property
+    def hsn_codes(self):
+        return [item.hsn_code for item in self.items]
+
+
+def _hsn_items(record):
+    """Line items from the Items array, or from the flat "HSN Code" field when there is none"""
+    items = record.get("Items")
+    if items and isinstance(items, list):
+        codes = [item.get("HSN Code") for item in items if isinstance(item, dict) and "HSN Code" in item]
+    else:
+        codes = record.get("HSN Code")
+        codes = codes if isinstance(codes, list) else [codes]
+    cleaned = (str(code).strip() for code in codes if code is not None)
+    return tuple(LineItem(code) for code in cleaned if code not in MISSING_HSN)
+
+
+def _text_column(frame, key):
+    import pandas as pd
+
+    column = frame[key].astype("string").str.strip() if key in frame else pd.Series(pd.NA, index=frame.index, dtype="string")
+    return column.mask(column.isin(MISSING_TEXT))
+
+
+def _amount_column(frame, key):
+    """
+    Convert a column of extracted amounts to Decimal. Currency markers ("Rs.",
+    "INR", "₹", a trailing "/-"), thousands separators and spaces are removed and
+    the rest must be a plain number; anything else ("90.00 (9%)", "12 Lakh",
+    "1e5") keeps its extracted text rather than being read as a different amount.
+    """
+    import pandas as pd
+
+    raw = _text_column(frame, key)
+    text = raw.str.replace(CURRENCY_PATTERN, "", regex=True).str.replace(r"[,\s]", "", regex=True)
+    valid = text.str.fullmatch(AMOUNT_PATTERN).fillna(False).astype(bool)
+    return [
+        Decimal(value) if ok else (None if original is pd.NA else original)
+        for value, ok, original in zip(text.tolist(), valid.tolist(), raw.tolist())
+    ]
+
+
+def _date_column(frame):
+    import pandas as pd
+
+    text = _text_column(frame, DATE_FIELD)
+    normalized = text.str.replace(r"[/.]", "-", regex=True)
+    # Year-first dates are unambiguous; everything else is read day-first as on Indian invoices
+    iso = normalized.str.match(ISO_DATE_PATTERN).fillna(False).astype(bool)
+    parsed = pd.to_datetime(normalized.where(iso), format="%Y-%m-%d", errors="coerce")
+    parsed = parsed.fillna(pd.to_datetime(normalized.where(~iso), dayfirst=True, format="mixed", errors="coerce"))
+    return [None if pd.isna(value) else value.date() for value in parsed], text.tolist()
+
+
+def normalize_records(records):
+    """
+    Convert a batch of extracted invoice dicts to Invoice objects.
+
+    Sentinels ("N/A", "null", ...) become None, amounts become Decimal and dates
+    are parsed, one pandas column operation per field rather than per cell.
+    """
+    # Anything that is not a dict becomes an empty invoice so results stay aligned with the input
+    records = [record if isinstance(record, dict) else {} for record in records]
+    if not records:
+        return []
+
+    # pandas is imported on first use; it is a large share of the backend's import time
+    import pandas as pd
+
+    frame = pd.DataFrame(records, index=range(len(records)))
+    columns = {name: _text_column(frame, key).tolist() for name, key in TEXT_FIELDS.items()}
+    # Extracted shop names sometimes carry a literal "\n" for the second line
+    columns["shop_name"] = [
+        None if value is pd.NA else value.replace("\\n", "\n").strip() for value in columns["shop_name"]
+    ]
+    for name in ("gstin", "invoice_number", "buyer_gstin", "remarks"):
+        columns[name] = [None if value is pd.NA else value for value in columns[name]]
+    for name, key in AMOUNT_FIELDS.items():
+        columns[name] = _amount_column(frame, key)
+    columns["invoice_date"], date_text = _date_column(frame)
+    columns["invoice_date_text"] = [None if value is pd.NA else value for value in date_text]
+    columns["items"] = [_hsn_items(record) for record in records]
+
+    names = list(columns)
+    return [Invoice(**dict(zip(names, values))) for values in zip(*columns.values())]
+
+
+def normalize_record(record):
+    invoices = normalize_records([record])
+    return invoices[0] if invoices else Invoice()
+
+
+def invoice_record(invoice):
+    """The inverse of normalize_record: an Invoice as a JSON-ready dict with the extraction keys"""
+    record = {key: getattr(invoice, name) for name, key in TEXT_FIELDS.items()}
+    record[DATE_FIELD] = invoice.invoice_date.isoformat() if invoice.invoice_date else invoice.invoice_date_text
+    for name, key in AMOUNT_FIELDS.items():
+        value = getattr(invoice, name)
+        record[key] = None if value is None else str(value)
+    record["Items"] = [{"HSN Code": code} for code in invoice.hsn_codes]
+    return record
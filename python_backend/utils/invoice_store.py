@@ -0,0 +1,195 @@
+import os
+import time
+import sqlite3
+import threading
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from utils.invoice_model import Invoice, LineItem, AMOUNT_FIELDS, normalize_records
+
+DEFAULT_DB_PATH = os.getenv(
+    "GST_INVOICE_DB",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "invoices.db"),
+)
+INVOICE_STORE_ENABLED = os.getenv("GST_INVOICE_STORE_ENABLED", "1") != "0"
+
+# Rows fetched per round trip when streaming query results
+FETCH_SIZE = 500
+# HSN codes of an invoice are packed into one column of the query result with this separator
+HSN_SEPARATOR = "\x1f"
+
+# Amounts are stored as decimal strings so they round-trip exactly; dates as ISO text sort correctly
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS invoices (
+    id INTEGER PRIMARY KEY,
+    batch_id TEXT,
+    source TEXT,
+    shop_name TEXT,
+    gstin TEXT,
+    invoice_number TEXT,
+    buyer_gstin TEXT,
+    invoice_date TEXT,
+    invoice_date_text TEXT,
+    total_amount TEXT,
+    tax_amount TEXT,
+    cgst TEXT,
+    sgst TEXT,
+    igst TEXT,
+    remarks TEXT,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS line_items (
+    invoice_id INTEGER NOT NULL REFERENCES invoices(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    hsn_code TEXT NOT NULL,
+    PRIMARY KEY (invoice_id, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_invoices_gstin_date ON invoices(gstin, invoice_date);
+CREATE INDEX IF NOT EXISTS idx_invoices_date ON invoices(invoice_date);
+CREATE INDEX IF NOT EXISTS idx_invoices_batch ON invoices(batch_id);
+CREATE INDEX IF NOT EXISTS idx_line_items_hsn ON line_items(hsn_code);
+"""
+
+INVOICE_COLUMNS = (
+    "shop_name", "gstin", "invoice_number", "buyer_gstin", "invoice_date", "invoice_date_text",
+    *AMOUNT_FIELDS, "remarks",
+)
+
+SELECT_INVOICES = f"""
+SELECT {", ".join(INVOICE_COLUMNS)},
+    (SELECT group_concat(hsn_code, '{HSN_SEPARATOR}') FROM (
+        SELECT hsn_code FROM line_items WHERE invoice_id = invoices.id ORDER BY position
+    )) AS hsn_codes
+FROM invoices
+"""
+
+
+def _to_row(invoice):
+    values = []
+    for column in INVOICE_COLUMNS:
+        value = getattr(invoice, column)
+        if isinstance(value, (date, Decimal)):
+            value = value.isoformat() if isinstance(value, date) else str(value)
+        values.append(value)
+    return values
+
+
+def _from_row(row):
+    fields = {column: row[column] for column in INVOICE_COLUMNS}
+    if fields["invoice_date"]:
+        fields["invoice_date"] = date.fromisoformat(fields["invoice_date"])
+    for column in AMOUNT_FIELDS:
+        if fields[column] is not None:
+            # Amounts that were not numbers when extracted are stored as their text
+            try:
+                fields[column] = Decimal(fields[column])
+            except InvalidOperation:
+                pass
+    codes = row["hsn_codes"].split(HSN_SEPARATOR) if row["hsn_codes"] else []
+    return Invoice(**fields, items=tuple(LineItem(code) for code in codes))
+
+
+def build_filters(gstin=None, vendor=None, hsn=None, date_from=None, date_to=None, batch_id=None):
+    """WHERE clause and parameters for a query; every filter is optional"""
+    clauses, params = [], []
+    if gstin:
+        clauses.append("gstin = ?")
+        params.append(gstin.strip().upper())
+    if vendor:
+        clauses.append("shop_name LIKE ?")
+        params.append(f"%{vendor.strip()}%")
+    if hsn:
+        clauses.append("id IN (SELECT invoice_id FROM line_items WHERE hsn_code = ?)")
+        params.append(hsn.strip())
+    if date_from:
+        clauses.append("invoice_date >= ?")
+        params.append(date_from.isoformat())
+    if date_to:
+        clauses.append("invoice_date <= ?")
+        params.append(date_to.isoformat())
+    if batch_id:
+        clauses.append("batch_id = ?")
+        params.append(batch_id)
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+
+class InvoiceStore:
+    """
+    SQLite store of every extracted invoice and its line items, so reports can be
+    filtered and rebuilt without running the extraction again.
+    """
+
+    def __init__(self, db_path=DEFAULT_DB_PATH):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self, check_same_thread=True):
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=check_same_thread)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    def save(self, batch_id, source, gst_data):
+        """Store one file's extracted records; returns the number of invoices written"""
+        invoices = normalize_records(gst_data or [])
+        if not invoices:
+            return 0
+        now = time.time()
+        placeholders = ", ".join("?" * (len(INVOICE_COLUMNS) + 3))
+        with self.lock, self._connect() as conn:
+            for invoice in invoices:
+                cursor = conn.execute(
+                    f"INSERT INTO invoices (batch_id, source, {', '.join(INVOICE_COLUMNS)}, created_at) "
+                    f"VALUES ({placeholders})",
+                    (batch_id, source, *_to_row(invoice), now),
+                )
+                conn.executemany(
+                    "INSERT INTO line_items (invoice_id, position, hsn_code) VALUES (?, ?, ?)",
+                    [(cursor.lastrowid, position, item.hsn_code) for position, item in enumerate(invoice.items)],
+                )
+        return len(invoices)
+
+    def iter_invoices(self, limit=None, offset=0, **filters):
+        """Yield matching Invoice objects ordered by invoice date, fetching FETCH_SIZE rows at a time"""
+        where, params = build_filters(**filters)
+        sql = SELECT_INVOICES + where + " ORDER BY invoice_date IS NULL, invoice_date, id"
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params += [limit, offset]
+        # A streaming response resumes this generator on whichever threadpool thread is free,
+        # so the connection may be used from several threads, though never two at a time
+        conn = self._connect(check_same_thread=False)
+        try:
+            cursor = conn.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(FETCH_SIZE)
+                if not rows:
+                    break
+                for row in rows:
+                    yield _from_row(row)
+        finally:
+            conn.close()
+
+    def query(self, limit=None, offset=0, **filters):
+        return list(self.iter_invoices(limit=limit, offset=offset, **filters))
+
+    def count(self, **filters):
+        where, params = build_filters(**filters)
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM invoices" + where, params).fetchone()[0]
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_default_store():
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = InvoiceStore()
+        return _default_store
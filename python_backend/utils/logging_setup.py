@@ -0,0 +1,11 @@
+import os
+import logging
+
+# DEBUG also logs raw model responses (truncated); the hot path only logs at INFO and above
+LOG_LEVEL = os.getenv("GST_LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s %(message)s"
+
+
+def configure_logging(level=None):
+    """Send the backend's log records to stderr in a key=value friendly format"""
+    logging.basicConfig(level=level or LOG_LEVEL, format=LOG_FORMAT)
@@ -0,0 +1,193 @@
+import time
+import threading
+from functools import wraps
+
+# Latency buckets in seconds, from cache lookups up to slow multi-page model calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            items = sorted(self.values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self.lock:
+            return self.values.get(self._key(labels), 0)
+
+    def _render_sample(self, key, value):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][i] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def _render_sample(self, key, state):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, state["counts"]):
+            cumulative += count
+            labels = _format_labels(self.labelnames, key, [("le", _format_value(bound))])
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(state['sum'])}")
+        lines.append(f"{self.name}_count{labels} {state['count']}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+
+class Registry:
+    """Process-wide set of metrics rendered in the Prometheus text exposition format"""
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def _register(self, cls, name, documentation, labelnames, **kwargs):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self):
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+NODE_SECONDS = REGISTRY.histogram("gst_node_duration_seconds", "Wall time per LangGraph node run", ["node"])
+NODE_ERRORS = REGISTRY.counter("gst_node_errors_total", "LangGraph node runs that raised", ["node"])
+FILE_SECONDS = REGISTRY.histogram("gst_file_duration_seconds", "Wall time per file through the graph")
+FILES_PROCESSED = REGISTRY.counter("gst_files_processed_total", "Files run through the graph", ["outcome"])
+MODEL_SECONDS = REGISTRY.histogram("gst_model_request_duration_seconds", "Wall time per Gemini request attempt")
+MODEL_REQUESTS = REGISTRY.counter("gst_model_requests_total", "Gemini requests by final outcome", ["outcome"])
+MODEL_RETRIES = REGISTRY.counter("gst_model_retries_total", "Gemini request attempts retried after a retryable error")
+MODEL_TOKENS = REGISTRY.counter("gst_model_tokens_total", "Gemini tokens, reported or estimated", ["direction"])
+THROTTLE_SECONDS = REGISTRY.counter("gst_model_throttle_seconds_total", "Time spent waiting on the Gemini rate limiter")
+UPLOAD_BYTES = REGISTRY.counter("gst_upload_bytes_total", "File bytes sent to the model", ["path"])
+CACHE_LOOKUPS = REGISTRY.counter("gst_cache_lookups_total", "Extraction cache lookups", ["result"])
+VALIDATION_ISSUES = REGISTRY.counter("gst_validation_issues_total", "Issues found by the local validator", ["code"])
+VALIDATION_ESCALATIONS = REGISTRY.counter("gst_validation_escalations_total", "Failing records sent to Gemini for correction")
+
+
+def timed_node(name, fn):
+    """Wrap a LangGraph node so every run is timed and failures are counted"""
+
+    @wraps(fn)
+    def node(state):
+        started = time.perf_counter()
+        try:
+            return fn(state)
+        except Exception:
+            NODE_ERRORS.inc(node=name)
+            raise
+        finally:
+            NODE_SECONDS.observe(time.perf_counter() - started, node=name)
+
+    return node
+
+
+def timed_node_async(name, fn):
+    """timed_node for coroutine nodes run by graph.ainvoke"""
+
+    @wraps(fn)
+    async def node(state):
+        started = time.perf_counter()
+        try:
+            return await fn(state)
+        except Exception:
+            NODE_ERRORS.inc(node=name)
+            raise
+        finally:
+            NODE_SECONDS.observe(time.perf_counter() - started, node=name)
+
+    return node
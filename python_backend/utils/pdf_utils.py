@@ -1,18 +1,163 @@
-import fitz  # PyMuPDF
+import re
 from PIL import Image
 from pathlib import Path
 
-def convert_to_images(file_path):
-    images = []
-    ext = Path(file_path).suffix.lower()
+# PyMuPDF is imported inside the functions that open documents, keeping it off the import path
 
-    if ext == ".pdf":
-        with fitz.open(file_path) as doc:
-            for page in doc:
-                pix = page.get_pixmap(dpi=200)
-                img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                images.append(img)
-    else:
-        images.append(Image.open(file_path))
+DEFAULT_DPI = 200
+# Auto DPI renders every page to roughly this long edge (A4 at 200 DPI is ~2340px)
+TARGET_LONG_EDGE_PX = 2340
+MIN_DPI = 72
+MAX_DPI = 300
 
-    return images
\ No newline at end of file
+# Documents opened by process-pool workers, reused across the pages they render
+_worker_docs = {}
+
+
+def page_dpi(rect, target_long_edge=TARGET_LONG_EDGE_PX):
+    """Pick a DPI so the page's long edge renders to about target_long_edge pixels"""
+    long_edge_inches = max(rect.width, rect.height) / 72.0
+    if long_edge_inches <= 0:
+        return DEFAULT_DPI
+    return int(max(MIN_DPI, min(MAX_DPI, target_long_edge / long_edge_inches)))
+
+
+def _render(page, dpi):
+    page_dpi_value = dpi or page_dpi(page.rect)
+    pix = page.get_pixmap(dpi=page_dpi_value)
+    return pix.width, pix.height, pix.samples
+
+
+def _render_in_worker(file_path, page_number, dpi):
+    import fitz  # PyMuPDF
+
+    doc = _worker_docs.get(file_path)
+    if doc is None:
+        doc = _worker_docs[file_path] = fitz.open(file_path)
+    width, height, samples = _render(doc[page_number], dpi)
+    return page_number, width, height, samples
+
+
+def _select_pages(page_count, pages):
+    if pages is None:
+        return list(range(page_count))
+    return [p for p in pages if 0 <= p < page_count]
+
+
+def iter_page_images(file_path, pages=None, dpi=None, workers=0):
+    """
+    Lazily yield (page_number, PIL image) for a PDF or image file.
+
+    Pages are rendered only when the consumer asks for them, so a long scan never
+    sits in memory all at once. ``pages`` is an iterable of 0-based page numbers
+    (e.g. range(0, 5)); ``dpi=None`` picks a per-page DPI from the page size;
+    ``workers > 1`` renders pages in a process pool while keeping page order and
+    at most 2 * workers rendered pages in flight.
+    """
+    if Path(file_path).suffix.lower() != ".pdf":
+        if pages is None or 0 in pages:
+            yield 0, Image.open(file_path)
+        return
+
+    import fitz  # PyMuPDF
+
+    with fitz.open(file_path) as doc:
+        selected = _select_pages(doc.page_count, pages)
+        if workers <= 1 or len(selected) <= 1:
+            for page_number in selected:
+                width, height, samples = _render(doc[page_number], dpi)
+                yield page_number, Image.frombytes("RGB", [width, height], samples)
+            return
+
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = deque()
+        remaining = iter(selected)
+        for page_number in remaining:
+            in_flight.append(pool.submit(_render_in_worker, file_path, page_number, dpi))
+            if len(in_flight) >= 2 * workers:
+                break
+        while in_flight:
+            page_number, width, height, samples = in_flight.popleft().result()
+            next_page = next(remaining, None)
+            if next_page is not None:
+                in_flight.append(pool.submit(_render_in_worker, file_path, next_page, dpi))
+            yield page_number, Image.frombytes("RGB", [width, height], samples)
+
+
+def count_pages(file_path):
+    if Path(file_path).suffix.lower() != ".pdf":
+        return 1
+    import fitz  # PyMuPDF
+
+    with fitz.open(file_path) as doc:
+        return doc.page_count
+
+
+def convert_to_images(file_path, dpi=DEFAULT_DPI, pages=None, workers=0):
+    """Render pages into a list of PIL images (prefer iter_page_images for large files)"""
+    return [image for _, image in iter_page_images(file_path, pages=pages, dpi=dpi, workers=workers)]
+
+# Keywords expected in the text of a GST invoice, used to judge the text layer
+GST_KEYWORDS = ("gstin", "invoice", "cgst", "sgst", "igst", "hsn", "total", "tax", "amount", "date")
+GSTIN_IN_TEXT = re.compile(r"\b[0-9]{2}[A-Z]{5}[0-9]{4}[A-Z][1-9A-Z]Z[0-9A-Z]\b")
+# Below this many characters per page the layer is treated as missing (scans, image-only pages)
+MIN_CHARS_PER_PAGE = 200
+
+
+def extract_text_layer(file_path, include_tables=True):
+    """
+    Read the embedded text layer of a digital PDF with PyMuPDF (no model call).
+    Returns {"text", "pages", "blocks", "tables"}; "text" is empty for non-PDF files.
+    """
+    if Path(file_path).suffix.lower() != ".pdf":
+        return {"text": "", "pages": 0, "blocks": 0, "tables": 0}
+
+    parts = []
+    block_count = 0
+    table_count = 0
+    import fitz  # PyMuPDF
+
+    with fitz.open(file_path) as doc:
+        page_count = doc.page_count
+        for page in doc:
+            # Blocks sorted top-to-bottom, left-to-right keep label/value pairs together
+            blocks = [b for b in page.get_text("blocks", sort=True) if b[6] == 0 and b[4].strip()]
+            block_count += len(blocks)
+            parts.extend(b[4].strip() for b in blocks)
+
+            if include_tables and hasattr(page, "find_tables"):
+                try:
+                    tables = page.find_tables().tables
+                except Exception:
+                    tables = []
+                for table in tables:
+                    table_count += 1
+                    rows = table.extract()
+                    parts.append("\n".join(" | ".join(cell or "" for cell in row) for row in rows))
+
+    return {"text": "\n".join(parts), "pages": page_count, "blocks": block_count, "tables": table_count}
+
+
+def score_text_layer(text, pages):
+    """
+    Score (0..1) how usable an extracted text layer is for GST parsing, from
+    text density per page, the share of clean characters, and GST vocabulary.
+    """
+    if not text or not pages:
+        return 0.0
+
+    density = min(1.0, len(text) / (pages * MIN_CHARS_PER_PAGE))
+
+    # Broken font encodings show up as replacement / private-use / control characters
+    bad_chars = sum(1 for ch in text if ch == "\ufffd" or "\ue000" <= ch <= "\uf8ff" or (ord(ch) < 32 and ch not in "\n\t\r"))
+    clean_ratio = 1.0 - bad_chars / len(text)
+
+    lowered = text.lower()
+    keyword_score = sum(1 for keyword in GST_KEYWORDS if keyword in lowered) / len(GST_KEYWORDS)
+    if GSTIN_IN_TEXT.search(text):
+        keyword_score = min(1.0, keyword_score + 0.2)
+
+    return round(0.4 * density + 0.3 * clean_ratio + 0.3 * keyword_score, 3)
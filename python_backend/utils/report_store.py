@@ -0,0 +1,103 @@
+import os
+import re
+import time
+import uuid
+import shutil
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPORTS_DIR = os.getenv("GST_REPORTS_DIR", os.path.join(BACKEND_DIR, "output", "reports"))
+REPORT_FILENAME = "GST_Report.xlsx"
+
+# Reports older than this are removed by collect_garbage()
+RETENTION_HOURS = float(os.getenv("GST_REPORT_RETENTION_HOURS", "72"))
+# How often new reports trigger a garbage collection pass
+GC_INTERVAL_SECONDS = 600
+
+REPORT_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+_last_gc = 0.0
+_gc_lock = threading.Lock()
+
+
+def new_report_id():
+    return uuid.uuid4().hex
+
+
+def is_valid_report_id(report_id):
+    """Report ids are used as directory names, so only accept our own uuid hex format"""
+    return bool(report_id) and bool(REPORT_ID_PATTERN.match(report_id))
+
+
+def report_dir(report_id):
+    if not is_valid_report_id(report_id):
+        raise ValueError(f"Invalid report id: {report_id!r}")
+    return os.path.join(REPORTS_DIR, report_id)
+
+
+def report_path(report_id, filename=REPORT_FILENAME):
+    """Path for a job's report; each job writes into its own directory so batches never collide"""
+    path = os.path.join(report_dir(report_id), filename)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    maybe_collect_garbage()
+    return path
+
+
+def find_report(report_id, filename=REPORT_FILENAME):
+    if not is_valid_report_id(report_id):
+        return None
+    path = os.path.join(REPORTS_DIR, report_id, filename)
+    return path if os.path.exists(path) else None
+
+
+def latest_report(filename=REPORT_FILENAME):
+    """Most recently written report, for clients that download without a job id"""
+    if not os.path.isdir(REPORTS_DIR):
+        return None
+    candidates = []
+    for entry in os.scandir(REPORTS_DIR):
+        path = os.path.join(entry.path, filename)
+        if entry.is_dir() and os.path.exists(path):
+            candidates.append((os.path.getmtime(path), path))
+    return max(candidates)[1] if candidates else None
+
+
+def collect_garbage(retention_hours=RETENTION_HOURS):
+    """Delete report directories not modified within the retention window"""
+    if not os.path.isdir(REPORTS_DIR):
+        return 0
+    cutoff = time.time() - retention_hours * 3600
+    removed = 0
+    for entry in os.scandir(REPORTS_DIR):
+        if not entry.is_dir() or not is_valid_report_id(entry.name):
+            continue
+        try:
+            if entry.stat().st_mtime < cutoff:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                removed += 1
+        except OSError:
+            continue
+    if removed:
+        logger.info("removed expired reports count=%d", removed)
+    return removed
+
+
+def maybe_collect_garbage():
+    global _last_gc
+    with _gc_lock:
+        if time.time() - _last_gc < GC_INTERVAL_SECONDS:
+            return 0
+        _last_gc = time.time()
+    return collect_garbage()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Remove expired GST reports")
+    parser.add_argument("--retention-hours", type=float, default=RETENTION_HOURS)
+    args = parser.parse_args()
+    print(f"Removed {collect_garbage(args.retention_hours)} reports")
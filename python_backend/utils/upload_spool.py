@@ -0,0 +1,126 @@
+import os
+import uuid
+import shutil
+import hashlib
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+UPLOAD_SPOOL_DIR = os.getenv("GST_UPLOAD_DIR", os.path.join(BACKEND_DIR, "temp_uploads"))
+
+# Uploads are copied in chunks of this size; the whole file is never held in memory
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+MAX_FILE_MB = float(os.getenv("GST_MAX_FILE_MB", "50"))
+MAX_BATCH_MB = float(os.getenv("GST_MAX_BATCH_MB", "500"))
+# Room for multipart boundaries and part headers on top of the uploaded bytes themselves
+MULTIPART_OVERHEAD_BYTES = 1024 * 1024
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+class UploadSpool:
+    """
+    A directory that one request's uploads are copied into. Each file is hashed
+    (SHA-256, the same digest as utils.extraction_cache.hash_file) while it is
+    written, and the per-file and per-batch limits are checked chunk by chunk.
+    By then the framework has already received the request body, so
+    UploadLimitMiddleware caps the body itself before it is parsed. remove() or
+    leaving the ``with`` block deletes the directory and everything in it.
+    """
+
+    def __init__(self, directory=None, max_file_mb=MAX_FILE_MB, max_batch_mb=MAX_BATCH_MB):
+        self.directory = directory or os.path.join(UPLOAD_SPOOL_DIR, uuid.uuid4().hex)
+        self.max_file_bytes = int(max_file_mb * 1024 * 1024)
+        self.max_batch_bytes = int(max_batch_mb * 1024 * 1024)
+        self.max_file_mb = max_file_mb
+        self.max_batch_mb = max_batch_mb
+        self.files = []
+        self.hashes = []
+        self.total_bytes = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+    @property
+    def paths(self):
+        return [path for path, _ in self.files]
+
+    def add(self, source, file_name):
+        """Copy a binary file object into the spool; returns the spooled path"""
+        suffix = os.path.splitext(file_name or "")[1]
+        path = os.path.join(self.directory, f"{len(self.files):05d}{suffix}")
+        digest = hashlib.sha256()
+        size = 0
+        with open(path, "wb") as out:
+            for chunk in iter(lambda: source.read(UPLOAD_CHUNK_SIZE), b""):
+                size += len(chunk)
+                if size > self.max_file_bytes:
+                    raise UploadTooLarge(f"{file_name} is larger than the {self.max_file_mb:g} MB per-file limit")
+                if self.total_bytes + size > self.max_batch_bytes:
+                    raise UploadTooLarge(f"Upload exceeds the {self.max_batch_mb:g} MB per-batch limit")
+                digest.update(chunk)
+                out.write(chunk)
+        self.total_bytes += size
+        self.files.append((path, file_name))
+        self.hashes.append(digest.hexdigest())
+        return path
+
+    def remove(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.remove()
+        return False
+
+
+def _header(scope, name):
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+class UploadLimitMiddleware:
+    """
+    ASGI middleware that holds multipart request bodies to the per-batch limit while
+    they arrive. Starlette parses the whole form into temporary files before an
+    endpoint runs, so without it an oversized upload is received in full before
+    UploadSpool can reject it. A declared Content-Length over the limit is answered
+    413 without reading the body; a body that grows past it (e.g. chunked) is cut
+    off with 413 as soon as it does. The per-file limit is still checked by UploadSpool.
+    """
+
+    def __init__(self, app, max_batch_mb=MAX_BATCH_MB):
+        self.app = app
+        self.max_batch_mb = max_batch_mb
+        self.max_body_bytes = int(max_batch_mb * 1024 * 1024) + MULTIPART_OVERHEAD_BYTES
+
+    async def __call__(self, scope, receive, send):
+        content_type = _header(scope, b"content-type") if scope["type"] == "http" else None
+        if not content_type or not content_type.startswith("multipart/form-data"):
+            await self.app(scope, receive, send)
+            return
+
+        from starlette.exceptions import HTTPException
+        from starlette.responses import JSONResponse
+
+        detail = f"Upload exceeds the {self.max_batch_mb:g} MB per-batch limit"
+        declared = _header(scope, b"content-length")
+        if declared is not None and declared.isdigit() and int(declared) > self.max_body_bytes:
+            await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_bytes:
+                    # Raised while the form is parsed; FastAPI passes HTTPException through as the response
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
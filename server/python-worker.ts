@@ -0,0 +1,129 @@
+import { spawn, type ChildProcessWithoutNullStreams } from "child_process";
+import { randomUUID } from "crypto";
+import readline from "readline";
+
+export interface ExtractionResult {
+  success: boolean;
+  message: string;
+  job_id?: string;
+  output_file: string | null;
+  invoices_count: number;
+  failed_files?: string[];
+}
+
+type Pending = {
+  resolve: (result: ExtractionResult) => void;
+  reject: (error: Error) => void;
+  timer: NodeJS.Timeout;
+};
+
+// A request that has not answered by then is rejected; the batch itself keeps running
+const REQUEST_TIMEOUT_MS = Number(process.env.GST_WORKER_TIMEOUT_MS || 10 * 60 * 1000);
+
+// Keeps one `simple_server.py --serve` process warm (graph compiled, model client
+// configured) and exchanges newline-delimited JSON frames with it.
+class PythonWorker {
+  private child: ChildProcessWithoutNullStreams | null = null;
+  private ready: Promise<void> | null = null;
+  private pending = new Map<string, Pending>();
+
+  private settle(id: string): Pending | undefined {
+    const waiter = this.pending.get(id);
+    if (waiter) {
+      clearTimeout(waiter.timer);
+      this.pending.delete(id);
+    }
+    return waiter;
+  }
+
+  private failAll(error: Error) {
+    Array.from(this.pending.keys()).forEach((id) => this.settle(id)!.reject(error));
+    this.child = null;
+    this.ready = null;
+  }
+
+  private start(): Promise<void> {
+    if (this.ready) {
+      return this.ready;
+    }
+
+    const processes = process.env.GST_WORKER_PROCESSES || "1";
+    const child = spawn("python3", ["python_backend/simple_server.py", "--serve", "--processes", processes], {
+      cwd: process.cwd(),
+      env: {
+        ...process.env,
+        PYTHONPATH: `${process.cwd()}/python_backend:${process.env.PYTHONPATH || ''}`,
+      },
+    });
+    this.child = child;
+
+    this.ready = new Promise((resolve, reject) => {
+      const lines = readline.createInterface({ input: child.stdout });
+      lines.on("line", (line) => {
+        let frame: any;
+        try {
+          frame = JSON.parse(line);
+        } catch {
+          console.log("Python worker output:", line);
+          return;
+        }
+        if (frame.type === "ready") {
+          console.log(`Python worker ready (pid ${frame.pid}, ${frame.processes} processes)`);
+          resolve();
+          return;
+        }
+        const waiter = frame.id ? this.settle(frame.id) : undefined;
+        if (!waiter) {
+          console.error("Python worker frame without a pending request:", frame);
+          return;
+        }
+        if (frame.type === "result") {
+          waiter.resolve(frame);
+        } else {
+          waiter.reject(new Error(frame.message || "Python worker error"));
+        }
+      });
+
+      child.stderr.on("data", (data) => {
+        process.stderr.write(data);
+      });
+
+      // A failed spawn emits "error" and may never emit "exit"
+      child.on("error", (err) => {
+        console.error("Python worker failed:", err);
+        const error = new Error(`Python worker failed: ${err.message}`);
+        this.failAll(error);
+        reject(error);
+      });
+
+      child.stdin.on("error", (err) => {
+        console.error("Could not write to the Python worker:", err);
+      });
+
+      child.on("exit", (code) => {
+        console.error(`Python worker exited with code ${code}`);
+        const error = new Error("Python worker exited");
+        this.failAll(error);
+        reject(error);
+      });
+    });
+
+    return this.ready;
+  }
+
+  async process(files: string[]): Promise<ExtractionResult> {
+    await this.start();
+    const id = randomUUID();
+    return new Promise((resolve, reject) => {
+      const timer = setTimeout(() => {
+        if (this.settle(id)) {
+          reject(new Error(`Python worker did not answer within ${REQUEST_TIMEOUT_MS} ms`));
+        }
+      }, REQUEST_TIMEOUT_MS);
+      this.pending.set(id, { resolve, reject, timer });
+      this.child!.stdin.write(JSON.stringify({ id, files }) + "\n");
+    });
+  }
+}
+
+export const pythonWorker = new PythonWorker();
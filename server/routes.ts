@@ -7,12 +7,71 @@ import { z } from "zod";
 import { createProxyMiddleware } from "http-proxy-middleware";
 import fs from "fs";
 import path from "path";
+import { pythonWorker } from "./python-worker";
+
+const MAX_FILE_BYTES = 50 * 1024 * 1024; // 50MB per file
+const MAX_BATCH_BYTES = 500 * 1024 * 1024; // 500MB per request
+
+// Each request's uploads stream to disk in their own spool directory instead of being buffered in memory
+function requestSpoolDir(req: any): string {
+  if (!req.spoolDir) {
+    req.spoolDir = path.join('temp_uploads', `${Date.now()}_${Math.random().toString(36).slice(2, 10)}`);
+    fs.mkdirSync(req.spoolDir, { recursive: true });
+  }
+  return req.spoolDir;
+}
+
+async function removeSpool(req: any) {
+  if (req.spoolDir) {
+    await fs.promises.rm(req.spoolDir, { recursive: true, force: true });
+  }
+}
+
+const batchLimitMessage = `Upload exceeds the ${MAX_BATCH_BYTES / 1024 / 1024}MB per-batch limit`;
+
+// Disk storage that keeps a running byte count for the whole request, so a body without a
+// Content-Length (chunked) is still stopped at MAX_BATCH_BYTES while it is being written
+const spoolStorage: multer.StorageEngine = {
+  _handleFile(req: any, file, cb) {
+    const destination = requestSpoolDir(req);
+    req.spoolCount = (req.spoolCount || 0) + 1;
+    const filename = `${String(req.spoolCount).padStart(5, '0')}${path.extname(file.originalname)}`;
+    const filePath = path.join(destination, filename);
+    const out = fs.createWriteStream(filePath);
+    let size = 0;
+    let failed = false;
+    const fail = (err: any) => {
+      if (failed) return;
+      failed = true;
+      file.stream.unpipe(out);
+      out.destroy();
+      cb(err);
+    };
+    file.stream.on('data', (chunk: Buffer) => {
+      size += chunk.length;
+      req.spoolBytes = (req.spoolBytes || 0) + chunk.length;
+      if (req.spoolBytes > MAX_BATCH_BYTES) {
+        fail(Object.assign(new Error(batchLimitMessage), { code: 'LIMIT_BATCH_SIZE' }));
+      }
+    });
+    out.on('error', fail);
+    out.on('finish', () => {
+      if (!failed) {
+        cb(null, { destination, filename, path: filePath, size });
+      }
+    });
+    file.stream.pipe(out);
+  },
+  _removeFile(req, file, cb) {
+    fs.unlink(file.path, cb);
+  },
+};
 
 // Configure multer for file uploads
 const upload = multer({
-  storage: multer.memoryStorage(),
+  storage: spoolStorage,
   limits: {
-    fileSize: 50 * 1024 * 1024, // 50MB limit
+    fileSize: MAX_FILE_BYTES,
   },
   fileFilter: (req, file, cb) => {
     const allowedTypes = [
@@ -29,6 +88,23 @@ const upload = multer({
   }
 });
 
+// Spool the request's files to disk; a rejected upload leaves nothing behind
+function spoolFiles(req: any, res: any, next: any) {
+  // Oversized batches are rejected from the declared size before any bytes are written;
+  // spoolStorage enforces the same cap on bodies that declare no size
+  if (Number(req.headers['content-length'] || 0) > MAX_BATCH_BYTES) {
+    return res.status(413).json({ error: batchLimitMessage });
+  }
+  upload.array('files')(req, res, async (err: any) => {
+    if (!err) {
+      return next();
+    }
+    await removeSpool(req).catch(() => {});
+    const tooLarge = (err instanceof multer.MulterError && err.code === 'LIMIT_FILE_SIZE') || err.code === 'LIMIT_BATCH_SIZE';
+    res.status(tooLarge ? 413 : 400).json({ error: err.message });
+  });
+}
+
 export async function registerRoutes(app: Express): Promise<Server> {
   // Ensure temp_uploads directory exists
   const fs = await import('fs');
@@ -39,96 +115,44 @@ export async function registerRoutes(app: Express): Promise<Server> {
     await fs.promises.mkdir(tempDir, { recursive: true });
   }
 
+  // Extraction jobs (submit, status, SSE progress, results) are served by the Python backend
+  app.use(createProxyMiddleware({
+    target: process.env.PYTHON_BACKEND_URL || 'http://localhost:8000',
+    changeOrigin: true,
+    pathFilter: '/api/jobs',
+  }));
+
   // GST extraction endpoint - direct Python integration
-  app.post('/api/extract-gst', upload.array('files'), async (req, res) => {
+  app.post('/api/extract-gst', spoolFiles, async (req, res) => {
     try {
       const files = req.files as Express.Multer.File[];
       
       if (!files || files.length === 0) {
+        await removeSpool(req);
         return res.status(400).json({ error: 'No files uploaded' });
       }
       
-      // Save uploaded files temporarily
-      const tempFiles: string[] = [];
-      for (const file of files) {
-        const tempPath = `temp_uploads/${Date.now()}_${file.originalname}`;
-        await fs.promises.writeFile(tempPath, file.buffer);
-        tempFiles.push(tempPath);
-      }
-      
-      // Process files with Python backend
-      const { spawn } = await import('child_process');
-      const pythonProcess = spawn('python3', [
-        'python_backend/simple_server.py',
-        ...tempFiles
-      ], {
-        cwd: process.cwd(),
-        env: { 
-          ...process.env, 
-          PYTHONPATH: `${process.cwd()}/python_backend:${process.env.PYTHONPATH || ''}` 
-        }
-      });
-      
-      let output = '';
-      let errorOutput = '';
-      
-      pythonProcess.stdout.on('data', (data) => {
-        output += data.toString();
-      });
-      
-      pythonProcess.stderr.on('data', (data) => {
-        errorOutput += data.toString();
-      });
-      
-      pythonProcess.on('close', async (code) => {
-        // Cleanup temp files
-        for (const tempFile of tempFiles) {
-          try {
-            await fs.promises.unlink(tempFile);
-          } catch (e) {
-            console.log('Failed to cleanup temp file:', tempFile);
-          }
-        }
-        
-        console.log('Python process output:', output);
-        console.log('Python process errors:', errorOutput);
-        
-        if (code === 0) {
-          try {
-            // Look for the JSON result in the output
-            const resultMatch = output.match(/\[RESULT\]\s*({.*})/);
-            if (resultMatch) {
-              const result = JSON.parse(resultMatch[1]);
-              lastProcessingResult = result; // Store for download history
-              res.json({
-                success: result.success,
-                message: result.message,
-                download_url: result.success ? '/api/download-excel' : null,
-                invoices_count: result.invoices_count
-              });
-            } else {
-              // Fallback: try to parse the entire output as JSON
-              const result = JSON.parse(output.trim());
-              lastProcessingResult = result; // Store for download history
-              res.json({
-                success: result.success,
-                message: result.message,
-                download_url: result.success ? '/api/download-excel' : null,
-                invoices_count: result.invoices_count
-              });
-            }
-          } catch (e) {
-            console.error('Failed to parse Python output:', e);
-            res.status(500).json({ 
-              error: 'Failed to parse Python output',
-              debug: { output, errorOutput }
-            });
-          }
-        } else {
-          console.error('Python process error:', errorOutput);
-          res.status(500).json({ error: 'Failed to process files' });
+      // Process the spooled files on the long-lived Python worker (no per-request interpreter start)
+      try {
+        const result = await pythonWorker.process(files.map(file => file.path));
+        lastProcessingResult = result; // Store for download history
+        res.json({
+          success: result.success,
+          message: result.message,
+          download_url: result.success ? `/api/download-excel/${result.job_id}` : null,
+          invoices_count: result.invoices_count
+        });
+      } catch (e) {
+        console.error('Python worker error:', e);
+        res.status(500).json({ error: 'Failed to process files' });
+      } finally {
+        // Cleanup the request's spool directory
+        try {
+          await removeSpool(req);
+        } catch (e) {
+          console.log('Failed to cleanup spool directory:', (req as any).spoolDir);
         }
-      });
+      }
       
     } catch (error) {
       console.error('GST extraction error:', error);
@@ -139,12 +163,18 @@ export async function registerRoutes(app: Express): Promise<Server> {
   // Store last processing result for download history
   let lastProcessingResult: any = null;
 
-  // Download Excel file endpoint
-  app.get('/api/download-excel', async (req, res) => {
-    const excelPath = path.join(process.cwd(), 'python_backend/output/Consolidated_Invoices_Output.xlsx');
+  // Download Excel file endpoint; each extraction job has its own report directory
+  app.get('/api/download-excel/:jobId?', async (req, res) => {
+    const { jobId } = req.params;
+    if (jobId && !/^[0-9a-f]{32}$/.test(jobId)) {
+      return res.status(404).json({ error: 'Excel file not found' });
+    }
+    const excelPath = jobId
+      ? path.join(process.cwd(), 'python_backend/output/reports', jobId, 'GST_Report.xlsx')
+      : lastProcessingResult?.output_file || '';
     
     // Check if file exists
-    if (fs.existsSync(excelPath)) {
+    if (excelPath && fs.existsSync(excelPath)) {
       try {
         // Get file stats for size
         const stats = fs.statSync(excelPath);
@@ -310,7 +340,9 @@ export async function registerRoutes(app: Express): Promise<Server> {
   });
 
   // File upload routes
-  app.post("/api/files/upload", upload.array('files'), async (req, res) => {
+  app.post("/api/files/upload", spoolFiles, async (req, res) => {
+    // Only file metadata is recorded here; the spooled bytes are not kept
+    res.on('finish', () => removeSpool(req).catch(() => {}));
     try {
       const { userId } = req.body;
       if (!userId) {